@@ -0,0 +1,137 @@
+"""
+引擎等价性与逐位复现测试
+
+固定种子、小样本，检查各运行方式之间的逐位一致(进程数、分片合并、快照续跑、参数扫描续跑)，
+以及批量引擎(含方差缩减)和 ScalarEngine 包装的标量参考实现与精确期望在统计上一致。更快的引擎替换 simulate 后须通过全部测试：
+
+    python -m pytest tests
+"""
+
+import numpy as np
+import pytest
+
+from xfactor.bench import z_score
+from xfactor.models import load_model
+from xfactor.rng import ScalarEngine
+from xfactor.runner import run_parallel
+from xfactor.shards import create_job, job_simulate, merge_shards, run_shards
+from xfactor.snapshots import record_snapshots, resume_snapshots
+from xfactor.stats import SampleStats
+from xfactor.sweep import patched_constants, run_points, sweep
+from xfactor.variance import MODES, with_variance_reduction
+
+SEED = 20250615
+CHUNK_SIZE = 1000
+HEROES = ('wangyi', 'nver')
+
+
+def tasks_of(hero, count=3):
+    return [task for _, task in load_model(hero).default_tasks()[-count:]]
+
+
+def assert_identical(results, expected):
+    assert len(results) == len(expected)
+    for a, b in zip(results, expected):
+        assert a.count == b.count
+        assert np.array_equal(a.mean, b.mean) and np.array_equal(a.m2, b.m2)
+        assert a.total_mean == b.total_mean and a.total_m2 == b.total_m2
+        assert a.histogram.offset == b.histogram.offset
+        assert np.array_equal(a.histogram.counts, b.histogram.counts)
+
+
+@pytest.mark.parametrize('hero', HEROES)
+def test_results_independent_of_worker_count(hero):
+    model = load_model(hero)
+    tasks = tasks_of(hero, 2)
+    inline = run_parallel(model.simulate, tasks, 3500, seed=SEED, chunk_size=CHUNK_SIZE, max_workers=1)
+    pooled = run_parallel(model.simulate, tasks, 3500, seed=SEED, chunk_size=CHUNK_SIZE, max_workers=2)
+    assert_identical(pooled, inline)
+
+
+@pytest.mark.parametrize('hero', HEROES)
+def test_scalar_engine_independent_of_worker_count(hero):
+    engine = ScalarEngine(load_model(hero).reference)
+    tasks = tasks_of(hero, 2)
+    inline = run_parallel(engine, tasks, 2500, seed=SEED, chunk_size=CHUNK_SIZE, max_workers=1)
+    pooled = run_parallel(engine, tasks, 2500, seed=SEED, chunk_size=CHUNK_SIZE, max_workers=2)
+    assert_identical(pooled, inline)
+
+
+def test_scalar_engine_matches_exact():
+    model = load_model('wangyi')
+    tasks = tasks_of('wangyi', 2)
+    for task, stats in zip(tasks, run_parallel(ScalarEngine(model.reference), tasks, 20000, seed=SEED,
+                                               max_workers=1)):
+        exact = float(np.sum(model.exact(*task)))
+        assert abs(z_score(SampleStats.from_moments(2, 0.0, 0.0, exact, 0.0), stats)) < 4, task
+
+
+@pytest.mark.parametrize('hero', HEROES)
+def test_shard_merge_matches_run_parallel(hero, tmp_path):
+    model = load_model(hero)
+    labelled = model.default_tasks()[-2:]
+    job = create_job(str(tmp_path), hero, labelled, 5000, SEED, chunk_size=CHUNK_SIZE, shard_samples=2000)
+    run_shards(str(tmp_path), max_workers=1, hosts=2, host_index=0)
+    run_shards(str(tmp_path), max_workers=1, hosts=2, host_index=1)
+    expected = run_parallel(job_simulate(job), [task for _, task in labelled], 5000, seed=SEED,
+                            chunk_size=CHUNK_SIZE, max_workers=1)
+    assert_identical(merge_shards(str(tmp_path)), expected)
+
+
+@pytest.mark.parametrize('hero, turn, extended', [('wangyi', 2, 6), ('nver', 3, 6)])
+def test_snapshot_resume_matches_full_run(hero, turn, extended, tmp_path):
+    model = load_model(hero)
+    tasks = tasks_of(hero)
+    recorded = record_snapshots(model.simulate, tasks, 3000, str(tmp_path), [turn], seed=SEED,
+                                chunk_size=CHUNK_SIZE, max_workers=1)
+    assert_identical(recorded, run_parallel(model.simulate, tasks, 3000, seed=SEED, chunk_size=CHUNK_SIZE,
+                                            max_workers=1))
+    assert_identical(resume_snapshots(model.simulate, str(tmp_path), turn, max_workers=1), recorded)
+
+    # 只改变第 turn 回合之后的行为：续跑与完整重跑逐位一致
+    overrides = {'战斗回合数': extended}
+    resumed = resume_snapshots(model.simulate, str(tmp_path), turn, overrides, model.derive, max_workers=1)
+    with patched_constants(vars(model), overrides, model.derive):
+        full = run_parallel(model.simulate, tasks, 3000, seed=SEED, chunk_size=CHUNK_SIZE, max_workers=1)
+    assert_identical(resumed, full)
+
+
+def test_sweep_resume_matches_full_run_and_checks_prefix():
+    model = load_model('wangyi')
+    tasks = tasks_of('wangyi', 2)
+    points = [{'MEHD_DMG_COEFF_INCREASE_PER_TURN': value} for value in (0.123, 0.2)]
+    # 每回合增量从第 2 回合起生效：从第 1 回合续跑与逐点完整模拟逐位一致
+    full, _ = run_points(model.simulate, tasks, points, 3000, seed=SEED, derive=model.derive, chunk_size=CHUNK_SIZE,
+                         max_workers=1)
+    resumed, _ = run_points(model.simulate, tasks, points, 3000, seed=SEED, derive=model.derive,
+                            chunk_size=CHUNK_SIZE, max_workers=1, resume_turn=1)
+    for a, b in zip(resumed, full):
+        assert_identical(a, b)
+    with pytest.raises(ValueError, match='前 2 回合'):
+        run_points(model.simulate, tasks, points, 3000, seed=SEED, derive=model.derive, chunk_size=CHUNK_SIZE,
+                   max_workers=1, resume_turn=2)
+
+
+@pytest.mark.parametrize('hero', HEROES)
+def test_antithetic_rejects_snapshots(hero):
+    model = load_model(hero)
+    simulate = with_variance_reduction(model.simulate, 'antithetic')
+    task = tasks_of(hero, 1)[0]
+    with pytest.raises(ValueError, match='对偶变量'):
+        simulate(*task, n=100, rng=np.random.default_rng(SEED), snapshot_turns=[2])
+    with pytest.raises(ValueError, match='对偶变量'):
+        sweep(simulate, [task], {'战斗回合数': [5, 6]}, 200, seed=SEED, derive=model.derive, max_workers=1,
+              resume_turn=2)
+
+
+@pytest.mark.parametrize('mode', (None,) + MODES)
+@pytest.mark.parametrize('hero', HEROES)
+def test_batch_engine_matches_exact(hero, mode):
+    model = load_model(hero)
+    tasks = tasks_of(hero, 4)
+    simulate = with_variance_reduction(model.simulate, mode)
+    results = run_parallel(simulate, tasks, 20000, seed=SEED, max_workers=1)
+    for task, stats in zip(tasks, results):
+        exact = float(np.sum(model.exact(*task)))
+        # 精确期望视为方差为 0 的参照样本
+        assert abs(z_score(SampleStats.from_moments(2, 0.0, 0.0, exact, 0.0), stats)) < 4, task
@@ -0,0 +1,22 @@
+"""
+X-Factor Lab 公共模拟工具
+
+各期分析脚本共用的基础设施：并行批量运行、流式统计量、参数扫描、方差缩减、阵容搜索、完整伤害分布的存储与查询、可续跑的分片运行、分块缓冲的随机数提供器、回合快照与增量续跑等。
+武将模型在 xfactor.models 中，图表渲染在 xfactor.charts 中，命令行入口为 xfactor.cli(xfactor simulate ...)。
+导入本包只加载 numpy；pandas 与 matplotlib 只在生成报表或图表时导入。
+"""
+
+from .adaptive import run_adaptive
+from .distributions import DistributionStore, write_distributions
+from .optimize import compositions, race
+from .rng import BlockRNG, ScalarEngine
+from .runner import iter_chunks, run_parallel
+from .snapshots import record_snapshots, resume_snapshots
+from .stats import Histogram, SampleStats, accumulate, batched
+from .sweep import sensitivity, sweep
+from .variance import Antithetic, ControlVariates, variance_reduction_report, with_variance_reduction
+
+__all__ = ['Antithetic', 'BlockRNG', 'ControlVariates', 'DistributionStore', 'Histogram', 'SampleStats', 'ScalarEngine',
+           'accumulate', 'batched', 'compositions', 'iter_chunks', 'race', 'record_snapshots', 'resume_snapshots',
+           'run_adaptive', 'run_parallel', 'sensitivity', 'sweep', 'variance_reduction_report', 'with_variance_reduction',
+           'write_distributions']
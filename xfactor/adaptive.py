@@ -0,0 +1,62 @@
+"""
+自适应样本量模式
+
+按分块顺序逐批模拟，并持续更新每个配置总伤害的均值与方差。一旦某个配置的 95%
+置信区间半宽不超过 相对误差 × |均值|，或样本数达到上限，该配置即停止。低方差的配置
+很快结束，高方差的配置(例如带心计锁定阈值的张春华)会自动多采样。
+
+停止判断按分块序号逐块进行，每轮多跑的分块只是预取，结果只取决于种子、分块大小、
+相对误差和上限，与进程数和每轮分块数无关。
+"""
+
+from .runner import DEFAULT_CHUNK_SIZE, make_executor, resolve_seed, run_chunks
+from .stats import DEFAULT_BIN_WIDTH
+
+DEFAULT_MAX_SAMPLES = 2_000_000
+
+
+def run_adaptive(simulate, tasks, rel_tol, seed=None, max_samples=DEFAULT_MAX_SAMPLES,
+                 chunk_size=DEFAULT_CHUNK_SIZE, chunks_per_round=4, z=1.96, max_workers=None,
+                 bin_width=DEFAULT_BIN_WIDTH):
+    """对每个配置模拟到 95% 置信区间半宽 <= rel_tol * |均值| 或达到 max_samples 为止。
+
+    参数与 run_parallel 相同，返回与 tasks 对应的 SampleStats 列表，其 count 即实际样本数。
+    """
+    seed = resolve_seed(seed)
+    stats = [None] * len(tasks)
+    next_chunk = [0] * len(tasks)
+    active = list(range(len(tasks)))
+    executor = make_executor(max_workers)
+    try:
+        while active:
+            plan = []
+            for i in active:
+                done = stats[i].count if stats[i] is not None else 0
+                for j in range(next_chunk[i], next_chunk[i] + chunks_per_round):
+                    n = min(chunk_size, max_samples - done)
+                    if n <= 0:
+                        break
+                    plan.append((i, j, n))
+                    done += n
+            partials = run_chunks(simulate, tasks, plan, seed, executor, bin_width)
+
+            still_active = []
+            for i in active:
+                finished = False
+                for key in sorted(key for key in partials if key[0] == i):
+                    stats[i] = partials[key] if stats[i] is None else stats[i].merge(partials[key])
+                    next_chunk[i] = key[1] + 1
+                    if _converged(stats[i], rel_tol, z) or stats[i].count >= max_samples:
+                        finished = True
+                        break
+                if not finished:
+                    still_active.append(i)
+            active = still_active
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return stats
+
+
+def _converged(stats, rel_tol, z):
+    return stats.count > 1 and stats.total_ci_half_width(z) <= rel_tol * abs(stats.total_mean)
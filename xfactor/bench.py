@@ -0,0 +1,193 @@
+"""
+基准测试与统计等价性检查
+
+    python -m xfactor.bench                      # 全部武将、全部配置，结果写入 xfactor-bench-<时间>.json
+    python -m xfactor.bench --quick --hero wangyi
+    python -m xfactor.bench --compare 上次结果.json
+
+对每个 (武将, build, 辅助) 配置记录：
+- 标量参考实现(模型的 reference)与各引擎的吞吐量(场/秒)；引擎包括批量引擎、方差缩减后的
+  批量引擎以及 ScalarEngine 包装的参考实现(BlockRNG 取数，样本数与参考实现相同)；
+- 批量引擎处理一个分块时的峰值内存(tracemalloc)；
+- 统计等价性：固定种子下，各引擎的期望总伤害与参考实现之差不超过 z_tol 倍合并标准误
+  (王异另与精确期望比较)。任何更快的新引擎都必须通过这项检查。
+另外以子进程运行各期脚本的 __main__ 流程(无图形界面、空缓存)，记录端到端耗时。
+有配置未通过等价性检查时退出码为 1。
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+
+from .models import HEROES, load_model
+from .runner import DEFAULT_CHUNK_SIZE, run_parallel
+from .stats import SampleStats
+from .rng import ScalarEngine
+from .variance import with_variance_reduction
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 引擎名: 方差缩减模式；'scalar' 为 ScalarEngine 包装的标量参考实现
+ENGINES = {'batch': None, 'batch+antithetic+control': 'antithetic+control', 'scalar+blockrng': 'scalar'}
+# 端到端计时运行的各期脚本(输出表格与图表)
+SCRIPTS = {
+    'wangyi': '第九期-2025-06-15-王异.py',
+    'nver': '第十期-2025-06-17-神锋百淬-女儿.py',
+}
+
+
+def measure_reference(reference, task, runs, seed):
+    """标量参考实现逐场运行 runs 次，返回 (每场总伤害数组, 耗时秒)。"""
+    random.seed(seed)
+    start = time.perf_counter()
+    totals = [np.sum(reference(*task)) for _ in range(runs)]
+    return np.asarray(totals, dtype=np.float64), time.perf_counter() - start
+
+
+def measure_batch(simulate, task, n_samples, seed):
+    """在当前进程中按分块运行，返回 (SampleStats, 耗时秒, 单个分块的峰值内存字节数)。"""
+    start = time.perf_counter()
+    stats = run_parallel(simulate, [task], n_samples, seed=seed, max_workers=1)[0]
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    simulate(*task, n=min(n_samples, DEFAULT_CHUNK_SIZE), rng=np.random.default_rng(seed))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return stats, elapsed, peak
+
+
+def z_score(reference_stats, candidate_stats):
+    """两组独立样本的均值之差除以合并标准误。"""
+    se = np.sqrt(reference_stats.total_var / reference_stats.count + candidate_stats.total_var / candidate_stats.count)
+    return float((candidate_stats.total_mean - reference_stats.total_mean) / se) if se > 0 else 0.0
+
+
+def engine_simulate(model, mode):
+    """ENGINES 中的模式对应的模拟函数。"""
+    if mode == 'scalar':
+        return ScalarEngine(model.reference)
+    return with_variance_reduction(model.simulate, mode)
+
+
+def bench_hero(name, reference_runs, batch_samples, seed, z_tol):
+    model = load_model(name)
+    rows = []
+    for label, task in model.default_tasks():
+        reference_totals, reference_time = measure_reference(model.reference, task, reference_runs, seed)
+        reference_stats = SampleStats.from_samples(reference_totals)
+        exact = float(np.sum(model.exact(*task))) if model.exact else None
+        for engine, mode in ENGINES.items():
+            simulate = engine_simulate(model, mode)
+            samples = reference_runs if mode == 'scalar' else batch_samples
+            stats, elapsed, peak = measure_batch(simulate, task, samples, seed)
+            battles = stats.count * getattr(simulate, 'cost', 1)
+            row = {
+                'hero': name, 'config': label, 'engine': engine,
+                'reference_samples_per_s': reference_runs / reference_time,
+                'batch_samples_per_s': battles / elapsed,
+                'speedup': (battles / elapsed) / (reference_runs / reference_time),
+                'batch_peak_bytes_per_chunk': peak,
+                'reference_mean': reference_stats.total_mean,
+                'reference_ci_half_width': float(reference_stats.total_ci_half_width()),
+                'batch_mean': stats.total_mean,
+                'batch_ci_half_width': float(stats.total_ci_half_width()),
+                'z': z_score(reference_stats, stats),
+            }
+            checks = [abs(row['z']) <= z_tol]
+            if exact is not None:
+                row['exact_mean'] = exact
+                row['z_exact'] = float((stats.total_mean - exact) / np.sqrt(stats.total_var / stats.count))
+                checks.append(abs(row['z_exact']) <= z_tol)
+            row['passed'] = all(checks)
+            rows.append(row)
+            print(f"{name:7s} {label:28s} {engine:26s} 参考 {row['reference_samples_per_s']:>9,.0f} 场/秒  "
+                  f"批量 {row['batch_samples_per_s']:>11,.0f} 场/秒  峰值 {peak / 2**20:6.1f} MiB  "
+                  f"z={row['z']:+.2f}{'' if row['passed'] else '  未通过'}")
+    return rows
+
+
+def bench_pipeline(name):
+    """以子进程运行脚本的 __main__ 流程，返回端到端耗时。使用临时目录，不读写已有缓存。"""
+    script = SCRIPTS[name]
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ, MPLBACKEND='Agg', XFACTOR_CACHE_DIR=os.path.join(workdir, 'cache'))
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable, os.path.join(REPO_ROOT, script)], cwd=workdir, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        elapsed = time.perf_counter() - start
+    print(f"{name:7s} {script}: {elapsed:.1f} 秒 (退出码 {completed.returncode})")
+    return {'hero': name, 'script': script, 'wall_time_s': elapsed, 'returncode': completed.returncode}
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'commit': commit, 'python': platform.python_version(),
+        'numpy': np.__version__, 'platform': platform.platform(), 'cpu_count': os.cpu_count(),
+    }
+
+
+def compare(results, previous):
+    """打印本次与上次结果的吞吐量和端到端耗时之比。"""
+    old = {(row['hero'], row['config'], row['engine']): row for row in previous['configs']}
+    print("\n--- 与上次结果对比 (本次 / 上次) ---")
+    for row in results['configs']:
+        before = old.get((row['hero'], row['config'], row['engine']))
+        if before:
+            print(f"{row['hero']:7s} {row['config']:28s} {row['engine']:26s} "
+                  f"批量吞吐量 x{row['batch_samples_per_s'] / before['batch_samples_per_s']:.2f}")
+    old_pipelines = {row['hero']: row for row in previous.get('pipelines', [])}
+    for row in results['pipelines']:
+        if row['hero'] in old_pipelines:
+            print(f"{row['hero']:7s} 端到端耗时 x{row['wall_time_s'] / old_pipelines[row['hero']]['wall_time_s']:.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m xfactor.bench', description='模拟引擎基准测试与统计等价性检查')
+    parser.add_argument('--hero', choices=sorted(HEROES), action='append', help='只测试指定武将(可重复)')
+    parser.add_argument('--quick', action='store_true', help='减少样本量，用于快速检查')
+    parser.add_argument('--reference-runs', type=int, help='每个配置的标量参考实现场数')
+    parser.add_argument('--batch-samples', type=int, help='每个配置每个批量引擎的样本数')
+    parser.add_argument('--seed', type=int, default=20250615)
+    parser.add_argument('--z-tol', type=float, default=4.0, help='等价性检查允许的 |z| 上限')
+    parser.add_argument('--skip-pipelines', action='store_true', help='不运行各期脚本的端到端流程')
+    parser.add_argument('--output', help='结果 JSON 路径，默认 xfactor-bench-<时间>.json')
+    parser.add_argument('--compare', help='与之前保存的结果 JSON 对比')
+    args = parser.parse_args(argv)
+
+    reference_runs = args.reference_runs or (2000 if args.quick else 20000)
+    batch_samples = args.batch_samples or (65536 if args.quick else 524288)
+    heroes = args.hero or sorted(HEROES)
+    results = {'environment': environment(),
+               'settings': {'reference_runs': reference_runs, 'batch_samples': batch_samples,
+                            'seed': args.seed, 'z_tol': args.z_tol},
+               'configs': [], 'pipelines': []}
+    for name in heroes:
+        results['configs'] += bench_hero(name, reference_runs, batch_samples, args.seed, args.z_tol)
+    if not args.skip_pipelines:
+        results['pipelines'] = [bench_pipeline(name) for name in heroes]
+    results['passed'] = (all(row['passed'] for row in results['configs'])
+                         and all(row['returncode'] == 0 for row in results['pipelines']))
+
+    output = args.output or time.strftime('xfactor-bench-%Y%m%d-%H%M%S.json')
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已保存到 {output}，等价性检查{'全部通过' if results['passed'] else '有未通过项'}")
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(results, json.load(f))
+    return 0 if results['passed'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""
+持久化结果缓存
+
+键是以下内容的哈希：模型模块中全部模块级数值常量(技能系数、战斗回合数等)、模拟函数的
+名称、模拟代码(见 code_digest)、单个配置(build/辅助)以及运行参数(样本数或相对误差、种子等)。值是该配置的
+样本数、每回合均值/方差与总伤害直方图，以压缩 .npz 文件保存在缓存目录中。
+
+缓存总大小超过上限时按最近使用时间(LRU)淘汰。只改图表字体、颜色时直接命中缓存；
+修改任何系数都会自动得到新的键。手动清除缓存：
+
+    python -m xfactor.cache info
+    python -m xfactor.cache invalidate [--match 关键字]
+"""
+
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import sys
+
+import numpy as np
+
+from .stats import Histogram, SampleStats
+
+DEFAULT_CACHE_DIR = os.environ.get('XFACTOR_CACHE_DIR', '.xfactor_cache')
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# 不影响模拟结果的运行设置，不参与缓存键
+IGNORED_SETTINGS = {'并行进程数'}
+# 不影响模拟结果的运行参数
+IGNORED_PARAMS = {'max_workers', 'chunks_per_round'}
+
+
+def model_constants(namespace):
+    """模型模块命名空间中全部模块级数值常量，例如 QCFY_PROB、神锋_基础发动率、战斗回合数。"""
+    return {
+        name: value for name, value in namespace.items()
+        if not name.startswith('_') and name not in IGNORED_SETTINGS
+        and isinstance(value, (int, float)) and not callable(value)
+    }
+
+
+def source_digest(func):
+    """函数、类或模块源码的 SHA-256；取不到源码(内置函数、交互式定义等)时为空串的哈希。"""
+    try:
+        source = inspect.getsource(func)
+    except (OSError, TypeError):
+        source = ''
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+
+def code_digest(simulate):
+    """simulate 的源码及其依赖的全部 xfactor 模块源码的哈希。
+
+    从 simulate 出发，经方差缩减包装(.simulate)、ScalarEngine(.reference) 等找到实际运行的函数，
+    再从它们所在的模块出发，沿模块全局名字所指的 xfactor 模块(spec、stats、variance 等)逐层收集。
+    因此改动辅助/整备定义、compile_team、方差缩减或统计代码都会得到新的哈希。
+    """
+    package = __name__.split('.')[0]
+    sources, seen, objects, pending = {}, set(), [simulate], []
+    while objects:
+        obj = objects.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        sources[f'object:{getattr(obj, "__qualname__", repr(type(obj)))}'] = source_digest(obj)
+        # 包装对象经 functools.update_wrapper 复制了被包装函数的 __module__，类所在的模块另行加入
+        pending += [getattr(obj, '__module__', None), type(obj).__module__]
+        objects.extend(getattr(obj, name) for name in ('simulate', 'reference', '__wrapped__') if hasattr(obj, name))
+    while pending:
+        name = pending.pop()
+        if not isinstance(name, str) or name in sources or name.split('.')[0] != package or name not in sys.modules:
+            continue
+        module = sys.modules[name]
+        sources[name] = source_digest(module)
+        for value in vars(module).values():
+            pending.append(value.__name__ if inspect.ismodule(value) else getattr(value, '__module__', None))
+    text = json.dumps(sources, sort_keys=True)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """以目录形式保存的、总大小有上限的 LRU 结果缓存。"""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def key(self, namespace, simulate, task, **params):
+        payload = {
+            'constants': model_constants(namespace),
+            'simulate': getattr(simulate, '__qualname__', repr(simulate)),
+            'source': code_digest(simulate),
+            'task': task,
+            'params': {k: v for k, v in params.items() if k not in IGNORED_PARAMS},
+        }
+        text = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=repr)
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.npz')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                histogram = Histogram(float(data['bin_width']), int(data['hist_offset']), data['hist_counts'])
+                stats = SampleStats.from_moments(int(data['count']), data['mean'], data['var'],
+                                                 float(data['total_mean']), float(data['total_var']), histogram)
+        except (OSError, KeyError, ValueError):
+            return None
+        os.utime(path)  # 记录最近使用时间，供 LRU 淘汰
+        return stats
+
+    def put(self, key, stats, description=''):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self._path(key) + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, count=stats.count, mean=stats.mean, var=stats.var,
+                                total_mean=stats.total_mean, total_var=stats.total_var,
+                                bin_width=stats.histogram.bin_width, hist_offset=stats.histogram.offset,
+                                hist_counts=stats.histogram.counts, description=np.array(description))
+        os.replace(tmp_path, self._path(key))
+        self._evict()
+
+    def entries(self):
+        """[(路径, 大小, 最近使用时间), ...]，按最近使用时间从旧到新排列。"""
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz'):
+                path = os.path.join(self.directory, name)
+                st = os.stat(path)
+                entries.append((path, st.st_size, st.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def _evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def invalidate(self, match=None):
+        """删除全部缓存；给定 match 时只删除描述中包含该关键字的条目。返回删除的条目数。"""
+        removed = 0
+        for path, _, _ in self.entries():
+            if match is not None:
+                with np.load(path) as data:
+                    if match not in str(data['description']):
+                        continue
+            os.remove(path)
+            removed += 1
+        return removed
+
+
+def cached_run(cache, namespace, run, simulate, tasks, **params):
+    """与 run(simulate, tasks, **params) 相同，但先查缓存，只模拟未命中的配置。
+
+    run 为 run_parallel 或 run_adaptive；cache 为 None 或未指定种子时不使用缓存。
+    随机数流由配置内容决定，因此只重跑未命中的配置也与完整运行的结果一致。
+    """
+    if cache is None or params.get('seed') is None:
+        return run(simulate, tasks, **params)
+    keys = [cache.key(namespace, simulate, task, **params) for task in tasks]
+    results = [cache.get(key) for key in keys]
+    missing = [i for i, stats in enumerate(results) if stats is None]
+    if missing:
+        computed = run(simulate, [tasks[i] for i in missing], **params)
+        for i, stats in zip(missing, computed):
+            cache.put(keys[i], stats, description=f'{simulate.__name__} {tasks[i]!r}')
+            results[i] = stats
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m xfactor.cache', description='管理模拟结果缓存')
+    parser.add_argument('--dir', default=DEFAULT_CACHE_DIR, help='缓存目录')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('info', help='显示缓存条目数与总大小')
+    invalidate = sub.add_parser('invalidate', help='清除缓存')
+    invalidate.add_argument('--match', help='只清除描述中包含该关键字的条目，例如模拟函数名')
+    args = parser.parse_args(argv)
+
+    cache = ResultCache(args.dir)
+    if args.command == 'info':
+        entries = cache.entries()
+        print(f"{args.dir}: {len(entries)} 条, {sum(size for _, size, _ in entries) / 1024:.1f} KiB")
+    else:
+        print(f"已清除 {cache.invalidate(args.match)} 条缓存")
+
+
+if __name__ == '__main__':
+    main()
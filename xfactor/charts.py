@@ -0,0 +1,244 @@
+"""
+图表渲染阶段
+
+模拟与绘图分成两个阶段：模拟结果先保存为 xfactor simulate 的 JSON 结果文件，本模块再按
+武将把结果文件转换成图表定义(数据 + 样式，见 wangyi_charts / nver_charts)，在进程池中
+并行渲染。每张图的定义、输出格式、分辨率、字体与渲染函数源码的哈希记录在输出目录的
+.xfactor_charts.json 中，全部未变且图片文件仍在时跳过该图。
+
+    xfactor render wangyi.json nver.json --format svg --dpi 150 --out-dir charts
+    render_charts(['wangyi_results.json'], fmt='png', dpi=120)
+
+渲染使用 matplotlib 的面向对象接口(Figure)，不依赖 pyplot 的全局状态，也不改变调用方的后端与字体设置。
+"""
+
+import hashlib
+import json
+import os
+
+from .cache import source_digest
+from .runner import make_executor
+
+CHART_FORMATS = ('png', 'svg')
+DEFAULT_DPI = 120
+DEFAULT_FONTS = ('Microsoft YaHei', 'SimHei')
+MANIFEST = '.xfactor_charts.json'
+
+
+# ==============================================================================
+# 渲染函数：chart 为可序列化的图表定义，返回 matplotlib Figure
+# ==============================================================================
+def _bar(Figure, chart):
+    # 单序列条形图(王异各辅助对比)
+    style = chart['style']
+    fig = Figure(figsize=(16, 10))
+    ax = fig.subplots()
+    index = range(len(chart['labels']))
+    bars = ax.bar(index, chart['values'], 0.5, color=style['color'], edgecolor='black', zorder=2)
+    ax.set_title(style['title'], fontsize=24, fontweight='bold', pad=20)
+    ax.set_ylabel(style['ylabel'], fontsize=18, fontweight='bold')
+    ax.tick_params(axis='y', labelsize=14)
+    ax.set_xticks(list(index))
+    ax.set_xticklabels(chart['labels'], rotation=0, ha='center', fontsize=30, fontweight='bold')
+    ax.grid(True, linestyle='--', alpha=0.7, axis='y')
+    for p in bars:
+        ax.annotate(style['value_format'].format(p.get_height()), (p.get_x() + p.get_width() / 2., p.get_height()),
+                    ha='center', va='center', xytext=(0, 10), textcoords='offset points', fontsize=14,
+                    fontweight='bold')
+    fig.tight_layout()
+    return fig
+
+
+def _grouped_bar(Figure, chart):
+    # 分组条形图(女儿各辅助 × 各 build)
+    style = chart['style']
+    fig = Figure(figsize=(10, 8))
+    ax = fig.subplots()
+    series = chart['series']
+    bar_width, num_builds = 0.25, len(series)
+    index = list(range(len(chart['labels'])))
+    for i, (name, values) in enumerate(series.items()):
+        offset = bar_width * (i - (num_builds - 1) / 2)
+        bar = ax.bar([x + offset for x in index], values, bar_width, label=name,
+                     color=style['colors'][i % len(style['colors'])], edgecolor='black')
+        ax.bar_label(bar, fmt='%.1f', padding=3, fontsize=12, fontweight='bold')
+    ax.set_xlabel(style['xlabel'], fontsize=26, fontweight='bold')
+    ax.set_ylabel(style['ylabel'], fontsize=26, fontweight='bold')
+    ax.set_title(style['title'], fontsize=30, fontweight='bold')
+    ax.set_xticks(index)
+    ax.set_xticklabels(chart['labels'], rotation=0, fontsize=24, fontweight='bold')
+    ax.tick_params(axis='y', labelsize=22)
+    ax.legend(prop={'weight': 'bold', 'size': 20})
+    ax.grid(axis='y', linestyle='--', alpha=0.7)
+    fig.tight_layout()
+    return fig
+
+
+def _line(Figure, chart):
+    # 每回合趋势折线图
+    style = chart['style']
+    fig = Figure(figsize=(14, 8))
+    ax = fig.subplots()
+    for name, values in chart['series'].items():
+        ax.plot(chart['x'], values, marker='o', linestyle='-', linewidth=2, label=name)
+    ax.set_title(style['title'], fontsize=16, fontweight='bold')
+    ax.set_xlabel(style['xlabel'], fontsize=12)
+    ax.set_ylabel(style['ylabel'], fontsize=12)
+    ax.legend(title=style.get('legend_title'))
+    ax.grid(True, linestyle='--', alpha=0.7)
+    fig.tight_layout()
+    return fig
+
+
+RENDERERS = {'bar': _bar, 'grouped_bar': _grouped_bar, 'line': _line}
+
+
+# ==============================================================================
+# 各武将的图表定义
+# ==============================================================================
+def _turns(record):
+    return [record[key] for key in sorted((k for k in record if k.startswith('turn_')), key=lambda k: int(k[5:]))]
+
+
+def wangyi_charts(records):
+    """王异：前3回合与全部回合累计伤害、各辅助提升百分比及每回合趋势(系数以 % 表示)。"""
+    per_turn = {record['config']: [value * 100 for value in _turns(record)] for record in records}
+    turns = len(next(iter(per_turn.values())))
+    ordered = sorted(per_turn, key=lambda config: sum(per_turn[config]), reverse=True)
+    solo = [record['config'] for record in records if not record['supports']]
+    baseline = sum(per_turn[solo[0]]) if solo else None
+    charts = [
+        {'name': 'damage_cumulative_3_turns_separate', 'kind': 'bar', 'labels': ordered,
+         'values': [sum(per_turn[config][:3]) for config in ordered],
+         'style': {'title': '不同辅助下王异【前3回合】累计期望伤害系数', 'ylabel': '期望伤害系数 (%)',
+                   'color': 'skyblue', 'value_format': '{:.0f}%'}},
+        {'name': f'damage_cumulative_{turns}_turns_separate', 'kind': 'bar', 'labels': ordered,
+         'values': [sum(per_turn[config]) for config in ordered],
+         'style': {'title': f'不同辅助下王异【前{turns}回合】累计期望伤害系数', 'ylabel': '期望伤害系数 (%)',
+                   'color': 'lightcoral', 'value_format': '{:.0f}%'}},
+    ]
+    if baseline:
+        boosted = [config for config in ordered if config not in solo]
+        charts.append({
+            'name': 'support_boost_percentage', 'kind': 'bar', 'labels': boosted,
+            'values': [(sum(per_turn[config]) / baseline - 1) * 100 for config in boosted],
+            'style': {'title': f'各辅助对王异{turns}回合总伤害提升对比', 'ylabel': '伤害提升百分比 (%)',
+                      'color': 'mediumseagreen', 'value_format': '{:.2f}%'}})
+    charts.append({
+        'name': 'damage_trend_per_turn_lineplot', 'kind': 'line', 'x': [f'第{t + 1}回合' for t in range(turns)],
+        'series': per_turn,
+        'style': {'title': '不同辅助下王异「每回合」期望伤害系数趋势', 'xlabel': '回合数', 'ylabel': '期望伤害系数 (%)',
+                  'legend_title': '配置'}})
+    return charts
+
+
+def nver_charts(records):
+    """女儿：各辅助(行) × 各 build(分组)的期望总伤害，按第一个 build 的伤害降序排列。"""
+    from .models import nver
+    from .spec import support_names
+
+    support_labels = {'+'.join(support_names(config)): label for label, config in nver.SUPPORTS}
+    build_names = {build['skill2']: build['name'] for build in nver.BUILDS}
+    table = {}
+    for record in records:
+        support = support_labels.get(record['supports'], record['supports'] or '单独')
+        table.setdefault(support, {})[build_names.get(record['build'], record['build'])] = record['mean']
+    builds = list(dict.fromkeys(build for row in table.values() for build in row))
+    ordered = sorted(table, key=lambda support: table[support].get(builds[0], 0.0), reverse=True)
+    return [{
+        'name': 'nver_build_support_comparison', 'kind': 'grouped_bar', 'labels': ordered,
+        'series': {build: [table[support].get(build, 0.0) for support in ordered] for build in builds},
+        'style': {'title': '女儿不同Build及辅助下的期望伤害对比', 'xlabel': '辅助武将组合',
+                  'ylabel': '3回合期望总伤害系数', 'colors': ['cornflowerblue', 'salmon', 'lightgreen']},
+    }]
+
+
+CHART_BUILDERS = {'wangyi': wangyi_charts, 'nver': nver_charts}
+
+
+def load_charts(path):
+    """读取 xfactor simulate 的 JSON 结果文件，返回对应武将的图表定义列表。"""
+    with open(path, encoding='utf-8') as f:
+        results = json.load(f)
+    hero = results.get('hero')
+    if hero not in CHART_BUILDERS:
+        raise ValueError(f"{path}: 没有武将 {hero!r} 的图表定义，可选 {sorted(CHART_BUILDERS)}")
+    return CHART_BUILDERS[hero](results['results'])
+
+
+# ==============================================================================
+# 增量并行渲染
+# ==============================================================================
+def chart_digest(chart, fmt, dpi, fonts):
+    """图表定义、输出设置与渲染函数源码的哈希；与上次渲染相同则无需重画。"""
+    payload = {'chart': chart, 'format': fmt, 'dpi': dpi, 'fonts': list(fonts),
+               'renderer': source_digest(RENDERERS[chart['kind']])}
+    text = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]
+
+
+def _render_chart(chart, path, dpi, fonts):
+    import matplotlib
+    from matplotlib.figure import Figure
+
+    with matplotlib.rc_context({'font.family': 'sans-serif',
+                                'font.sans-serif': list(fonts) + matplotlib.rcParams['font.sans-serif'],
+                                'axes.unicode_minus': False}):
+        fig = RENDERERS[chart['kind']](Figure, chart)
+        fig.savefig(path, dpi=dpi)
+    return path
+
+
+def _read_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def render_charts(results, out_dir='.', fmt='png', dpi=DEFAULT_DPI, fonts=DEFAULT_FONTS, max_workers=None,
+                  force=False):
+    """把结果文件(路径列表)中的全部图表渲染到 out_dir，返回 [{'chart': 文件名, 'rendered': 是否重画}, ...]。
+
+    各结果文件的全部图表一起分发到进程池(max_workers 为 1 时在当前进程中渲染)；
+    定义与设置都未变且文件存在的图表被跳过，force 为 True 时全部重画。几个结果文件给出同名
+    图表(例如同一武将的两次结果)时，文件名前加上结果文件名(不含扩展名)，仍重名则报错。
+    """
+    if fmt not in CHART_FORMATS:
+        raise ValueError(f"未知的图表格式: {fmt!r}，可选 {CHART_FORMATS}")
+    os.makedirs(out_dir, exist_ok=True)
+    charts = [(path, chart) for path in results for chart in load_charts(path)]
+    names = [chart['name'] for _, chart in charts]
+    filenames = [f"{os.path.splitext(os.path.basename(path))[0]}-{chart['name']}.{fmt}"
+                 if names.count(chart['name']) > 1 else f"{chart['name']}.{fmt}" for path, chart in charts]
+    duplicates = sorted({filename for filename in filenames if filenames.count(filename) > 1})
+    if duplicates:
+        raise ValueError(f"多个结果文件会写出同名图表: {duplicates}；请给结果文件改用不同的文件名")
+    manifest = _read_manifest(out_dir)
+    jobs, records = {}, []
+    for filename, (_, chart) in zip(filenames, charts):
+        digest = chart_digest(chart, fmt, dpi, fonts)
+        stale = force or manifest.get(filename) != digest or not os.path.exists(os.path.join(out_dir, filename))
+        if stale:
+            jobs[filename] = (chart, digest)
+        records.append({'chart': filename, 'rendered': stale})
+
+    executor = make_executor(min(max_workers or os.cpu_count() or 1, len(jobs)) or 1)
+    try:
+        if executor is None:
+            for filename, (chart, _) in jobs.items():
+                _render_chart(chart, os.path.join(out_dir, filename), dpi, fonts)
+        else:
+            futures = [executor.submit(_render_chart, chart, os.path.join(out_dir, filename), dpi, fonts)
+                       for filename, (chart, _) in jobs.items()]
+            for future in futures:
+                future.result()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    manifest.update({filename: digest for filename, (_, digest) in jobs.items()})
+    with open(os.path.join(out_dir, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    return records
@@ -0,0 +1,424 @@
+"""
+命令行入口
+
+    xfactor simulate --hero wangyi --samples 1e6 --format json
+    xfactor simulate --hero nver --build Tieqi --support ZhenJi --support MaTeng+ZhenJi --format csv -o out.csv
+    xfactor optimize --hero nver --max-supports 2 --top 5 --budget 1e6
+    xfactor simulate --hero nver --samples 1e7 --distributions dist
+    xfactor query dist --turn 3 --exceedance 100 --exceedance 150 --plot cdf.png
+    xfactor render wangyi.json nver.json --format svg --dpi 150 --out-dir charts
+    xfactor shard init big --hero nver --samples 1e7 --seed 1 && xfactor shard run big && xfactor shard merge big
+    xfactor serve --port 8765 --workers 8
+    xfactor bench --quick
+    xfactor cache info
+
+simulate 只导入 numpy 与模型模块，不加载 matplotlib；pandas 仅在 --format parquet 时导入。
+render 读取 simulate 的 JSON 结果并行渲染图表，数据与样式未变的图表被跳过。
+serve 启动本地 HTTP 服务，合并相同的请求并渐进返回估计(见 xfactor.service)。
+结果为机器可读的 JSON(默认)、CSV 或 Parquet，每个配置一条记录，进度信息写到标准错误。
+也可以用 python -m xfactor 调用。
+"""
+
+import argparse
+import csv
+import io
+import json
+import sys
+import time
+
+from .adaptive import run_adaptive
+from .cache import DEFAULT_CACHE_DIR, ResultCache, cached_run
+from .charts import CHART_FORMATS, DEFAULT_DPI
+from .models import HEROES, builds_of, load_model, task_label
+from .runner import DEFAULT_CHUNK_SIZE, resolve_seed, run_parallel
+from .spec import compile_team, support_names
+from .variance import MODES, with_variance_reduction
+
+FORMATS = ('json', 'csv', 'parquet')
+
+
+def parse_count(text):
+    """样本数，允许 1e6 这样的写法。"""
+    value = float(text)
+    if value < 1 or value != int(value):
+        raise argparse.ArgumentTypeError(f"样本数须为正整数: {text}")
+    return int(value)
+
+
+def parse_support(text):
+    """辅助配置：none 表示单独出战，多个辅助用 + 连接，如 MaTeng+ZhenJi。"""
+    if text.lower() == 'none':
+        return None
+    names = text.split('+')
+    return {'name': names[0]} if len(names) == 1 else [{'name': name} for name in names]
+
+
+def check_selection(model, supports=None, builds=None):
+    """检查 build 名、辅助武将名与阵容是否有效，无效时报 ValueError(信息可直接显示给用户)。"""
+    choices = [build for build in builds_of(model) if build is not None]
+    unknown = [build for build in builds or [] if build not in choices]
+    if unknown:
+        raise ValueError(f"{model.HERO}没有 build {unknown}，可选 {choices}" if choices else f"{model.HERO}没有可选的 build")
+    definitions = model.support_specs()
+    for config in supports or []:
+        unknown = [name for name in support_names(config) if name not in definitions]
+        if unknown:
+            raise ValueError(f"未定义的辅助武将 {unknown}，可选 {sorted(definitions)}")
+        compile_team(config, definitions, 1)  # 重复或互相冲突的辅助
+
+
+def build_tasks(model, supports=None, builds=None):
+    """[(标签, 任务), ...]。未指定辅助与 build 时使用模型的默认配置。"""
+    if supports is None and builds is None:
+        return model.default_tasks()
+    if supports is None:
+        supports = [config for _, config in model.SUPPORTS]
+    if builds is None:
+        builds = builds_of(model)
+    return [(task_label(config, build), model.make_task(config, build)) for build in builds for config in supports]
+
+
+def _build_of(task):
+    return task[0]['skill2'] if len(task) > 1 else None
+
+
+def make_records(hero, tasks, results, cost=1, exact=None, traces=None):
+    """每个配置一条扁平记录：总伤害的均值、95% 置信区间半宽、分位数与每回合均值。"""
+    records = []
+    for k, ((label, task), stats) in enumerate(zip(tasks, results)):
+        record = {
+            'hero': hero, 'config': label, 'build': _build_of(task),
+            'supports': '+'.join(support_names(task[-1])),
+            'samples': stats.count, 'battles': stats.count * cost,
+            'mean': stats.total_mean, 'ci_half_width': float(stats.total_ci_half_width()),
+            'std': float(stats.total_var ** 0.5),
+            'p5': stats.total_quantile(0.05), 'p50': stats.total_quantile(0.5), 'p95': stats.total_quantile(0.95),
+        }
+        if stats.mean.size > 1:  # 每回合结果(王异)；只返回总伤害的模型(女儿)没有这些列
+            record.update({f'turn_{t + 1}': float(value) for t, value in enumerate(stats.mean)})
+        if exact is not None:
+            record['exact'] = float(exact(*task).sum())
+        if traces is not None:
+            record.update({f'event_{name}': value for name, value in traces[k].per_battle().items()})
+        records.append(record)
+    return records
+
+
+def write_records(records, metadata, fmt, output):
+    if fmt == 'parquet':
+        import pandas as pd
+
+        if output is None:
+            raise SystemExit("--format parquet 需要指定 --output")
+        frame = pd.DataFrame(records)
+        for name, value in metadata.items():
+            frame.attrs[name] = value
+        try:
+            frame.to_parquet(output, index=False)
+        except ImportError as error:
+            raise SystemExit(f"写入 parquet 需要 pyarrow (pip install xfactor[parquet]): {error}")
+        return
+    if fmt == 'json':
+        text = json.dumps({**metadata, 'results': records}, ensure_ascii=False, indent=2) + '\n'
+    else:
+        columns = list(dict.fromkeys(column for record in records for column in record))
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=columns, lineterminator='\n')
+        writer.writeheader()
+        writer.writerows(records)
+        text = buffer.getvalue()
+    if output is None:
+        sys.stdout.write(text)
+    else:
+        with open(output, 'w', encoding='utf-8', newline='') as f:
+            f.write(text)
+
+
+def simulate(args):
+    model = load_model(args.hero)
+    tasks = build_tasks(model, args.support, args.build)
+    batch = with_variance_reduction(model.simulate, args.variance_reduction)
+    seed = resolve_seed(args.seed)
+    cost = getattr(batch, 'cost', 1)
+    n_samples = max(args.samples // cost, 1)
+    cache = None if args.no_cache else ResultCache(args.cache_dir)
+    task_list = [task for _, task in tasks]
+    print(f"{model.HERO}: {len(tasks)} 个配置，种子 {seed}", file=sys.stderr)
+
+    start = time.perf_counter()
+    traces = None
+    if args.trace:
+        from .trace import run_traced
+
+        pairs = run_traced(batch, task_list, n_samples, seed=seed, chunk_size=args.chunk_size,
+                           max_workers=args.workers)
+        results, traces = [stats for stats, _ in pairs], [trace for _, trace in pairs]
+    elif args.distributions is not None:
+        from .distributions import write_distributions
+
+        results = write_distributions(model.simulate_turns, task_list, n_samples, args.distributions, seed=seed,
+                                      labels=[label for label, _ in tasks], chunk_size=args.chunk_size,
+                                      max_workers=args.workers)
+        print(f"每场每回合伤害已写入 {args.distributions}", file=sys.stderr)
+    elif args.rel_tol is not None:
+        results = cached_run(cache, vars(model), run_adaptive, batch, task_list, rel_tol=args.rel_tol, seed=seed,
+                             max_samples=args.max_samples, chunk_size=args.chunk_size, max_workers=args.workers)
+    else:
+        results = cached_run(cache, vars(model), run_parallel, batch, task_list, n_samples=n_samples, seed=seed,
+                             chunk_size=args.chunk_size, max_workers=args.workers)
+    elapsed = time.perf_counter() - start
+    print(f"完成，用时 {elapsed:.1f} 秒", file=sys.stderr)
+
+    records = make_records(args.hero, tasks, results, cost,
+                           model.exact if args.exact else None, traces)
+    metadata = {'hero': args.hero, 'seed': seed, 'samples': args.samples, 'rel_tol': args.rel_tol,
+                'variance_reduction': args.variance_reduction, 'elapsed_s': elapsed}
+    write_records(records, metadata, args.format, args.output)
+    return 0
+
+
+def optimize(args):
+    from .optimize import compositions, race
+
+    model = load_model(args.hero)
+    candidates = compositions(model, args.max_supports, args.build)
+    batch = with_variance_reduction(model.simulate, args.variance_reduction)
+    seed = resolve_seed(args.seed)
+    print(f"{model.HERO}: {len(candidates)} 个候选阵容，种子 {seed}", file=sys.stderr)
+    start = time.perf_counter()
+    results = race(batch, candidates, top_k=args.top, initial_samples=args.initial_samples, eta=args.eta,
+                   max_samples=args.max_samples, budget=args.budget, seed=seed, race_z=args.race_z,
+                   chunk_size=args.initial_samples, max_workers=args.workers)
+    elapsed = time.perf_counter() - start
+    print(f"完成，用时 {elapsed:.1f} 秒，共模拟 {sum(r['battles'] for r in results):,} 场", file=sys.stderr)
+
+    records = [{'hero': args.hero, 'config': record.pop('task'), **record} for record in results]
+    metadata = {'hero': args.hero, 'seed': seed, 'candidates': len(candidates), 'top_k': args.top,
+                'budget': args.budget, 'variance_reduction': args.variance_reduction, 'elapsed_s': elapsed}
+    write_records(records, metadata, args.format, args.output)
+    return 0
+
+
+def query(args):
+    from .distributions import DistributionStore
+
+    store = DistributionStore(args.directory)
+    configs = args.config or store.labels
+    records = []
+    for config in configs:
+        entry = store.entry(config)
+        record = {'config': entry['label'], 'samples': entry['samples'], 'turn': args.turn or entry['turns']}
+        values = store.percentiles(config, args.percentile, args.turn)
+        record.update({f'p{q:g}': float(value) for q, value in zip(args.percentile, values)})
+        if args.exceedance:
+            probabilities = store.exceedance(config, args.exceedance, args.turn)
+            record.update({f'P(>={x:g})': float(p) for x, p in zip(args.exceedance, probabilities)})
+        records.append(record)
+    if args.plot:
+        import matplotlib.pyplot as plt
+
+        ax = store.plot_cdf(configs, args.turn)
+        ax.figure.savefig(args.plot, dpi=120)
+        plt.close(ax.figure)
+        print(f"分布函数图已保存为 {args.plot}", file=sys.stderr)
+    write_records(records, {'directory': args.directory, 'seed': store.seed, 'turn': args.turn}, args.format, args.output)
+    return 0
+
+
+def render(args):
+    from .charts import render_charts
+
+    start = time.perf_counter()
+    records = render_charts(args.results, args.out_dir, args.format, args.dpi, max_workers=args.workers,
+                            force=args.force)
+    for record in records:
+        print(f"{'已渲染' if record['rendered'] else '未变化'}: {record['chart']}", file=sys.stderr)
+    print(f"完成，用时 {time.perf_counter() - start:.1f} 秒", file=sys.stderr)
+    return 0
+
+
+def shard(args):
+    from . import shards
+
+    if args.shard_command == 'init':
+        model = load_model(args.hero)
+        tasks = build_tasks(model, args.support, args.build)
+        cost = getattr(with_variance_reduction(model.simulate, args.variance_reduction), 'cost', 1)
+        job = shards.create_job(args.directory, args.hero, tasks, max(args.samples // cost, 1), resolve_seed(args.seed),
+                                args.chunk_size, args.shard_samples, args.variance_reduction)
+        print(f"{model.HERO}: {len(tasks)} 个配置，共 {len(shards.shard_plan(job))} 个分片，种子 {job['seed']}",
+              file=sys.stderr)
+        return 0
+    if args.shard_command in ('run', 'resume'):
+        start = time.perf_counter()
+        done = shards.run_shards(args.directory, args.workers, args.hosts, args.host_index,
+                                 progress=lambda n, total: print(f"分片 {n}/{total}", file=sys.stderr))
+        print(f"本次完成 {done} 个分片，用时 {time.perf_counter() - start:.1f} 秒", file=sys.stderr)
+    done, total = shards.shard_status(args.directory)
+    print(f"{args.directory}: 已完成 {done}/{total} 个分片", file=sys.stderr)
+    if args.shard_command == 'status':
+        return 0 if done == total else 1
+    if args.shard_command != 'merge':
+        return 0
+    job = shards.load_job(args.directory)
+    results = shards.merge_shards(args.directory)
+    cost = getattr(shards.job_simulate(job), 'cost', 1)
+    records = make_records(job['hero'], list(zip(job['labels'], job['tasks'])), results, cost)
+    metadata = {'hero': job['hero'], 'seed': job['seed'], 'samples': job['samples'] * cost,
+                'variance_reduction': job['variance_reduction'], 'shards': total}
+    write_records(records, metadata, args.format, args.output)
+    return 0
+
+
+def serve(args):
+    import asyncio
+
+    from . import service
+
+    def ready(server):
+        print(f"xfactor serve 正在监听 http://{args.host}:{args.port}，Ctrl+C 停止", file=sys.stderr)
+
+    try:
+        asyncio.run(service.serve(args.host, args.port, args.workers, args.cache_size, args.chunk_size, ready))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def add_run_options(parser):
+    parser.add_argument('--hero', required=True, choices=sorted(HEROES))
+    parser.add_argument('--seed', type=int, help='主种子，默认随机生成并写入结果')
+    parser.add_argument('--workers', type=int, help='并行进程数，默认使用全部 CPU 核心')
+    parser.add_argument('--variance-reduction', choices=MODES, help='方差缩减模式(样本数按每个样本耗费的场数折算)')
+    parser.add_argument('--format', choices=FORMATS, default='json')
+    parser.add_argument('-o', '--output', help='输出文件，默认写到标准输出(parquet 必须指定)')
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    # bench 与 cache 的参数原样交给各自的命令行
+    if argv[:1] == ['bench']:
+        from .bench import main as bench_main
+
+        return bench_main(argv[1:])
+    if argv[:1] == ['cache']:
+        from .cache import main as cache_main
+
+        return cache_main(argv[1:]) or 0
+
+    parser = argparse.ArgumentParser(prog='xfactor', description='X-Factor Lab 武将模拟命令行')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    sim = sub.add_parser('simulate', help='模拟并输出机器可读的结果')
+    add_run_options(sim)
+    sim.add_argument('--support', type=parse_support, action='append',
+                     help='辅助配置(可重复)：none、MaTeng 或 MaTeng+ZhenJi；默认为脚本中的全部配置')
+    sim.add_argument('--build', action='append', help='女儿的第二技能(可重复)，如 Tieqi；默认为全部 build')
+    sim.add_argument('--samples', type=parse_count, default=50000, help='每个配置的模拟场数，如 1e6')
+    sim.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    sim.add_argument('--rel-tol', type=float, help='启用自适应模式：95%% 置信区间半宽 / 均值 <= rel_tol 即停止')
+    sim.add_argument('--max-samples', type=parse_count, default=2000000, help='自适应模式下每个配置的样本数上限')
+    sim.add_argument('--exact', action='store_true', help='同时输出精确期望')
+    sim.add_argument('--trace', action='store_true', help='同时输出每场平均事件次数(不使用缓存，不支持自适应模式)')
+    sim.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    sim.add_argument('--no-cache', action='store_true', help='不读写结果缓存')
+    sim.add_argument('--distributions', metavar='DIR',
+                     help='另把每场每回合伤害按 float32 列写入该目录(不使用缓存，用 xfactor query 查询)')
+
+    opt = sub.add_parser('optimize', help='逐轮淘汰搜索期望伤害最高的阵容')
+    add_run_options(opt)
+    opt.add_argument('--max-supports', type=int, default=2, help='每个阵容至多几名辅助')
+    opt.add_argument('--build', action='append', help='只搜索这些第二技能(女儿，可重复)；默认为全部')
+    opt.add_argument('--top', type=int, default=5, help='返回前几名')
+    opt.add_argument('--initial-samples', type=parse_count, default=4096, help='第一轮每个候选的模拟场数(也是分块大小)')
+    opt.add_argument('--eta', type=int, default=2, help='每轮幸存候选的样本数倍增系数')
+    opt.add_argument('--max-samples', type=parse_count, default=1000000, help='每个候选的样本数上限')
+    opt.add_argument('--budget', type=parse_count, help='全部候选合计的模拟场数上限')
+    opt.add_argument('--race-z', type=float, default=3.0, help='淘汰时置信区间的标准误倍数')
+
+    qry = sub.add_parser('query', help='查询 --distributions 写出的完整伤害分布')
+    qry.add_argument('directory')
+    qry.add_argument('--config', action='append', help='配置标签(可重复)，默认为全部')
+    qry.add_argument('--turn', type=int, help='只统计前几回合的累计伤害，默认为总伤害')
+    qry.add_argument('--percentile', type=float, action='append', help='百分位(0~100，可重复)，默认 5、50、95')
+    qry.add_argument('--exceedance', type=float, action='append', help='输出 P(伤害 >= X) 的 X(可重复)')
+    qry.add_argument('--plot', help='把各配置的分布函数图保存到该文件(需要 matplotlib)')
+    qry.add_argument('--format', choices=FORMATS, default='json')
+    qry.add_argument('-o', '--output', help='输出文件，默认写到标准输出(parquet 必须指定)')
+
+    ren = sub.add_parser('render', help='由 simulate 的 JSON 结果并行渲染图表(跳过未变化的图表)')
+    ren.add_argument('results', nargs='+', help='xfactor simulate --format json 的结果文件')
+    ren.add_argument('--out-dir', default='.', help='图表输出目录')
+    ren.add_argument('--format', choices=CHART_FORMATS, default='png')
+    ren.add_argument('--dpi', type=int, default=DEFAULT_DPI)
+    ren.add_argument('--workers', type=int, help='并行进程数，默认使用全部 CPU 核心')
+    ren.add_argument('--force', action='store_true', help='全部重画')
+
+    shd = sub.add_parser('shard', help='分片运行超大作业：可断点续跑、可在多台机器上运行后合并')
+    shard_sub = shd.add_subparsers(dest='shard_command', required=True)
+    init = shard_sub.add_parser('init', help='创建作业')
+    init.add_argument('directory')
+    init.add_argument('--hero', required=True, choices=sorted(HEROES))
+    init.add_argument('--seed', type=int, help='主种子，默认随机生成并写入 job.json')
+    init.add_argument('--variance-reduction', choices=MODES, help='方差缩减模式(样本数按每个样本耗费的场数折算)')
+    init.add_argument('--support', type=parse_support, action='append', help='辅助配置(可重复)，同 simulate')
+    init.add_argument('--build', action='append', help='女儿的第二技能(可重复)，同 simulate')
+    init.add_argument('--samples', type=parse_count, required=True, help='每个配置的模拟场数，如 1e7')
+    init.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    init.add_argument('--shard-samples', type=parse_count, default=1000000, help='每个分片约多少场')
+    run = shard_sub.add_parser('run', aliases=['resume'], help='运行(或续跑)尚未完成的分片')
+    run.add_argument('directory')
+    run.add_argument('--workers', type=int, help='并行进程数，默认使用全部 CPU 核心')
+    run.add_argument('--hosts', type=int, default=1, help='共享该目录的机器数')
+    run.add_argument('--host-index', type=int, default=0, help='本机序号(0 ~ hosts-1)')
+    status = shard_sub.add_parser('status', help='显示已完成的分片数(未全部完成时退出码为 1)')
+    status.add_argument('directory')
+    merge = shard_sub.add_parser('merge', help='合并全部分片并输出结果表')
+    merge.add_argument('directory')
+    merge.add_argument('--format', choices=FORMATS, default='json')
+    merge.add_argument('-o', '--output', help='输出文件，默认写到标准输出(parquet 必须指定)')
+
+    srv = sub.add_parser('serve', help='启动本地模拟服务：合并相同请求、缓存结果并渐进返回估计')
+    srv.add_argument('--host', default='127.0.0.1')
+    srv.add_argument('--port', type=int, default=8765)
+    srv.add_argument('--workers', type=int, help='并行进程数，默认使用全部 CPU 核心')
+    srv.add_argument('--cache-size', type=int, default=256, help='内存中最多保留多少个配置的结果')
+    srv.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    sub.add_parser('bench', help='基准测试，参数见 xfactor bench -h')
+    sub.add_parser('cache', help='管理结果缓存，参数见 xfactor cache -h')
+
+    args = parser.parse_args(argv)
+    if args.command in ('simulate', 'optimize') or args.command == 'shard' and args.shard_command == 'init':
+        try:
+            check_selection(load_model(args.hero), getattr(args, 'support', None), args.build)
+        except ValueError as error:
+            parser.error(str(error))
+    if args.command == 'optimize':
+        return optimize(args)
+    if args.command == 'render':
+        try:
+            return render(args)
+        except (FileNotFoundError, ValueError) as error:
+            raise SystemExit(f"xfactor render: {error}")
+    if args.command == 'serve':
+        return serve(args)
+    if args.command == 'shard':
+        try:
+            return shard(args)
+        except (FileNotFoundError, ValueError) as error:
+            raise SystemExit(f"xfactor shard: {error}")
+    if args.command == 'query':
+        args.percentile = args.percentile or [5.0, 50.0, 95.0]
+        return query(args)
+    if args.exact and load_model(args.hero).exact is None:
+        parser.error(f"{args.hero} 没有精确期望引擎")
+    if args.trace and args.rel_tol is not None:
+        parser.error("--trace 不支持自适应模式")
+    if args.distributions is not None and (args.trace or args.rel_tol is not None or args.variance_reduction):
+        parser.error("--distributions 不能与 --trace、--rel-tol 或 --variance-reduction 同时使用")
+    return simulate(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,243 @@
+"""
+完整伤害分布的列式存储
+
+SampleStats 只保留均值、方差与总伤害直方图；需要逐场结果时(如「前 3 回合总伤害 >= X 的概率」)
+用 write_distributions 把每场每回合的伤害按 float32 列写入 .npy 文件，每个配置一个分区目录：
+
+    目录/
+        manifest.json              种子、分块大小与各分区的标签、任务、样本数、回合数
+        config-<流编号>/turn_1.npy  第 1 回合伤害，(n,) float32
+        ...
+        config-<流编号>/total.npy   总伤害，(n,) float32
+
+写入与 run_parallel 使用相同的随机数流，各进程直接写入预先分配好的内存映射文件，父进程
+不经手样本。DistributionStore 以 mmap_mode='r' 零拷贝读取各列，按块计算超过概率与 CDF，
+分位数只需一列的内存，几千万场的结果无需整体载入 pandas。
+
+    write_distributions(model.simulate_turns, tasks, 10_000_000, 'dist', seed=1, labels=labels)
+    store = DistributionStore('dist')
+    store.exceedance(labels[0], [300, 400], turn=3)     # P(前 3 回合总伤害 >= X)
+"""
+
+import json
+import os
+
+import numpy as np
+
+from .runner import DEFAULT_CHUNK_SIZE, chunk_rng, chunk_sizes, make_executor, resolve_seed, task_stream_id
+from .stats import DEFAULT_BIN_WIDTH, SampleStats
+from .variance import Antithetic, ControlVariates
+
+MANIFEST = 'manifest.json'
+DEFAULT_BLOCK_SIZE = 1 << 20
+
+
+def partition_name(task):
+    """配置的分区目录名，由配置内容决定(与随机数流编号相同)。"""
+    return f'config-{task_stream_id(task):016x}'
+
+
+def column_names(turns):
+    return [f'turn_{t + 1}' for t in range(turns)] + ['total']
+
+
+def _write_chunk(simulate, task, n, seed, chunk_index, offset, paths, bin_width):
+    samples = simulate(*task, n=n, rng=chunk_rng(seed, task_stream_id(task), chunk_index))
+    per_turn = np.asarray(samples, dtype=np.float64).reshape(n, -1)
+    columns = [per_turn[:, t] for t in range(per_turn.shape[1])] + [per_turn.sum(axis=1)]
+    if len(columns) != len(paths):
+        raise ValueError(f"simulate 返回 {per_turn.shape[1]} 个回合，分区有 {len(paths) - 1} 个回合列")
+    for path, column in zip(paths, columns):
+        target = np.load(path, mmap_mode='r+')
+        target[offset:offset + n] = column
+        target.flush()
+        del target
+    return SampleStats.from_samples(samples, bin_width)
+
+
+def write_distributions(simulate, tasks, n_samples, directory, seed=None, labels=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                        max_workers=None, bin_width=DEFAULT_BIN_WIDTH):
+    """对每个配置模拟 n_samples 场并把每场每回合的伤害写入 directory，返回与 tasks 对应的 SampleStats 列表。
+
+    simulate 须返回单场战斗的每回合伤害，如 model.simulate_turns(方差缩减包装后的样本不是单场
+    伤害，不能使用)。同一种子下返回的 SampleStats 与 run_parallel(simulate, ...) 逐位一致。
+    同一配置的分区会被覆盖，其他分区保留，因此可以分几次写入同一目录。
+    """
+    if isinstance(simulate, (Antithetic, ControlVariates)):
+        raise ValueError("伤害分布须使用单场战斗的结果，不能使用方差缩减包装")
+    seed = resolve_seed(seed)
+    labels = [repr(task) for task in tasks] if labels is None else list(labels)
+    os.makedirs(directory, exist_ok=True)
+    manifest = _read_manifest(directory) or {'partitions': []}
+    if manifest.get('seed') not in (None, seed):
+        manifest['partitions'] = []  # 不同种子的样本不混在同一目录中
+    manifest.update({'seed': seed, 'chunk_size': chunk_size})
+
+    entries, plan = [], []
+    for i, task in enumerate(tasks):
+        # 先用一场单独的模拟确定回合数，不占用分块的随机数流
+        turns = np.asarray(simulate(*task, n=1, rng=np.random.default_rng(0))).reshape(1, -1).shape[1]
+        name = partition_name(task)
+        os.makedirs(os.path.join(directory, name), exist_ok=True)
+        paths = [os.path.join(directory, name, f'{column}.npy') for column in column_names(turns)]
+        for path in paths:
+            np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(int(n_samples),))
+        entries.append({'label': labels[i], 'task': json.loads(json.dumps(task, ensure_ascii=False, default=repr)),
+                        'path': name, 'samples': int(n_samples), 'turns': turns})
+        offset = 0
+        for j, n in enumerate(chunk_sizes(n_samples, chunk_size)):
+            plan.append((i, j, n, offset, paths))
+            offset += n
+
+    executor = make_executor(max_workers)
+    try:
+        if executor is None:
+            partials = {(i, j): _write_chunk(simulate, tasks[i], n, seed, j, offset, paths, bin_width)
+                        for i, j, n, offset, paths in plan}
+        else:
+            futures = {(i, j): executor.submit(_write_chunk, simulate, tasks[i], n, seed, j, offset, paths, bin_width)
+                       for i, j, n, offset, paths in plan}
+            partials = {key: future.result() for key, future in futures.items()}
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    written = {entry['path'] for entry in entries}
+    manifest['partitions'] = [entry for entry in manifest['partitions'] if entry['path'] not in written] + entries
+    with open(os.path.join(directory, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    results = []
+    for i in range(len(tasks)):
+        keys = sorted(key for key in partials if key[0] == i)
+        merged = partials[keys[0]]
+        for key in keys[1:]:
+            merged = merged.merge(partials[key])
+        results.append(merged)
+    return results
+
+
+def _read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+class DistributionStore:
+    """只读访问 write_distributions 写出的目录。
+
+    配置可以用标签或在 partitions 中的序号指定；turn 为 None 时针对总伤害，为 t 时针对
+    前 t 回合的累计伤害。
+    """
+
+    def __init__(self, directory, block_size=DEFAULT_BLOCK_SIZE):
+        manifest = _read_manifest(directory)
+        if manifest is None:
+            raise FileNotFoundError(f"{directory} 中没有 {MANIFEST}，请先用 write_distributions 写入")
+        self.directory = directory
+        self.block_size = block_size
+        self.seed = manifest['seed']
+        self.partitions = manifest['partitions']
+
+    @property
+    def labels(self):
+        return [entry['label'] for entry in self.partitions]
+
+    def entry(self, config):
+        """某个配置在 manifest 中的记录(标签、任务、目录、样本数与回合数)。"""
+        if isinstance(config, int):
+            return self.partitions[config]
+        for entry in self.partitions:
+            if entry['label'] == config:
+                return entry
+        raise KeyError(f"没有配置 {config!r}，可选 {self.labels}")
+
+    def column(self, config, name='total'):
+        """某个配置的一列(turn_1 ... total)，以只读内存映射返回，不复制数据。"""
+        entry = self.entry(config)
+        return np.load(os.path.join(self.directory, entry['path'], f'{name}.npy'), mmap_mode='r')
+
+    def blocks(self, config, turn=None):
+        """逐块产生总伤害(turn 为 None)或前 turn 回合累计伤害的数组，每块至多 block_size 场。"""
+        entry = self.entry(config)
+        if turn is None or turn == entry['turns']:
+            columns = [self.column(config, 'total')]
+        elif 1 <= turn < entry['turns']:
+            columns = [self.column(config, f'turn_{t + 1}') for t in range(turn)]
+        else:
+            raise ValueError(f"turn 须在 1 到 {entry['turns']} 之间: {turn}")
+        for start in range(0, entry['samples'], self.block_size):
+            block = np.array(columns[0][start:start + self.block_size], dtype=np.float64)
+            for column in columns[1:]:
+                block += column[start:start + self.block_size]
+            yield block
+
+    def values(self, config, turn=None):
+        """总伤害或前 turn 回合累计伤害的完整数组；总伤害列直接返回内存映射。"""
+        entry = self.entry(config)
+        if turn is None or turn == entry['turns']:
+            return self.column(config, 'total')
+        values = np.empty(entry['samples'], dtype=np.float32)
+        start = 0
+        for block in self.blocks(config, turn):
+            values[start:start + len(block)] = block
+            start += len(block)
+        return values
+
+    def _count(self, config, thresholds, turn, side):
+        thresholds = np.asarray(thresholds, dtype=np.float64)
+        counts = np.zeros(thresholds.shape, dtype=np.int64)
+        total = 0
+        for block in self.blocks(config, turn):
+            counts += np.searchsorted(np.sort(block), thresholds, side=side)
+            total += len(block)
+        return counts, total
+
+    def exceedance(self, config, thresholds, turn=None):
+        """P(伤害 >= threshold)，thresholds 可以是标量或数组；逐块计算，内存与样本数无关。"""
+        below, total = self._count(config, thresholds, turn, 'left')
+        return 1.0 - below / total
+
+    def cdf(self, config, points=512, turn=None):
+        """经验分布函数在 points 个等距取值(或给定的取值数组)上的 (x, P(伤害 <= x))。"""
+        if np.ndim(points) == 0:
+            low, high = np.inf, -np.inf
+            for block in self.blocks(config, turn):
+                low, high = min(low, block.min()), max(high, block.max())
+            points = np.linspace(low, high, int(points))
+        x = np.asarray(points, dtype=np.float64)
+        at_or_below, total = self._count(config, x, turn, 'right')
+        return x, at_or_below / total
+
+    def percentiles(self, config, q, turn=None):
+        """伤害的 q 百分位(0~100，可以是数组)。需要一列(n × 4 字节)的临时内存。"""
+        return np.percentile(self.values(config, turn), q)
+
+    def summary(self, configs=None, q=(5, 50, 95), turn=None):
+        """每个配置(默认为全部)一条记录：样本数、均值与各百分位，可直接传给 pandas.DataFrame。"""
+        records = []
+        for config in self.labels if configs is None else configs:
+            entry = self.entry(config)
+            label = entry['label']
+            total = sum(block.sum() for block in self.blocks(label, turn))
+            record = {'task': label, 'samples': entry['samples'], 'mean': total / entry['samples']}
+            record.update({f'p{value:g}': float(p) for value, p in zip(q, self.percentiles(label, q, turn))})
+            records.append(record)
+        return records
+
+    def plot_cdf(self, configs=None, turn=None, ax=None, points=512):
+        """在同一张图上画出各配置的经验分布函数，返回 matplotlib 的 Axes。"""
+        import matplotlib.pyplot as plt
+
+        if ax is None:
+            _, ax = plt.subplots(figsize=(10, 6))
+        for config in self.labels if configs is None else configs:
+            x, probability = self.cdf(config, points, turn)
+            ax.plot(x, probability, label=self.entry(config)['label'])
+        ax.set_xlabel('总伤害系数' if turn is None else f'前 {turn} 回合累计伤害系数')
+        ax.set_ylabel('累计概率')
+        ax.grid(linestyle='--', alpha=0.7)
+        ax.legend()
+        return ax
@@ -0,0 +1,41 @@
+"""
+各期武将模型
+
+每个模块只依赖 numpy，导入时不加载 pandas/matplotlib，并提供统一的接口：
+
+- simulate(*task, n, rng, return_controls=False, trace=NULL_TRACE)：批量引擎；
+  snapshot_turns/resume 在指定回合结束时保存快照或从快照续跑(见 xfactor.snapshots)；
+- simulate_turns(*task, n, rng)：返回 (n, 战斗回合数) 每回合伤害的批量引擎(见 xfactor.distributions)；
+- reference(*task, rng=None)：逐场运行的标量参考实现(默认使用 random 模块，传入 xfactor.rng.BlockRNG 时从其缓冲区取数)；
+- exact(*task)：精确期望引擎(王异为马尔可夫链，女儿为枚举整备顺序的条件期望)，没有时为 None；
+- derive(namespace)：参数扫描时重新计算推导常量，没有时为 None；
+- support_specs()：按当前系数构造的辅助武将定义 {名字: SupportSpec}；
+- make_task(support_config, build) 与 default_tasks()：构造任务及脚本中使用的默认配置。
+"""
+
+import importlib
+
+from ..spec import support_names
+
+HEROES = {
+    'wangyi': 'xfactor.models.wangyi',
+    'nver': 'xfactor.models.nver',
+}
+
+
+def load_model(hero):
+    """按武将名(HEROES 的键)导入模型模块。"""
+    if hero not in HEROES:
+        raise KeyError(f"未知的武将: {hero}，可选 {sorted(HEROES)}")
+    return importlib.import_module(HEROES[hero])
+
+
+def builds_of(model):
+    """模型的全部可选 build(女儿的第二技能名)；没有可选 build 时为 [None]。"""
+    return [build['skill2'] for build in getattr(model, 'BUILDS', [])] or [None]
+
+
+def task_label(support_config=None, build=None):
+    """命令行与组合搜索使用的配置标签，如 'Tieqi / MaTeng+ZhenJi'。"""
+    label = '+'.join(support_names(support_config)) or '单独'
+    return f'{build} / {label}' if build else label
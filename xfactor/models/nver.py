@@ -0,0 +1,624 @@
+"""
+女儿模型 (第十期 2025-06-17 神锋百淬)
+
+技能、整备与辅助武将系数，第二技能/辅助/整备的声明式定义，标量参考实现
+run_single_simulation 与批量引擎 run_batch_simulation。本模块只依赖 numpy，不做任何输出；
+表格与图表见第十期脚本，命令行见 xfactor.cli。修改游戏数值时直接改下面的系数。
+"""
+
+import itertools
+import random
+
+import numpy as np
+
+from ..snapshots import capture, restore
+from ..spec import SkillSpec, StateEffect, SupportSpec, compile_team, effect_table
+from ..trace import NULL_TRACE
+
+HERO = '女儿'
+
+# ==============================================================================
+# 战斗参数
+# ==============================================================================
+战斗回合数 = 5
+
+# ==============================================================================
+# 技能系数定义
+# ==============================================================================
+武女传_增伤 = 0.05
+突战_追击增伤 = 0.07
+疾战_追击增伤 = 0.09
+神锋_基础发动率, 神锋_自带发动率加成, 神锋_伤害系数 = 0.70, 0.06, 0.80
+运智_每层谋略增伤, 运智_额外普攻发动率 = 0.078, 0.56
+谋而后动_基础发动率, 谋而后动_基础伤害系数, 谋而后动_额外发动率, 谋而后动_每回合伤害提升 = 0.75, 0.412, 0.50, 0.123
+铁骑_基础发动率, 铁骑_基础伤害系数, 铁骑_发动后奇谋提升, 铁骑_每回合伤害衰减 = 0.40, 4.00, 0.20, 1.00
+智破千军_发动率, 智破千军_伤害系数, 智破千军_增伤概率, 智破千军_增伤幅度 = 0.50, 1.80, 0.40, 0.20
+张春华_单次伤害系数, 张春华_心计获得概率, 张春华_每层心计增伤 = 0.721, 0.25, 0.0309
+张春华_心计上限, 张春华_追击所需心计 = 10, 6
+马腾_追击增伤, 马腾_额外普攻发动率, 马腾_持续回合 = 0.30, 0.65, 3
+甄姬_增伤 = 0.25
+庞统_传递增伤 = 0.42
+荀彧_奇谋率提升, 荀彧_看破增伤 = 0.56, 0.15
+荀彧_新增被动奇谋率, 荀彧_新增被动奇谋伤害 = 0.06, 0.10
+# 整备状态：神锋发动后按随机顺序依次获得 1~8 号整备，其中 4 个有效果
+整备2_奇谋率提升, 整备4_追击增伤, 整备5_神锋发动率提升, 整备7_奇谋伤害提升 = 0.20, 0.20, 0.10, 0.20
+
+# ==============================================================================
+# 辅助武将、第二技能与整备状态定义 (声明式，见 xfactor.spec)
+# ==============================================================================
+def 辅助定义():
+    """{名字: SupportSpec}。每次调用按当前系数构造，参数扫描修改系数后同样生效。"""
+    return {spec.name: spec for spec in (
+        SupportSpec('MaTeng', pursuit_boost=马腾_追击增伤, boost_turns=马腾_持续回合,
+                    extra_attack_prob=马腾_额外普攻发动率, extra_attack_turns=马腾_持续回合),
+        SupportSpec('ZhangChunhua', xinji_gain_prob=张春华_心计获得概率, xinji_max_stacks=张春华_心计上限,
+                    xinji_hit_coeff=张春华_单次伤害系数, xinji_hit_boost=张春华_每层心计增伤,
+                    follow_up_threshold=张春华_追击所需心计),
+        SupportSpec('ZhenJi', strategy_boost=甄姬_增伤, first_qimou_per_turn=True),
+        SupportSpec('PangTong', damage_bonus=庞统_传递增伤),
+        SupportSpec('XunYu', damage_bonus=荀彧_看破增伤, qimou_rate=荀彧_奇谋率提升 + 荀彧_新增被动奇谋率,
+                    qimou_damage=荀彧_新增被动奇谋伤害),
+    )}
+
+def 第二技能定义():
+    """{build 的 skill2: SkillSpec}。"""
+    return {spec.name: spec for spec in (
+        SkillSpec('MouErHouDong', 谋而后动_基础发动率, 谋而后动_基础伤害系数, 谋而后动_每回合伤害提升, targets=3,
+                  extra_hit_prob=谋而后动_额外发动率),
+        SkillSpec('Tieqi', 铁骑_基础发动率, 铁骑_基础伤害系数, -铁骑_每回合伤害衰减, extra_qimou_rate=铁骑_发动后奇谋提升),
+        SkillSpec('ZhiPoQianJun', 智破千军_发动率, 智破千军_伤害系数, hits=2,
+                  boost_prob=智破千军_增伤概率, boost_amount=智破千军_增伤幅度),
+    )}
+
+def 整备定义():
+    """{整备编号: StateEffect}，未列出的整备没有效果。"""
+    return {
+        2: StateEffect('奇谋率', 整备2_奇谋率提升),
+        4: StateEffect('追击增伤', 整备4_追击增伤),
+        5: StateEffect('神锋发动率', 整备5_神锋发动率提升),
+        7: StateEffect('奇谋伤害', 整备7_奇谋伤害提升),
+    }
+
+# ==============================================================================
+# 模拟核心函数
+# ==============================================================================
+def run_single_simulation(build_配置, support_配置=None, rng=None):
+    # rng 为 xfactor.rng.BlockRNG 时从其分块缓冲区取数，否则使用全局 random 模块
+    rand = random.random if rng is None else rng.uniform
+    总伤害 = 0.0
+    女儿状态 = {
+        '连击率': 1.0, '追击伤害加成': 突战_追击增伤 + 疾战_追击增伤,
+        '总伤害乘数': 1.0 + 武女传_增伤, '奇谋率': 0.0,
+        '奇谋伤害加成': 0.5, '运智铺谋层数': 0,
+    }
+    整备状态池 = list(range(1, 9)); (random.shuffle if rng is None else rng.shuffle)(整备状态池)
+    已获得整备 = set()
+    张春华心计层数 = 0
+
+    if support_配置:
+        if support_配置['name'] == 'PangTong': 女儿状态['总伤害乘数'] += 庞统_传递增伤
+        if support_配置['name'] == 'XunYu':
+            女儿状态['奇谋率'] += 荀彧_奇谋率提升 + 荀彧_新增被动奇谋率
+            女儿状态['总伤害乘数'] += 荀彧_看破增伤
+            女儿状态['奇谋伤害加成'] += 荀彧_新增被动奇谋伤害
+
+    for r in range(1, 战斗回合数 + 1):
+        本回合运智额外普攻已触发 = False
+        本回合甄姬增伤 = 0
+        本回合甄姬必定奇谋可用 = False
+        if support_配置 and support_配置['name'] == 'ZhenJi':
+            本回合甄姬增伤 = 甄姬_增伤; 本回合甄姬必定奇谋可用 = True
+
+        普攻列表 = ["普攻1", "普攻2"]
+        def process_attack(attack_type):
+            nonlocal 总伤害, 本回合运智额外普攻已触发, 本回合甄姬必定奇谋可用, 已获得整备, 张春华心计层数
+            女儿状态['运智铺谋层数'] += 1
+            if support_配置 and support_配置['name'] == 'ZhangChunhua':
+                当前张春华伤害 = 张春华_单次伤害系数 * (1 + 张春华心计层数 * 张春华_每层心计增伤)
+                总伤害 += 当前张春华伤害
+                if rand() < 张春华_心计获得概率 and 张春华心计层数 < 张春华_心计上限:
+                    张春华心计层数 += 1
+
+            if attack_type != '张春华哑火普攻':
+                本次攻击造成了谋略伤害 = False
+                神锋当前发动率 = 神锋_基础发动率 + 神锋_自带发动率加成
+                if 5 in 已获得整备: 神锋当前发动率 += 整备5_神锋发动率提升
+                if rand() < 神锋当前发动率:
+                    本次攻击造成了谋略伤害 = True
+                    追击增伤 = 女儿状态['追击伤害加成']
+                    if support_配置 and support_配置['name'] == 'MaTeng' and r <= 马腾_持续回合: 追击增伤 += 马腾_追击增伤
+                    if 4 in 已获得整备: 追击增伤 += 整备4_追击增伤
+                    伤害 = (神锋_伤害系数 * 2) * (1 + 追击增伤) * (1 + 本回合甄姬增伤)
+                    奇谋伤害加成 = 女儿状态['奇谋伤害加成']
+                    if 7 in 已获得整备: 奇谋伤害加成 += 整备7_奇谋伤害提升
+                    if 本回合甄姬必定奇谋可用:
+                        伤害 *= (1 + 奇谋伤害加成); 本回合甄姬必定奇谋可用 = False
+                    elif rand() < 女儿状态['奇谋率']:
+                        伤害 *= (1 + 奇谋伤害加成)
+                    总伤害 += 伤害
+                    if 整备状态池:
+                        新整备 = 整备状态池.pop(0); 已获得整备.add(新整备)
+                        if 新整备 == 2: 女儿状态['奇谋率'] += 整备2_奇谋率提升
+                if build_配置['skill2'] == 'MouErHouDong' and rand() < 谋而后动_基础发动率:
+                    本次攻击造成了谋略伤害 = True
+                    for _ in range(1 + (1 if rand() < 谋而后动_额外发动率 else 0)):
+                        谋系数 = 谋而后动_基础伤害系数 + (r - 1) * 谋而后动_每回合伤害提升
+                        追击增伤 = 女儿状态['追击伤害加成']
+                        if support_配置 and support_配置['name'] == 'MaTeng' and r <= 马腾_持续回合: 追击增伤 += 马腾_追击增伤
+                        if 4 in 已获得整备: 追击增伤 += 整备4_追击增伤
+                        伤害 = (谋系数 * 3) * (1 + 追击增伤) * (1 + 本回合甄姬增伤)
+                        奇谋伤害加成 = 女儿状态['奇谋伤害加成']
+                        if 7 in 已获得整备: 奇谋伤害加成 += 整备7_奇谋伤害提升
+                        if 本回合甄姬必定奇谋可用:
+                            伤害 *= (1 + 奇谋伤害加成); 本回合甄姬必定奇谋可用 = False
+                        elif rand() < 女儿状态['奇谋率']:
+                            伤害 *= (1 + 奇谋伤害加成)
+                        总伤害 += 伤害
+                if build_配置['skill2'] == 'Tieqi' and rand() < 铁骑_基础发动率:
+                    本次攻击造成了谋略伤害 = True
+                    铁骑系数 = 铁骑_基础伤害系数 - (r - 1) * 铁骑_每回合伤害衰减
+                    追击增伤 = 女儿状态['追击伤害加成']
+                    if support_配置 and support_配置['name'] == 'MaTeng' and r <= 马腾_持续回合: 追击增伤 += 马腾_追击增伤
+                    if 4 in 已获得整备: 追击增伤 += 整备4_追击增伤
+                    伤害 = 铁骑系数 * (1 + 追击增伤) * (1 + 本回合甄姬增伤)
+                    奇谋伤害加成 = 女儿状态['奇谋伤害加成']
+                    if 7 in 已获得整备: 奇谋伤害加成 += 整备7_奇谋伤害提升
+                    当前奇谋率 = 女儿状态['奇谋率'] + 铁骑_发动后奇谋提升
+                    if 本回合甄姬必定奇谋可用:
+                        伤害 *= (1 + 奇谋伤害加成); 本回合甄姬必定奇谋可用 = False
+                    elif rand() < 当前奇谋率:
+                        伤害 *= (1 + 奇谋伤害加成)
+                    总伤害 += 伤害
+                if build_配置['skill2'] == 'ZhiPoQianJun' and rand() < 智破千军_发动率:
+                    本次攻击造成了谋略伤害 = True
+                    for _ in range(2):
+                        单次伤害 = 智破千军_伤害系数
+                        if rand() < 智破千军_增伤概率:
+                            单次伤害 *= (1 + 智破千军_增伤幅度)
+                        追击增伤 = 女儿状态['追击伤害加成']
+                        if support_配置 and support_配置['name'] == 'MaTeng' and r <= 马腾_持续回合: 追击增伤 += 马腾_追击增伤
+                        if 4 in 已获得整备: 追击增伤 += 整备4_追击增伤
+                        伤害 = 单次伤害 * (1 + 追击增伤) * (1 + 本回合甄姬增伤)
+                        奇谋伤害加成 = 女儿状态['奇谋伤害加成']
+                        if 7 in 已获得整备: 奇谋伤害加成 += 整备7_奇谋伤害提升
+                        if 本回合甄姬必定奇谋可用:
+                            伤害 *= (1 + 奇谋伤害加成); 本回合甄姬必定奇谋可用 = False
+                        elif rand() < 女儿状态['奇谋率']:
+                            伤害 *= (1 + 奇谋伤害加成)
+                        总伤害 += 伤害
+                if 本次攻击造成了谋略伤害 and not 本回合运智额外普攻已触发:
+                    if rand() < 运智_额外普攻发动率:
+                        本回合运智额外普攻已触发 = True
+                        普攻列表.append("运智普攻")
+        i = 0
+        while i < len(普攻列表):
+            process_attack(普攻列表[i]); i += 1
+        普攻列表_追加阶段 = []
+        if support_配置:
+            if support_配置['name'] == 'MaTeng' and r <= 马腾_持续回合 and rand() < 马腾_额外普攻发动率:
+                普攻列表_追加阶段.append("马腾普攻")
+            if support_配置['name'] == 'ZhangChunhua':
+                if 张春华心计层数 < 张春华_追击所需心计:
+                    普攻列表_追加阶段.append("张春华哑火普攻")
+                else:
+                    普攻列表_追加阶段.append("张春华正常普攻")
+        for attack_type in 普攻列表_追加阶段:
+            process_attack(attack_type)
+    最终伤害 = 总伤害 * (1 + 女儿状态['运智铺谋层数'] * 运智_每层谋略增伤)
+    最终伤害 *= 女儿状态['总伤害乘数']
+    return 最终伤害
+
+# ==============================================================================
+# 向量化批量模拟 (NumPy 引擎)
+# ==============================================================================
+整备事件 = tuple(f'获得整备{编号}' for 编号 in range(1, 9))   # 事件追踪中已获得各整备的计数名
+
+
+def run_batch_simulation(build_配置, support_配置=None, n=50000, rng=None, return_controls=False, trace=NULL_TRACE,
+                         per_turn=False, snapshot_turns=None, resume=None):
+    """一次推进 n 场战斗，返回长度为 n 的最终伤害数组。
+
+    与 run_single_simulation 的规则逐条对应：每场战斗的整备状态池是 (n, 8) 排列矩阵中的一行，
+    已获得整备用位掩码表示(第 k 号整备对应第 k-1 位)，各整备效果按掩码查表。神锋、第二技能的
+    发动、奇谋判定以及甄姬每回合的必定奇谋都是带掩码的数组更新。
+
+    第二技能、辅助武将和整备效果在开始时由 第二技能定义/辅助定义/整备定义 一次性解析；
+    support_配置 可以是单个辅助 {'name': ...}，也可以是多个辅助组成的列表。
+
+    return_controls 为 True 时另返回 (n, 6) 的控制变量：神锋、第二技能、谋而后动追加段、奇谋、
+    运智以及张春华心计/马腾普攻每次判定的 (是否发动 - 发动率) 之和(前四项按该段伤害加权)。
+    它们的期望恰为 0，供 xfactor.variance.ControlVariates 使用。
+
+    trace 为 xfactor.trace.Trace 时记录神锋与第二技能发动、各号整备获得、运智与辅助普攻、
+    张春华哑火以及甄姬必定奇谋的次数和各攻击阶段的耗时(见 xfactor.trace.run_traced)。
+
+    per_turn 为 True 时返回 (n, 战斗回合数) 的每回合伤害：运智铺谋的层数增伤作用于全部伤害，
+    因此第 r 列定义为同一场战斗只打 r 回合与只打 r-1 回合的最终伤害之差，前 r 列之和恰为
+    r 回合战斗的最终伤害(各行之和即总伤害)。
+
+    snapshot_turns 为回合序号的集合时另返回 {回合: 快照}，快照含第 k 回合结束时的总伤害、运智铺谋与
+    心计层数、整备状态池与已获得整备、前 k 回合的累计伤害与随机数发生器的位置；resume=快照 时
+    从第 k+1 回合继续(忽略 rng，trace 只记录续跑的回合)，见 xfactor.snapshots。
+    """
+    if return_controls and (snapshot_turns is not None or resume is not None):
+        raise ValueError("控制变量需要完整的战斗，不能与回合快照同时使用")
+    rng = np.random.default_rng() if rng is None else rng
+    队伍 = compile_team(support_配置, 辅助定义(), 战斗回合数)
+    技能2 = 第二技能定义().get(build_配置['skill2'])
+    心计 = 队伍.xinji
+    有必定奇谋 = 队伍.first_qimou_per_turn
+    整备 = 整备定义()
+    奇谋率表, 追击增伤表, 神锋发动率表, 奇谋伤害表 = (effect_table(整备, 效果) for 效果 in ('奇谋率', '追击增伤', '神锋发动率', '奇谋伤害'))
+
+    总伤害 = np.zeros(n)
+    运智铺谋层数 = np.zeros(n, dtype=np.int64)
+    张春华心计层数 = np.zeros(n, dtype=np.int64)
+    已获得整备数 = np.zeros(n, dtype=np.int64)
+    已获得整备掩码 = np.zeros(n, dtype=np.int64)
+    基础奇谋率 = np.zeros(n) + 队伍.qimou_rate
+    奇谋率 = 基础奇谋率
+    if resume is None:
+        整备状态池 = (rng.random((8, n)).argsort(axis=0).T + 1).astype(np.int8)
+        起始回合 = 0
+    else:
+        起始回合, 状态, rng = restore(resume, n, 战斗回合数)
+        总伤害, 运智铺谋层数, 张春华心计层数 = 状态['总伤害'], 状态['运智铺谋层数'], 状态['张春华心计层数']
+        整备状态池, 已获得整备数, 已获得整备掩码 = 状态['整备状态池'], 状态['已获得整备数'], 状态['已获得整备掩码']
+        奇谋率 = 基础奇谋率 + 奇谋率表[已获得整备掩码]
+    全部 = np.ones(n, dtype=bool)
+    # 每次攻击抽取的随机数行：0 心计, 1 神锋, 2 神锋奇谋, 3 运智, 4 起为第二技能所需(见 SkillSpec.n_draws)
+    随机数行数 = 4 + (技能2.n_draws if 技能2 else 0)
+    行号 = np.arange(n)
+
+    基础追击增伤 = 突战_追击增伤 + 疾战_追击增伤
+    总伤害乘数 = 1.0 + 武女传_增伤
+    基础奇谋伤害加成 = 0.5
+    总伤害乘数 += 队伍.damage_bonus
+    基础奇谋伤害加成 += 队伍.qimou_damage
+    本回合甄姬增伤 = 队伍.strategy_boost
+    控制变量 = np.zeros((6, n)) if return_controls else None
+    快照 = {} if snapshot_turns is not None else None
+    # 快照需要前 k 回合的累计伤害，续跑时才能给出每回合伤害
+    累计伤害 = np.zeros((n, 战斗回合数)) if per_turn or 快照 is not None else None
+    if resume is not None and 累计伤害 is not None:
+        累计伤害[:, :起始回合] = 状态['累计伤害']
+
+    # 回合状态：每回合开始时重新赋值，下面的函数只定义一次
+    r = 0
+    本回合运智额外普攻已触发 = 本回合甄姬必定奇谋可用 = None
+    回合追击增伤 = 0.0
+
+    def 当前加成():
+        # 整备 4 提升追击增伤，整备 7 提升奇谋伤害
+        增伤倍率 = (1 + 回合追击增伤 + 追击增伤表[已获得整备掩码]) * (1 + 本回合甄姬增伤)
+        return 增伤倍率, 基础奇谋伤害加成 + 奇谋伤害表[已获得整备掩码]
+
+    def 结算谋略伤害(系数, 发动, 奇谋判定值, 加成, 额外奇谋率=0.0):
+        # 每段谋略伤害：追击/甄姬增伤 -> 奇谋(甄姬必定奇谋优先，否则按奇谋率判定)
+        nonlocal 总伤害
+        增伤倍率, 奇谋伤害加成 = 加成
+        if 有必定奇谋:
+            必定奇谋 = 发动 & 本回合甄姬必定奇谋可用
+            本回合甄姬必定奇谋可用[必定奇谋] = False
+            trace.count('甄姬必定奇谋', 必定奇谋)
+            奇谋 = 必定奇谋 | (奇谋判定值 < 奇谋率 + 额外奇谋率)
+        else:
+            奇谋 = 奇谋判定值 < 奇谋率 + 额外奇谋率
+        总伤害 += 发动 * (系数 * 增伤倍率) * (1 + 奇谋 * 奇谋伤害加成)
+        if return_controls:
+            需判定 = 发动 & ~必定奇谋 if 有必定奇谋 else 发动
+            控制变量[3] += 需判定 * (系数 * 增伤倍率 * 奇谋伤害加成) * (
+                (奇谋判定值 < 奇谋率 + 额外奇谋率) - np.minimum(奇谋率 + 额外奇谋率, 1.0))
+
+    def 结算第二技能(出手, 随机数, 加成):
+        # 随机数行：4 发动, (5 追加段), 每段奇谋, (每段增伤)
+        技能2发动 = 出手 & (随机数[4] < 技能2.proc_rate)
+        系数 = 技能2.coeff(r)
+        各段发动 = [技能2发动] * 技能2.hits
+        行 = 5
+        if 技能2.extra_hit_prob > 0:
+            各段发动.append(技能2发动 & (随机数[5] < 技能2.extra_hit_prob))
+            trace.count('第二技能追加段', 各段发动[-1])
+            行 = 6
+        增伤行 = 行 + 技能2.max_hits
+        trace.count('第二技能发动', 技能2发动)
+        for k, 发动 in enumerate(各段发动):
+            单次伤害 = 系数
+            if 技能2.boost_prob > 0:
+                单次伤害 = 系数 * (1 + 技能2.boost_amount * (随机数[增伤行 + k] < 技能2.boost_prob))
+            结算谋略伤害(单次伤害, 发动, 随机数[行 + k], 加成, 技能2.extra_qimou_rate)
+        if return_controls:
+            控制变量[1] += 出手 * (系数 * 技能2.hits * 加成[0]) * (技能2发动 - 技能2.proc_rate)
+            if 技能2.extra_hit_prob > 0:
+                控制变量[2] += 技能2发动 * (系数 * 加成[0]) * ((随机数[5] < 技能2.extra_hit_prob) - 技能2.extra_hit_prob)
+        return 技能2发动
+
+    def process_attacks(攻击, 可造成谋略伤害, 可追加运智普攻):
+        nonlocal 总伤害, 本回合运智额外普攻已触发, 已获得整备数, 已获得整备掩码, 奇谋率, 张春华心计层数
+        随机数 = rng.random((随机数行数, n), dtype=np.float32)
+        运智铺谋层数[:] += 攻击
+        trace.count('普攻', 攻击)
+        if 心计 is not None:
+            总伤害 += 攻击 * 心计.xinji_hit_coeff * (1 + 张春华心计层数 * 心计.xinji_hit_boost)
+            获得心计 = 攻击 & (随机数[0] < 心计.xinji_gain_prob) & (张春华心计层数 < 心计.xinji_max_stacks)
+            trace.count('获得心计', 获得心计)
+            张春华心计层数 += 获得心计
+            if return_controls:
+                控制变量[5] += 攻击 * ((随机数[0] < 心计.xinji_gain_prob) - 心计.xinji_gain_prob)
+
+        出手 = 攻击 & 可造成谋略伤害
+        神锋发动率 = 神锋_基础发动率 + 神锋_自带发动率加成 + 神锋发动率表[已获得整备掩码]
+        神锋发动 = 出手 & (随机数[1] < 神锋发动率)
+        if return_controls:
+            控制变量[0] += 出手 * (神锋_伤害系数 * 2 * 当前加成()[0]) * (神锋发动 - 神锋发动率)
+        结算谋略伤害(神锋_伤害系数 * 2, 神锋发动, 随机数[2], 当前加成())
+        trace.count('神锋发动', 神锋发动)
+        获得整备 = 神锋发动 & (已获得整备数 < 8)
+        新整备 = 整备状态池[行号, np.minimum(已获得整备数, 7)]
+        已获得整备掩码 |= 获得整备 << (新整备.astype(np.int64) - 1)
+        奇谋率 = 基础奇谋率 + 奇谋率表[已获得整备掩码]
+        已获得整备数 += 获得整备
+        造成了谋略伤害 = 神锋发动
+
+        if 技能2 is not None:
+            造成了谋略伤害 = 造成了谋略伤害 | 结算第二技能(出手, 随机数, 当前加成())
+
+        运智发动 = 造成了谋略伤害 & ~本回合运智额外普攻已触发 & (随机数[3] < 运智_额外普攻发动率)
+        if return_controls:
+            控制变量[4] += (造成了谋略伤害 & ~本回合运智额外普攻已触发) * ((随机数[3] < 运智_额外普攻发动率) - 运智_额外普攻发动率)
+        本回合运智额外普攻已触发 |= 运智发动
+        trace.count('运智触发', 运智发动)
+        return 运智发动 & 可追加运智普攻
+
+    for r in range(起始回合 + 1, 战斗回合数 + 1):
+        本回合运智额外普攻已触发 = np.zeros(n, dtype=bool)
+        本回合甄姬必定奇谋可用 = np.full(n, 有必定奇谋)
+        回合追击增伤 = 基础追击增伤 + 队伍.pursuit_boost[r - 1]
+
+        with trace.phase('普攻'):
+            运智普攻 = process_attacks(全部, 全部, True)              # 普攻1
+            运智普攻 |= process_attacks(全部, 全部, True)             # 普攻2
+        with trace.phase('运智普攻'):
+            trace.count('运智普攻', 运智普攻)
+            process_attacks(运智普攻, 全部, False)                    # 运智普攻
+        with trace.phase('辅助普攻'):
+            for 额外普攻率, 持续回合 in 队伍.extra_attacks:            # 马腾普攻
+                额外普攻 = rng.random(n) < 额外普攻率
+                if r <= 持续回合:
+                    if return_controls:
+                        控制变量[5] += 额外普攻 - 额外普攻率
+                    trace.count('马腾普攻', 额外普攻)
+                    process_attacks(额外普攻, 全部, False)
+            if 心计 is not None:                                      # 心计不足时为哑火普攻
+                张春华普攻 = 张春华心计层数 >= 心计.follow_up_threshold
+                trace.count_split('张春华普攻', '张春华哑火普攻', 张春华普攻)
+                process_attacks(全部, 张春华普攻, False)
+        if 累计伤害 is not None:
+            累计伤害[:, r - 1] = 总伤害 * (1 + 运智铺谋层数 * 运智_每层谋略增伤)
+        if 快照 is not None and r in snapshot_turns:
+            快照[r] = capture(r, rng, 总伤害=总伤害, 运智铺谋层数=运智铺谋层数, 张春华心计层数=张春华心计层数,
+                            整备状态池=整备状态池, 已获得整备数=已获得整备数, 已获得整备掩码=已获得整备掩码,
+                            累计伤害=累计伤害[:, :r])
+
+    trace.count_bits(整备事件, 已获得整备掩码)
+
+    if per_turn:
+        最终伤害 = np.diff(累计伤害, axis=1, prepend=0.0)
+    else:
+        最终伤害 = 总伤害 * (1 + 运智铺谋层数 * 运智_每层谋略增伤)
+    最终伤害 *= 总伤害乘数 * 队伍.damage_multiplier
+    if return_controls:
+        return 最终伤害, 控制变量.T
+    if 快照 is not None:
+        return 最终伤害, 快照
+    return 最终伤害
+
+# ==============================================================================
+# 条件期望引擎 (以整备顺序为条件的 Rao-Blackwell 化)
+# ==============================================================================
+def 整备顺序类别(整备顺序):
+    """把整备顺序(..., 8)中没有效果的整备编号换成 0。
+
+    效果只取决于有效果的整备出现在第几个，8! 种顺序因此归并为 8!/4! = 1680 类，每类概率相同。
+    """
+    整备顺序 = np.asarray(整备顺序)
+    return np.where(np.isin(整备顺序, list(整备定义())), 整备顺序, 0)
+
+
+def 全部整备顺序类别():
+    """(1680, 8)：有效果的整备依次放在 8 个位置中互不相同的位置上，其余位置为 0。"""
+    有效整备 = sorted(整备定义())
+    位置 = np.array(list(itertools.permutations(range(8), len(有效整备))))
+    类别 = np.zeros((len(位置), 8), dtype=np.int64)
+    np.put_along_axis(类别, 位置, np.array(有效整备), axis=1)
+    return 类别
+
+
+def compute_expected_damage(build_配置, support_配置=None, 整备顺序=None):
+    """女儿的期望最终伤害：只对整备的获得顺序取条件，其余随机性按每次攻击的解析期望逐步传播。
+
+    整备顺序为 (8,) 或 (K, 8) 的排列(或 整备顺序类别 的结果)时，返回给定顺序下的条件期望
+    (标量或长度 K 的数组)，K 个顺序在同一次状态传播中一起计算。整备顺序为 None 时枚举全部
+    1680 类取平均，即无条件的精确期望(只受浮点舍入影响)。
+
+    规则与 run_batch_simulation 逐条对应。给定整备顺序后，影响后续伤害的状态只有：已获得整备数、
+    心计层数、本回合运智额外普攻是否已触发、甄姬的必定奇谋是否仍可用。运智铺谋层数 L 只以
+    (1 + L × 运智_每层谋略增伤) 乘在总伤害 T 上，因此不放进状态：每个状态传播 P、E[L]、E[T]、E[T·L]
+    四个矩，一次攻击使 L 加 1、T 加上本次伤害，新的矩由这四个矩与本次伤害的期望得到。
+    """
+    if 整备顺序 is None:
+        return np.float64(np.mean(compute_expected_damage(build_配置, support_配置, 全部整备顺序类别())))
+    队伍 = compile_team(support_配置, 辅助定义(), 战斗回合数)
+    技能2 = 第二技能定义().get(build_配置['skill2'])
+    心计 = 队伍.xinji
+    有必定奇谋 = 队伍.first_qimou_per_turn
+    奇谋率表, 追击增伤表, 神锋发动率表, 奇谋伤害表 = (effect_table(整备定义(), 效果) for 效果 in ('奇谋率', '追击增伤', '神锋发动率', '奇谋伤害'))
+    基础追击增伤 = 突战_追击增伤 + 疾战_追击增伤
+    基础奇谋伤害加成 = 0.5 + 队伍.qimou_damage
+    甄姬增伤倍率 = 1 + 队伍.strategy_boost
+
+    # 各顺序获得前 m 个整备后的掩码；概率与伤害都是长度 K 的数组
+    顺序 = np.atleast_2d(np.asarray(整备顺序, dtype=np.int64))
+    位 = np.where(顺序 > 0, np.left_shift(1, np.maximum(顺序 - 1, 0)), 0)
+    前缀掩码 = np.concatenate([np.zeros((len(顺序), 1), dtype=np.int64), np.bitwise_or.accumulate(位, axis=1)], axis=1)
+
+    回合追击增伤 = 0.0
+    技能2系数 = 0.0
+
+    def 加成(获得):
+        已获得掩码 = 前缀掩码[:, 获得]
+        return ((1 + 回合追击增伤 + 追击增伤表[已获得掩码]) * 甄姬增伤倍率, 基础奇谋伤害加成 + 奇谋伤害表[已获得掩码],
+                队伍.qimou_rate + 奇谋率表[已获得掩码])
+
+    def 累加(结果, 键, 值):
+        结果[键] = [a + b for a, b in zip(结果[键], 值)] if 键 in 结果 else 值
+
+    def 结算谋略伤害(结果, 发动率, 系数, 额外奇谋率=0.0):
+        # 结果: {(获得, 必定奇谋可用, 造成了谋略伤害): [概率, 伤害期望]}；以 发动率 造成一段系数为 系数 的伤害
+        新结果 = {}
+        for (获得, 必定, 造成), (p, 伤害) in 结果.items():
+            增伤倍率, 奇谋伤害加成, 奇谋率 = 加成(获得)
+            奇谋概率 = 1.0 if 必定 else np.minimum(奇谋率 + 额外奇谋率, 1.0)
+            单段 = 系数 * 增伤倍率 * (1 + 奇谋概率 * 奇谋伤害加成)
+            累加(新结果, (获得, False, True), [p * 发动率, (伤害 + p * 单段) * 发动率])
+            if not np.all(np.equal(发动率, 1.0)):
+                累加(新结果, (获得, 必定, 造成), [p * (1 - 发动率), 伤害 * (1 - 发动率)])
+        return 新结果
+
+    def 谋略结果(获得, 必定):
+        # 一次出手内 神锋 -> 第二技能 的全部结果；神锋发动后按顺序获得下一个整备，第二技能使用获得后的加成
+        神锋 = 结算谋略伤害({(获得, 必定, False): [1.0, 0.0]},
+                          神锋_基础发动率 + 神锋_自带发动率加成 + 神锋发动率表[前缀掩码[:, 获得]], 神锋_伤害系数 * 2)
+        结果 = {}
+        for (获得, 必定, 造成), 值 in 神锋.items():
+            累加(结果, (min(获得 + 1, 8) if 造成 else 获得, 必定, 造成), 值)
+        if 技能2 is None:
+            return 结果
+        未发动 = {键: [p * (1 - 技能2.proc_rate), 伤害 * (1 - 技能2.proc_rate)] for 键, (p, 伤害) in 结果.items()}
+        发动 = {键: [p * 技能2.proc_rate, 伤害 * 技能2.proc_rate] for 键, (p, 伤害) in 结果.items()}
+        for _ in range(技能2.hits):
+            发动 = 结算谋略伤害(发动, 1.0, 技能2系数, 技能2.extra_qimou_rate)
+        if 技能2.extra_hit_prob > 0:
+            发动 = 结算谋略伤害(发动, 技能2.extra_hit_prob, 技能2系数, 技能2.extra_qimou_rate)
+        for 键, 值 in 发动.items():
+            累加(未发动, 键, 值)
+        return 未发动
+
+    def 转移(矩, p, 伤害):
+        # 攻击使 L 加 1，总伤害加上本次伤害；伤害为本分支的 E[本次伤害 · 1{分支}] / P(状态)
+        P, L, T, TL = 矩
+        return [P * p, (L + P) * p, T * p + P * 伤害, (TL + T) * p + (L + P) * 伤害]
+
+    def process_attack(分布, 心计门槛=0, 可追加运智普攻=False):
+        # 分布: {(获得, 心计层数, 运智已触发, 必定奇谋可用): [P, E[L], E[T], E[T·L]]}
+        新分布 = {}
+        for (获得, 层数, 已触发, 必定), 矩 in 分布.items():
+            心计伤害, 心计分支 = 0.0, [(层数, 1.0)]
+            if 心计 is not None:
+                心计伤害 = 心计.xinji_hit_coeff * (1 + 层数 * 心计.xinji_hit_boost)
+                if 层数 < 心计.xinji_max_stacks:
+                    心计分支 = [(层数, 1 - 心计.xinji_gain_prob), (层数 + 1, 心计.xinji_gain_prob)]
+            结果 = 谋略结果(获得, 必定) if 层数 >= 心计门槛 else {(获得, 必定, False): [1.0, 0.0]}
+            for (新获得, 新必定, 造成), (p, 伤害) in 结果.items():
+                # 只有两次基础普攻需要区分运智是否触发(决定本回合是否追加运智普攻)
+                运智分支 = [(已触发, 1.0)]
+                if 可追加运智普攻 and 造成 and not 已触发:
+                    运智分支 = [(True, 运智_额外普攻发动率), (False, 1 - 运智_额外普攻发动率)]
+                for 新层数, 心计概率 in 心计分支:
+                    for 触发, 运智概率 in 运智分支:
+                        权重 = 心计概率 * 运智概率
+                        累加(新分布, (新获得, 新层数, 触发, 新必定), 转移(矩, p * 权重, (伤害 + p * 心计伤害) * 权重))
+        return 新分布
+
+    def 合并(*分布列表):
+        结果 = {}
+        for 分布 in 分布列表:
+            for 状态, 矩 in 分布.items():
+                累加(结果, 状态, 矩)
+        return 结果
+
+    分布 = {(0, 0, False, 有必定奇谋): [1.0, 0.0, 0.0, 0.0]}
+    for r in range(1, 战斗回合数 + 1):
+        回合追击增伤 = 基础追击增伤 + 队伍.pursuit_boost[r - 1]
+        技能2系数 = 技能2.coeff(r) * (1 + 技能2.boost_amount * 技能2.boost_prob) if 技能2 else 0.0
+        回合开始 = {}
+        for (获得, 层数, _, _), 矩 in 分布.items():                     # 运智触发与甄姬必定奇谋每回合重置
+            累加(回合开始, (获得, 层数, False, 有必定奇谋), 矩)
+        分布 = 回合开始
+
+        分布 = process_attack(分布, 可追加运智普攻=True)                 # 普攻1
+        分布 = process_attack(分布, 可追加运智普攻=True)                 # 普攻2
+        运智普攻 = {状态: 矩 for 状态, 矩 in 分布.items() if 状态[2]}
+        分布 = 合并({状态: 矩 for 状态, 矩 in 分布.items() if not 状态[2]}, process_attack(运智普攻))
+        for 额外普攻率, 持续回合 in 队伍.extra_attacks:                   # 马腾普攻
+            if r <= 持续回合:
+                分布 = 合并({状态: [x * (1 - 额外普攻率) for x in 矩] for 状态, 矩 in 分布.items()},
+                            process_attack({状态: [x * 额外普攻率 for x in 矩] for 状态, 矩 in 分布.items()}))
+        if 心计 is not None:                                              # 心计不足时为哑火普攻
+            分布 = process_attack(分布, 心计门槛=心计.follow_up_threshold)
+
+    期望 = sum(T + TL * 运智_每层谋略增伤 for _, _, T, TL in 分布.values())
+    期望 = 期望 * (1.0 + 武女传_增伤 + 队伍.damage_bonus) * 队伍.damage_multiplier
+    if np.ndim(整备顺序) == 1:
+        return np.float64(np.sum(期望))
+    return np.broadcast_to(期望, (len(顺序),)).copy()
+
+
+def run_conditional_simulation(build_配置, support_配置=None, n=50000, rng=None):
+    """以整备顺序为条件的批量引擎：返回 n 个随机整备顺序下的条件期望最终伤害。
+
+    整备顺序的抽取与 run_batch_simulation 相同，其余随机性由 compute_expected_damage 解析地取期望，
+    样本只剩整备顺序带来的波动，方差远小于逐场模拟。各样本按 整备顺序类别 归并，每类(至多 1680 类)
+    只计算一次。接口与 run_batch_simulation 相同，可直接交给 run_parallel 等运行器。
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    整备状态池 = rng.random((8, n)).argsort(axis=0).T + 1
+    类别, 序号 = np.unique(整备顺序类别(整备状态池), axis=0, return_inverse=True)
+    return compute_expected_damage(build_配置, support_配置, 类别)[序号.reshape(-1)]
+
+
+# ==============================================================================
+# 默认配置 (供脚本、命令行与基准测试使用)
+# ==============================================================================
+BUILDS = [
+    {'name': '运智铺谋 + 谋而后动', 'skill2': 'MouErHouDong'},
+    {'name': '运智铺谋 + 铁骑横冲', 'skill2': 'Tieqi'},
+    {'name': '运智铺谋 + 智破千军', 'skill2': 'ZhiPoQianJun'},
+]
+SUPPORTS = [
+    ('女儿单人', None),
+    ('辅助-马腾', {'name': 'MaTeng'}),
+    ('辅助-张春华', {'name': 'ZhangChunhua'}),
+    ('辅助-甄姬', {'name': 'ZhenJi'}),
+    ('辅助-庞统', {'name': 'PangTong'}),
+    ('辅助-荀彧', {'name': 'XunYu'}),
+]
+
+simulate = run_batch_simulation
+support_specs = 辅助定义
+reference = run_single_simulation
+exact = compute_expected_damage
+derive = None
+
+
+def run_batch_simulation_per_turn(build_配置, support_配置=None, n=50000, rng=None, return_controls=False,
+                                  trace=NULL_TRACE, snapshot_turns=None, resume=None):
+    """run_batch_simulation 的每回合版本，返回 (n, 战斗回合数) 的每回合伤害(供伤害分布存储使用)。"""
+    return run_batch_simulation(build_配置, support_配置, n=n, rng=rng, return_controls=return_controls,
+                                trace=trace, per_turn=True, snapshot_turns=snapshot_turns, resume=resume)
+
+
+simulate_turns = run_batch_simulation_per_turn
+
+
+def make_task(support_config=None, build=None):
+    """由辅助配置与第二技能名(build 的 skill2，如 'Tieqi')构造 simulate 的位置参数。"""
+    for build_配置 in BUILDS:
+        if build_配置['skill2'] == build:
+            return (build_配置, support_config)
+    raise ValueError(f"未知的 build: {build!r}，可选 {[b['skill2'] for b in BUILDS]}")
+
+
+def default_tasks():
+    """[(标签, 任务), ...]：每名辅助(含单人)搭配每个 build，顺序与第十期脚本的表格一致。"""
+    return [(f"{label} / {build['name']}", (build, config)) for label, config in SUPPORTS for build in BUILDS]
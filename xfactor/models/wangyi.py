@@ -0,0 +1,459 @@
+"""
+王异模型 (第九期 2025-06-15)
+
+技能与辅助武将系数、标量参考实现 run_single_simulation_wangyi、批量引擎
+run_batch_simulation_wangyi 以及精确期望引擎 compute_expected_coeffs_wangyi。
+本模块只依赖 numpy，不做任何输出；表格与图表见第九期脚本，命令行见 xfactor.cli。
+修改游戏数值时直接改下面的系数(结果缓存会自动失效)。
+"""
+
+import random
+
+import numpy as np
+
+from ..snapshots import capture, restore
+from ..spec import SupportSpec, compile_team
+from ..trace import NULL_TRACE
+
+HERO = '王异'
+
+# ==============================================================================
+# 战斗参数
+# ==============================================================================
+战斗回合数 = 4
+ENEMIES = 3
+
+# ==============================================================================
+# 技能与武将系数定义
+# ==============================================================================
+# 王异技能
+QCFY_PROB = 0.55; QCFY_DMG_COEFF_PER_TARGET = 1.00; QCFY_TARGETS = 2
+YZPM_DMG_BOOST_PER_STACK = 0.078; YZPM_MAX_STACKS = 5; YZPM_NA_PROC_PROB = 0.56
+MEHD_BASE_PROB = 0.75; MEHD_EXTRA_HIT_PROB = 0.50; MEHD_DMG_COEFF_T1 = 0.412; MEHD_DMG_COEFF_INCREASE_PER_TURN = 0.123
+PASSIVE1_NA_THRESHOLD1 = 2; PASSIVE1_NA_THRESHOLD2 = 4; PASSIVE1_PURSUIT_BOOST = 0.05
+PASSIVE2_PURSUIT_BOOST_DURATION = 4; PASSIVE2_PURSUIT_BOOST = 0.05
+# 辅助武将
+MATENG_DURATION = 3; MATENG_PURSUIT_DMG_BOOST = 0.30; MATENG_EXTRA_NA_PROB = 0.65
+ZHANGCH_XINJI_GAIN_PROB = 0.25; ZHANGCH_XINJI_DMG_BOOST_PER_STACK = 0.03; ZHANGCH_XINJI_MAX_STACKS = 10; ZHANGCH_XINJI_PURSUIT_LOCK_THRESHOLD = 6
+ZHENJI_LUOSHEN_DMG_BOOST = 0.25; ZHENJI_QIMOU_MULTIPLIER = 1.5
+PANGTONG_EFFECTIVE_DMG_MULTIPLIER = 1.42
+XUNYU_KANPO_MULTIPLIER = 1.15; XUNYU_QIMOU_CHANCE = 0.56; XUNYU_QIMOU_EFFECT_MULTIPLIER = 1.5
+
+# --- 推导常量 (参数扫描修改上面的系数后据此重新计算) ---
+def update_derived_constants(namespace):
+    namespace['XUNYU_AVG_QIMOU_MULTIPLIER'] = (1 - namespace['XUNYU_QIMOU_CHANCE']) * 1.0 + namespace['XUNYU_QIMOU_CHANCE'] * namespace['XUNYU_QIMOU_EFFECT_MULTIPLIER']
+    namespace['XUNYU_EFFECTIVE_DMG_MULTIPLIER'] = namespace['XUNYU_KANPO_MULTIPLIER'] * namespace['XUNYU_AVG_QIMOU_MULTIPLIER']
+
+update_derived_constants(globals())
+
+# --- 辅助函数 ---
+def get_mehd_current_coeff(turn_idx):
+    return MEHD_DMG_COEFF_T1 + turn_idx * MEHD_DMG_COEFF_INCREASE_PER_TURN
+
+def get_wangyi_mehd_activation_rate_dynamic(cumulative_na_completed_before_this_na, current_turn_idx):
+    p1_bonus = 0.0
+    if cumulative_na_completed_before_this_na >= PASSIVE1_NA_THRESHOLD1: p1_bonus += PASSIVE1_PURSUIT_BOOST
+    if cumulative_na_completed_before_this_na >= PASSIVE1_NA_THRESHOLD2: p1_bonus += PASSIVE1_PURSUIT_BOOST
+    p2_bonus = PASSIVE2_PURSUIT_BOOST if current_turn_idx < PASSIVE2_PURSUIT_BOOST_DURATION else 0.0
+    return MEHD_BASE_PROB + p1_bonus + p2_bonus
+
+# --- 辅助武将定义 ---
+def define_supports():
+    """辅助武将的声明式定义 {名字: SupportSpec}。每次调用按当前系数构造，参数扫描修改系数后同样生效。"""
+    return {spec.name: spec for spec in (
+        SupportSpec('MaTeng', pursuit_boost=MATENG_PURSUIT_DMG_BOOST, boost_turns=MATENG_DURATION,
+                    extra_attack_prob=MATENG_EXTRA_NA_PROB, extra_attack_turns=MATENG_DURATION),
+        SupportSpec('ZhangChunhua', xinji_gain_prob=ZHANGCH_XINJI_GAIN_PROB, xinji_max_stacks=ZHANGCH_XINJI_MAX_STACKS,
+                    xinji_damage_boost=ZHANGCH_XINJI_DMG_BOOST_PER_STACK,
+                    follow_up_threshold=ZHANGCH_XINJI_PURSUIT_LOCK_THRESHOLD, attacks_trigger_strategy=True),
+        SupportSpec('ZhenJi', strategy_boost=ZHENJI_LUOSHEN_DMG_BOOST, first_qimou_per_turn=True),
+        SupportSpec('PangTong', damage_multiplier=PANGTONG_EFFECTIVE_DMG_MULTIPLIER),
+        SupportSpec('XunYu', damage_multiplier=XUNYU_EFFECTIVE_DMG_MULTIPLIER),
+    )}
+
+# ==============================================================================
+# 模拟核心函数 (战术执行层)
+# ==============================================================================
+def run_single_simulation_wangyi(support_config=None, rng=None):
+    # rng 为 xfactor.rng.BlockRNG 时从其分块缓冲区取数，否则使用全局 random 模块
+    rand = random.random if rng is None else rng.uniform
+    damage_coeffs_per_turn = [0.0] * 战斗回合数
+    wangyi_status = {'yzpm_stacks': 0, 'cumulative_na': 0, 'xinji_stacks': 0}
+
+    for current_turn_num in range(1, 战斗回合数 + 1):
+        turn_idx = current_turn_num - 1
+        yzpm_na_has_fired_this_turn = False
+        is_zhenji_active_this_turn = (support_config and support_config['name'] == 'ZhenJi')
+        zhenji_qimou_available_this_turn = is_zhenji_active_this_turn
+
+        def process_attack(attack_type):
+            nonlocal yzpm_na_has_fired_this_turn, zhenji_qimou_available_this_turn
+
+            wangyi_status['yzpm_stacks'] = min(YZPM_MAX_STACKS, wangyi_status['yzpm_stacks'] + 1)
+            wangyi_status['cumulative_na'] += 1
+            if support_config and support_config['name'] == 'ZhangChunhua':
+                if rand() < ZHANGCH_XINJI_GAIN_PROB:
+                    wangyi_status['xinji_stacks'] = min(ZHANGCH_XINJI_MAX_STACKS, wangyi_status['xinji_stacks'] + 1)
+            
+            current_yzpm_boost = (1 + wangyi_status['yzpm_stacks'] * YZPM_DMG_BOOST_PER_STACK)
+            current_xinji_boost = (1 + wangyi_status['xinji_stacks'] * ZHANGCH_XINJI_DMG_BOOST_PER_STACK) if support_config and support_config['name'] == 'ZhangChunhua' else 1.0
+
+            strategic_damage_dealt = False
+            
+            if rand() < QCFY_PROB:
+                strategic_damage_dealt = True
+                damage_coeff = (QCFY_DMG_COEFF_PER_TARGET * QCFY_TARGETS) * current_yzpm_boost * current_xinji_boost
+                if is_zhenji_active_this_turn:
+                    damage_coeff *= (1 + ZHENJI_LUOSHEN_DMG_BOOST)
+                    if zhenji_qimou_available_this_turn:
+                        damage_coeff *= ZHENJI_QIMOU_MULTIPLIER; zhenji_qimou_available_this_turn = False
+                damage_coeffs_per_turn[turn_idx] += damage_coeff
+
+            if attack_type != 'zch_dud_na':
+                mehd_rate = get_wangyi_mehd_activation_rate_dynamic(wangyi_status['cumulative_na'] - 1, turn_idx)
+                if rand() < mehd_rate:
+                    strategic_damage_dealt = True
+                    num_mehd_hits = 1 + (1 if rand() < MEHD_EXTRA_HIT_PROB else 0)
+                    for _ in range(num_mehd_hits):
+                        mehd_coeff = get_mehd_current_coeff(turn_idx)
+                        base_skill_coeff = (mehd_coeff * ENEMIES) * current_yzpm_boost * current_xinji_boost
+                        if support_config and support_config['name'] == 'MaTeng' and current_turn_num <= MATENG_DURATION:
+                            base_skill_coeff *= (1 + MATENG_PURSUIT_DMG_BOOST)
+                        if is_zhenji_active_this_turn:
+                            base_skill_coeff *= (1 + ZHENJI_LUOSHEN_DMG_BOOST)
+                            if zhenji_qimou_available_this_turn:
+                                base_skill_coeff *= ZHENJI_QIMOU_MULTIPLIER; zhenji_qimou_available_this_turn = False
+                        damage_coeffs_per_turn[turn_idx] += base_skill_coeff
+                        
+                        if rand() < QCFY_PROB:
+                            qcfy_from_mehd_coeff = (QCFY_DMG_COEFF_PER_TARGET * QCFY_TARGETS) * current_yzpm_boost * current_xinji_boost
+                            if is_zhenji_active_this_turn:
+                                qcfy_from_mehd_coeff *= (1 + ZHENJI_LUOSHEN_DMG_BOOST)
+                                if zhenji_qimou_available_this_turn:
+                                    qcfy_from_mehd_coeff *= ZHENJI_QIMOU_MULTIPLIER; zhenji_qimou_available_this_turn = False
+                            damage_coeffs_per_turn[turn_idx] += qcfy_from_mehd_coeff
+            
+            yzpm_trigger_opportunity = (strategic_damage_dealt or (support_config and support_config['name'] == 'ZhangChunhua'))
+            if yzpm_trigger_opportunity and not yzpm_na_has_fired_this_turn:
+                if rand() < YZPM_NA_PROC_PROB:
+                    yzpm_na_has_fired_this_turn = True
+                    main_attack_list.append("yzpm_na")
+
+        main_attack_list = ["base_na_1", "base_na_2_combo"]
+        i = 0
+        while i < len(main_attack_list):
+            process_attack(main_attack_list[i])
+            i += 1
+        
+        additional_attack_list = []
+        if support_config:
+            if support_config['name'] == 'MaTeng' and current_turn_num <= MATENG_DURATION and rand() < MATENG_EXTRA_NA_PROB:
+                additional_attack_list.append("mateng_na")
+            if support_config['name'] == 'ZhangChunhua':
+                additional_attack_list.append("zch_dud_na" if wangyi_status['xinji_stacks'] < ZHANGCH_XINJI_PURSUIT_LOCK_THRESHOLD else "zch_na")
+        
+        for attack in additional_attack_list:
+            process_attack(attack)
+
+    if support_config:
+        if support_config['name'] == 'PangTong':
+            damage_coeffs_per_turn = [d * PANGTONG_EFFECTIVE_DMG_MULTIPLIER for d in damage_coeffs_per_turn]
+        if support_config['name'] == 'XunYu':
+            damage_coeffs_per_turn = [d * XUNYU_EFFECTIVE_DMG_MULTIPLIER for d in damage_coeffs_per_turn]
+            
+    return damage_coeffs_per_turn
+
+# ==============================================================================
+# 向量化批量模拟 (NumPy 引擎)
+# ==============================================================================
+def run_batch_simulation_wangyi(support_config=None, n=50000, rng=None, return_controls=False, trace=NULL_TRACE,
+                                snapshot_turns=None, resume=None):
+    """一次推进 n 场战斗，返回 (n, 战斗回合数) 的每回合伤害系数矩阵。
+
+    与 run_single_simulation_wangyi 的战斗规则逐条对应：每个状态变量是一个长度为 n
+    的数组，技能是否发动用布尔掩码表示。每回合的攻击序列是一个有界队列：
+    两次基础普攻 -> 运筹普攻(yzpm_na, 每回合至多一次) -> 马腾普攻 -> 张春华普攻。
+    与标量版本一致，追加阶段触发的运筹普攻不会再被执行。
+
+    support_config 可以是单个辅助 {'name': ...}，也可以是多个辅助组成的列表；辅助的效果
+    按 define_supports 中的声明在开始时一次性合并(见 xfactor.spec.compile_team)。
+
+    return_controls 为 True 时另返回 (n, 5) 的控制变量：奇策伏应、谋而后动、谋而后动追加段、
+    运筹普攻以及张春华心计/马腾普攻每次判定的 (是否发动 - 发动率) 之和(前三项按该次伤害系数加权)。
+    每一项在判定前都已确定，因此控制变量的期望恰为 0，供 xfactor.variance.ControlVariates 使用。
+
+    trace 为 xfactor.trace.Trace 时记录各技能发动、额外普攻、张春华哑火与甄姬必定奇谋的次数
+    以及各攻击阶段的耗时(见 xfactor.trace.run_traced)。
+
+    snapshot_turns 为回合序号的集合时返回 (伤害矩阵, {回合: 快照})，快照含第 k 回合结束时的运筹层数、
+    累计普攻次数、心计层数、前 k 回合的伤害系数与随机数发生器的位置；resume=快照 时从第 k+1 回合
+    继续(忽略 rng，trace 只记录续跑的回合)，见 xfactor.snapshots。
+    """
+    if return_controls and (snapshot_turns is not None or resume is not None):
+        raise ValueError("控制变量需要完整的战斗，不能与回合快照同时使用")
+    rng = np.random.default_rng() if rng is None else rng
+    team = compile_team(support_config, define_supports(), 战斗回合数)
+    xinji = team.xinji
+    has_qimou_token = team.first_qimou_per_turn
+
+    damage_coeffs = np.zeros((n, 战斗回合数))
+    yzpm_stacks = np.zeros(n, dtype=np.int64)
+    cumulative_na = np.zeros(n, dtype=np.int64)
+    xinji_stacks = np.zeros(n, dtype=np.int64)
+    qcfy_base_coeff = QCFY_DMG_COEFF_PER_TARGET * QCFY_TARGETS
+    luoshen_boost = 1 + team.strategy_boost
+    controls = np.zeros((5, n)) if return_controls else None
+    snapshots = {} if snapshot_turns is not None else None
+    first_turn = 0
+    if resume is not None:
+        first_turn, state, rng = restore(resume, n, 战斗回合数)
+        damage_coeffs[:, :first_turn] = state['damage_coeffs']
+        yzpm_stacks, cumulative_na, xinji_stacks = state['yzpm_stacks'], state['cumulative_na'], state['xinji_stacks']
+
+    # 回合状态：每回合开始时重新赋值，下面两个函数只定义一次
+    turn_coeffs = yzpm_na_has_fired = zhenji_qimou_available = None
+    mehd_turn_coeff = mehd_rate_base = 0.0
+
+    def apply_qimou(coeff, proc):
+        # 甄姬每回合首次谋略伤害必定奇谋，发动后消耗
+        if not has_qimou_token:
+            return proc * coeff
+        qimou = proc & zhenji_qimou_available
+        zhenji_qimou_available[qimou] = False
+        trace.count('zhenji_qimou', qimou)
+        return proc * coeff * np.where(qimou, ZHENJI_QIMOU_MULTIPLIER, 1.0)
+
+    def process_attacks(active, can_mehd, can_queue_yzpm):
+        nonlocal turn_coeffs, yzpm_na_has_fired, yzpm_stacks, cumulative_na, xinji_stacks
+        draws = rng.random((7, n), dtype=np.float32)
+        yzpm_stacks = np.minimum(YZPM_MAX_STACKS, yzpm_stacks + active)
+        cumulative_na += active
+        trace.count('na', active)
+        current_boost = 1 + yzpm_stacks * YZPM_DMG_BOOST_PER_STACK
+        if xinji is not None:
+            gain = active & (draws[6] < xinji.xinji_gain_prob)
+            trace.count('xinji_gain', gain)
+            if return_controls:
+                controls[4] += active * (gain - xinji.xinji_gain_prob)
+            xinji_stacks = np.minimum(xinji.xinji_max_stacks, xinji_stacks + gain)
+            current_boost = current_boost * (1 + xinji_stacks * xinji.xinji_damage_boost)
+        qcfy_coeff = qcfy_base_coeff * luoshen_boost * current_boost
+
+        qcfy_proc = active & (draws[0] < QCFY_PROB)
+        turn_coeffs += apply_qimou(qcfy_coeff, qcfy_proc)
+        trace.count('qcfy_proc', qcfy_proc)
+        if return_controls:
+            controls[0] += active * qcfy_coeff * (qcfy_proc - QCFY_PROB)
+
+        # 被动一：累计普攻次数(不含本次)达到阈值后提升谋而后动发动率
+        completed_na = cumulative_na - 1
+        mehd_rate = mehd_rate_base + PASSIVE1_PURSUIT_BOOST * (
+            (completed_na >= PASSIVE1_NA_THRESHOLD1).astype(np.float64) + (completed_na >= PASSIVE1_NA_THRESHOLD2)
+        )
+        mehd_proc = active & can_mehd & (draws[1] < mehd_rate)
+        second_hit = mehd_proc & (draws[2] < MEHD_EXTRA_HIT_PROB)
+        mehd_hit_coeff = mehd_turn_coeff * current_boost
+        trace.count('mehd_proc', mehd_proc)
+        trace.count('mehd_second_hit', second_hit)
+        for hit, qcfy_draw in ((mehd_proc, draws[3]), (second_hit, draws[4])):
+            follow_qcfy = hit & (qcfy_draw < QCFY_PROB)
+            turn_coeffs += apply_qimou(mehd_hit_coeff, hit)
+            turn_coeffs += apply_qimou(qcfy_coeff, follow_qcfy)
+            trace.count('qcfy_proc', follow_qcfy)
+            if return_controls:
+                controls[0] += hit * qcfy_coeff * ((qcfy_draw < QCFY_PROB) - QCFY_PROB)
+        if return_controls:
+            controls[1] += (active & can_mehd) * mehd_hit_coeff * (mehd_proc - mehd_rate)
+            controls[2] += mehd_proc * mehd_hit_coeff * (second_hit - MEHD_EXTRA_HIT_PROB)
+
+        yzpm_trigger_opportunity = (qcfy_proc | mehd_proc | team.attacks_trigger_strategy) & active
+        yzpm_proc = yzpm_trigger_opportunity & ~yzpm_na_has_fired & (draws[5] < YZPM_NA_PROC_PROB)
+        if return_controls:
+            controls[3] += (yzpm_trigger_opportunity & ~yzpm_na_has_fired) * ((draws[5] < YZPM_NA_PROC_PROB) - YZPM_NA_PROC_PROB)
+        yzpm_na_has_fired |= yzpm_proc
+        trace.count('yzpm_na_proc', yzpm_proc)
+        return yzpm_proc & can_queue_yzpm
+
+    all_runs = np.ones(n, dtype=bool)
+    for turn_idx in range(first_turn, 战斗回合数):
+        current_turn_num = turn_idx + 1
+        turn_coeffs = damage_coeffs[:, turn_idx]
+        yzpm_na_has_fired = np.zeros(n, dtype=bool)
+        zhenji_qimou_available = np.full(n, has_qimou_token)
+        mehd_turn_coeff = (get_mehd_current_coeff(turn_idx) * ENEMIES) * (1 + team.pursuit_boost[turn_idx]) * luoshen_boost
+        mehd_rate_base = get_wangyi_mehd_activation_rate_dynamic(0, turn_idx)
+
+        with trace.phase('base_na'):
+            queued_yzpm_na = process_attacks(all_runs, all_runs, True)        # base_na_1
+            queued_yzpm_na |= process_attacks(all_runs, all_runs, True)       # base_na_2_combo
+        with trace.phase('yzpm_na'):
+            trace.count('yzpm_na', queued_yzpm_na)
+            process_attacks(queued_yzpm_na, all_runs, False)                  # yzpm_na
+
+        with trace.phase('support_na'):
+            for extra_prob, extra_turns in team.extra_attacks:                # 马腾普攻
+                extra_na = rng.random(n) < extra_prob
+                if current_turn_num <= extra_turns:
+                    if return_controls:
+                        controls[4] += extra_na - extra_prob
+                    trace.count('mateng_na', extra_na)
+                    process_attacks(extra_na, all_runs, False)
+            if xinji is not None:                                             # 张春华普攻
+                zch_na = xinji_stacks >= xinji.follow_up_threshold
+                trace.count_split('zch_na', 'zch_dud_na', zch_na)
+                process_attacks(all_runs, zch_na, False)
+        if snapshots is not None and current_turn_num in snapshot_turns:
+            snapshots[current_turn_num] = capture(current_turn_num, rng, damage_coeffs=damage_coeffs[:, :current_turn_num],
+                                                  yzpm_stacks=yzpm_stacks, cumulative_na=cumulative_na,
+                                                  xinji_stacks=xinji_stacks)
+
+    damage_coeffs *= team.damage_multiplier * (1 + team.damage_bonus)
+
+    if return_controls:
+        return damage_coeffs, controls.T
+    if snapshots is not None:
+        return damage_coeffs, snapshots
+    return damage_coeffs
+
+# ==============================================================================
+# 精确期望引擎 (马尔可夫链 / 动态规划)
+# ==============================================================================
+def compute_expected_coeffs_wangyi(support_config=None):
+    """逐回合传播状态概率分布，返回长度为 战斗回合数 的精确期望每回合伤害系数(无采样误差)。
+
+    影响后续伤害的随机状态只有：运筹层数(<=5)、累计普攻数(只需区分到被动一的阈值)、
+    心计层数(<=10)、本回合运筹普攻是否已触发、甄姬本回合的必定奇谋是否仍可用。
+    同一次攻击内的伤害只影响期望值，不影响后续状态，因此按 (奇谋可用, 是否造成谋略伤害)
+    合并分支即可。support_config 的格式与 run_batch_simulation_wangyi 相同。
+    """
+    team = compile_team(support_config, define_supports(), 战斗回合数)
+    xinji = team.xinji
+    is_zch = xinji is not None
+    is_zhenji = team.first_qimou_per_turn
+    na_cap = max(PASSIVE1_NA_THRESHOLD1, PASSIVE1_NA_THRESHOLD2)
+    qcfy_base_coeff = QCFY_DMG_COEFF_PER_TARGET * QCFY_TARGETS
+    luoshen_boost = 1 + team.strategy_boost
+    expected_coeffs = np.zeros(战斗回合数)
+
+    def fire(outcomes, prob, coeff):
+        # 以概率 prob 造成一段谋略伤害；甄姬的必定奇谋由本回合第一段谋略伤害消耗
+        result = {}
+        for (qimou_available, dealt), (p, dmg) in outcomes.items():
+            for key, branch_p, branch_dmg in (
+                ((False, True), p * prob, dmg * prob + p * prob * coeff * (ZHENJI_QIMOU_MULTIPLIER if qimou_available else 1.0)),
+                ((qimou_available, dealt), p * (1 - prob), dmg * (1 - prob)),
+            ):
+                if branch_p > 0:
+                    entry = result.setdefault(key, [0.0, 0.0])
+                    entry[0] += branch_p; entry[1] += branch_dmg
+        return result
+
+    def strategic_outcomes(qimou_available, boost, mehd_rate, mehd_coeff):
+        # 一次攻击内 起承法言 -> 谋而后动(1~2段，每段后接起承法言) 的全部结果
+        qcfy_coeff = qcfy_base_coeff * boost * luoshen_boost
+        outcomes = fire({(qimou_available, False): [1.0, 0.0]}, QCFY_PROB, qcfy_coeff)
+        if mehd_rate <= 0:
+            return outcomes
+        no_mehd = {key: [p * (1 - mehd_rate), dmg * (1 - mehd_rate)] for key, (p, dmg) in outcomes.items()}
+        mehd = {key: [p * mehd_rate, dmg * mehd_rate] for key, (p, dmg) in outcomes.items()}
+        mehd = fire(fire(mehd, 1.0, mehd_coeff * boost), QCFY_PROB, qcfy_coeff)
+        no_second_hit = {key: [p * (1 - MEHD_EXTRA_HIT_PROB), dmg * (1 - MEHD_EXTRA_HIT_PROB)] for key, (p, dmg) in mehd.items()}
+        second_hit = fire(fire({key: [p * MEHD_EXTRA_HIT_PROB, dmg * MEHD_EXTRA_HIT_PROB] for key, (p, dmg) in mehd.items()},
+                               1.0, mehd_coeff * boost), QCFY_PROB, qcfy_coeff)
+        for part in (no_second_hit, second_hit):
+            for key, (p, dmg) in part.items():
+                entry = no_mehd.setdefault(key, [0.0, 0.0])
+                entry[0] += p; entry[1] += dmg
+        return no_mehd
+
+    def process_attack(distribution, turn_idx, mehd_coeff, attack_type):
+        # distribution: {(运筹层数, 累计普攻数, 心计层数, 运筹普攻已触发, 奇谋可用): 概率}
+        result = {}
+        for (yzpm, na, xinji_stacks, yzpm_fired, qimou_available), p in distribution.items():
+            yzpm = min(YZPM_MAX_STACKS, yzpm + 1)
+            xinji_branches = [(xinji_stacks, 1.0)]
+            if is_zch:
+                xinji_branches = [(xinji_stacks, 1 - xinji.xinji_gain_prob),
+                                  (min(xinji.xinji_max_stacks, xinji_stacks + 1), xinji.xinji_gain_prob)]
+            for new_xinji, xinji_p in xinji_branches:
+                boost = (1 + yzpm * YZPM_DMG_BOOST_PER_STACK) * ((1 + new_xinji * xinji.xinji_damage_boost) if is_zch else 1.0)
+                mehd_rate = 0.0 if attack_type == 'zch_dud_na' else get_wangyi_mehd_activation_rate_dynamic(na, turn_idx)
+                for (new_qimou, dealt), (branch_p, dmg) in strategic_outcomes(qimou_available, boost, mehd_rate, mehd_coeff).items():
+                    weight = p * xinji_p
+                    expected_coeffs[turn_idx] += weight * dmg
+                    new_state = (yzpm, min(na + 1, na_cap), new_xinji, yzpm_fired, new_qimou)
+                    can_fire = attack_type in ('base_na_1', 'base_na_2_combo') and (dealt or team.attacks_trigger_strategy) and not yzpm_fired
+                    if can_fire:
+                        fired_state = new_state[:3] + (True, new_qimou)
+                        result[fired_state] = result.get(fired_state, 0.0) + weight * branch_p * YZPM_NA_PROC_PROB
+                        branch_p *= 1 - YZPM_NA_PROC_PROB
+                    result[new_state] = result.get(new_state, 0.0) + weight * branch_p
+        return result
+
+    distribution = {(0, 0, 0): 1.0}
+    for turn_idx in range(战斗回合数):
+        current_turn_num = turn_idx + 1
+        mehd_coeff = get_mehd_current_coeff(turn_idx) * ENEMIES
+        mehd_coeff *= 1 + team.pursuit_boost[turn_idx]
+        mehd_coeff *= luoshen_boost
+        turn_dist = {state + (False, is_zhenji): p for state, p in distribution.items()}
+        turn_dist = process_attack(turn_dist, turn_idx, mehd_coeff, 'base_na_1')
+        turn_dist = process_attack(turn_dist, turn_idx, mehd_coeff, 'base_na_2_combo')
+        # 本回合运筹普攻已触发 <=> 队列中追加了 yzpm_na(追加阶段的触发不会再执行)
+        fired = {state: p for state, p in turn_dist.items() if state[3]}
+        turn_dist = {state: p for state, p in turn_dist.items() if not state[3]}
+        for state, p in process_attack(fired, turn_idx, mehd_coeff, 'yzpm_na').items():
+            turn_dist[state] = turn_dist.get(state, 0.0) + p
+
+        for extra_prob, extra_turns in team.extra_attacks:
+            if current_turn_num > extra_turns:
+                continue
+            attacked = process_attack({s: p * extra_prob for s, p in turn_dist.items()}, turn_idx, mehd_coeff, 'mateng_na')
+            turn_dist = {s: p * (1 - extra_prob) for s, p in turn_dist.items()}
+            for state, p in attacked.items():
+                turn_dist[state] = turn_dist.get(state, 0.0) + p
+        if is_zch:
+            dud = {s: p for s, p in turn_dist.items() if s[2] < xinji.follow_up_threshold}
+            normal = {s: p for s, p in turn_dist.items() if s[2] >= xinji.follow_up_threshold}
+            turn_dist = process_attack(dud, turn_idx, mehd_coeff, 'zch_dud_na')
+            for state, p in process_attack(normal, turn_idx, mehd_coeff, 'zch_na').items():
+                turn_dist[state] = turn_dist.get(state, 0.0) + p
+
+        distribution = {}
+        for state, p in turn_dist.items():
+            distribution[state[:3]] = distribution.get(state[:3], 0.0) + p
+
+    expected_coeffs *= team.damage_multiplier * (1 + team.damage_bonus)
+
+    return expected_coeffs
+
+# ==============================================================================
+# 默认配置 (供脚本、命令行与基准测试使用)
+# ==============================================================================
+SUPPORTS = [
+    ('王异 (单独)', None),
+    ('王异 + 马腾', {'name': 'MaTeng'}),
+    ('王异 + 张春华', {'name': 'ZhangChunhua'}),
+    ('王异 + 甄姬', {'name': 'ZhenJi'}),
+    ('王异 + 庞统', {'name': 'PangTong'}),
+    ('王异 + 荀彧', {'name': 'XunYu'}),
+]
+
+simulate = run_batch_simulation_wangyi
+simulate_turns = run_batch_simulation_wangyi  # 本来就返回每回合伤害
+support_specs = define_supports
+reference = run_single_simulation_wangyi
+exact = compute_expected_coeffs_wangyi
+derive = update_derived_constants
+
+
+def make_task(support_config=None, build=None):
+    """由辅助配置构造 simulate 的位置参数；王异没有可选 build。"""
+    if build is not None:
+        raise ValueError("王异没有可选的 build")
+    return (support_config,)
+
+
+def default_tasks():
+    """[(标签, 任务), ...]：王异单独及搭配每名辅助。"""
+    return [(label, make_task(config)) for label, config in SUPPORTS]
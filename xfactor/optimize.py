@@ -0,0 +1,122 @@
+"""
+阵容搜索：逐轮淘汰(racing / successive halving)
+
+候选阵容(辅助组合 × build)先各模拟 initial_samples 场；每轮结束后，置信区间上界低于
+第 top_k 名置信区间下界的候选被淘汰(明显较差)，剩下的候选样本数乘以 eta 进入下一轮，
+直到只剩 top_k 个、达到每个候选的样本上限或用完总预算。大部分模拟因此花在难分高下的
+候选上，搜索几百个阵容所需的模拟量与平均分配给十几个配置相当。
+
+每个候选的随机数流按 (配置内容, 分块序号) 派生，结果只取决于种子、分块大小与淘汰参数，
+与进程数无关。
+
+    results = race(model.simulate, compositions(model, max_supports=2), top_k=5, seed=1)
+"""
+
+import itertools
+import math
+
+from .models import builds_of, task_label
+from .runner import make_executor, resolve_seed, run_chunks
+from .spec import compile_team
+from .stats import DEFAULT_BIN_WIDTH
+
+DEFAULT_INITIAL_SAMPLES = 4096
+DEFAULT_MAX_SAMPLES = 1_000_000
+
+
+def compositions(model, max_supports=2, builds=None, include_solo=True):
+    """模型的候选阵容 [(标签, 任务), ...]：至多 max_supports 名不同辅助的全部组合 × 全部 build。
+
+    辅助取自 model.support_specs()，效果互相冲突的组合(如两名提供心计的辅助)被跳过。
+    """
+    definitions = model.support_specs()
+    builds = builds_of(model) if builds is None else list(builds)
+    candidates = []
+    for build in builds:
+        for size in range(0 if include_solo else 1, max_supports + 1):
+            for names in itertools.combinations(definitions, size):
+                config = [{'name': name} for name in names] if size > 1 else ({'name': names[0]} if names else None)
+                try:
+                    compile_team(config, definitions, 1)
+                except ValueError:
+                    continue
+                candidates.append((task_label(config, build), model.make_task(config, build)))
+    return candidates
+
+
+def _bounds(stats, z):
+    half_width = stats.total_ci_half_width(z) if stats.count > 1 else math.inf
+    return stats.total_mean - half_width, stats.total_mean + half_width
+
+
+def race(simulate, tasks, top_k=5, initial_samples=DEFAULT_INITIAL_SAMPLES, eta=2, max_samples=DEFAULT_MAX_SAMPLES,
+         budget=None, seed=None, labels=None, z=1.96, race_z=3.0, chunk_size=DEFAULT_INITIAL_SAMPLES,
+         max_workers=None, bin_width=DEFAULT_BIN_WIDTH):
+    """在 tasks 中找出期望总伤害最高的 top_k 个配置，返回按排名排列的记录列表。
+
+    tasks 为任务列表或 compositions 返回的 [(标签, 任务), ...]。淘汰使用 race_z 倍标准误的
+    置信区间(候选很多时应比报告用的 z 更保守)；budget 为全部候选合计的模拟场数上限。
+    每条记录含 task、mean、ci_half_width、ci_low、ci_high(按 z)、samples、battles、
+    eliminated_round(未被淘汰时为 None) 与 top_k，可直接传给 pandas.DataFrame。
+    """
+    if labels is None and tasks and isinstance(tasks[0][0], str):
+        labels, tasks = [label for label, _ in tasks], [task for _, task in tasks]
+    labels = [repr(task) for task in tasks] if labels is None else list(labels)
+    seed = resolve_seed(seed)
+    cost = getattr(simulate, 'cost', 1)
+    stats = [None] * len(tasks)
+    next_chunk = [0] * len(tasks)
+    eliminated = [None] * len(tasks)
+    alive = list(range(len(tasks)))
+    target, spent, round_index = initial_samples, 0, 0
+    executor = make_executor(max_workers)
+    try:
+        while alive:
+            goal = min(target, max_samples)
+            if budget is not None:
+                done = sum(stats[i].count if stats[i] else 0 for i in alive)
+                goal = min(goal, (done + (budget - spent) // cost) // len(alive))
+            plan = []
+            for i in alive:
+                done = stats[i].count if stats[i] is not None else 0
+                for j in itertools.count(next_chunk[i]):
+                    n = min(chunk_size, goal - done)
+                    if n <= 0:
+                        break
+                    plan.append((i, j, n))
+                    done += n
+            if not plan:
+                break
+            partials = run_chunks(simulate, tasks, plan, seed, executor, bin_width)
+            for key in sorted(partials):
+                i = key[0]
+                stats[i] = partials[key] if stats[i] is None else stats[i].merge(partials[key])
+                next_chunk[i] = key[1] + 1
+            spent += sum(n for _, _, n in plan) * cost
+            round_index += 1
+
+            if len(alive) > top_k:
+                threshold = sorted((_bounds(stats[i], race_z)[0] for i in alive), reverse=True)[top_k - 1]
+                for i in alive:
+                    if _bounds(stats[i], race_z)[1] < threshold:
+                        eliminated[i] = round_index
+                alive = [i for i in alive if eliminated[i] is None]
+            if len(alive) <= top_k:
+                break
+            target *= eta
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    # 未被淘汰的按均值排在前面，其余按淘汰轮次(越晚越靠前)、均值排列
+    ranked = [i for i in range(len(tasks)) if stats[i] is not None]
+    ranked.sort(key=lambda i: (eliminated[i] is not None, -(eliminated[i] or 0), -stats[i].total_mean))
+    records = []
+    for rank, i in enumerate(ranked):
+        low, high = _bounds(stats[i], z)
+        records.append({
+            'task': labels[i], 'mean': stats[i].total_mean, 'ci_half_width': (high - low) / 2,
+            'ci_low': low, 'ci_high': high, 'samples': stats[i].count, 'battles': stats[i].count * cost,
+            'eliminated_round': eliminated[i], 'top_k': rank < top_k and eliminated[i] is None,
+        })
+    return records
@@ -0,0 +1,95 @@
+"""
+进程池并行运行器
+
+把 (配置, 分块) 任务分发到 ProcessPoolExecutor。每个分块的随机数流由同一个主种子
+按 (配置内容, 分块序号) 派生，分块大小与进程数无关，父进程再按固定顺序合并各分块的
+样本数、均值与 M2(见 stats.SampleStats)，因此无论用多少个进程，结果都逐位一致。
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .stats import DEFAULT_BIN_WIDTH, SampleStats
+
+DEFAULT_CHUNK_SIZE = 32768
+
+
+def task_stream_id(task):
+    """由配置内容派生的随机数流编号：同一配置无论在任务列表中的哪个位置都使用同一条流。"""
+    text = json.dumps(task, sort_keys=True, ensure_ascii=False, default=repr)
+    return int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+
+
+def chunk_rng(seed, stream_id, chunk_index):
+    """stream_id 对应配置的第 chunk_index 个分块的独立随机数发生器。
+
+    等价于主种子 SeedSequence(seed) 按 spawn_key=(stream_id, chunk_index) 派生的子序列。
+    """
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(stream_id, chunk_index)))
+
+
+def chunk_sizes(n_samples, chunk_size=DEFAULT_CHUNK_SIZE):
+    full, rest = divmod(int(n_samples), chunk_size)
+    return [chunk_size] * full + ([rest] if rest else [])
+
+
+def iter_chunks(simulate, task, n_samples, seed, chunk_size=DEFAULT_CHUNK_SIZE):
+    """逐块产生某个配置的样本数组(与 run_parallel 使用相同的随机数流)，任何时刻只占用一块内存。"""
+    for j, n in enumerate(chunk_sizes(n_samples, chunk_size)):
+        yield simulate(*task, n=n, rng=chunk_rng(seed, task_stream_id(task), j))
+
+
+def _run_chunk(simulate, task, n, seed, chunk_index, bin_width):
+    samples = simulate(*task, n=n, rng=chunk_rng(seed, task_stream_id(task), chunk_index))
+    return SampleStats.from_samples(samples, bin_width)
+
+
+def run_chunks(simulate, tasks, plan, seed, executor=None, bin_width=DEFAULT_BIN_WIDTH):
+    """执行分块计划 plan: [(配置序号, 分块序号, 样本数), ...]，返回 {(配置序号, 分块序号): SampleStats}。"""
+    if executor is None:
+        return {(i, j): _run_chunk(simulate, tasks[i], n, seed, j, bin_width) for i, j, n in plan}
+    futures = {(i, j): executor.submit(_run_chunk, simulate, tasks[i], n, seed, j, bin_width) for i, j, n in plan}
+    return {key: future.result() for key, future in futures.items()}
+
+
+def merge_in_order(partials, task_index):
+    """按分块序号顺序合并某个配置的全部分块，保证浮点求和顺序固定。"""
+    keys = sorted(key for key in partials if key[0] == task_index)
+    merged = partials[keys[0]]
+    for key in keys[1:]:
+        merged = merged.merge(partials[key])
+    return merged
+
+
+def resolve_seed(seed):
+    """seed 为 None 时随机生成一个主种子，并返回它以便复现。"""
+    return np.random.SeedSequence().entropy if seed is None else seed
+
+
+def make_executor(max_workers=None):
+    """max_workers 为 1 时不开进程池，直接在当前进程中运行。"""
+    max_workers = max_workers or os.cpu_count() or 1
+    return None if max_workers == 1 else ProcessPoolExecutor(max_workers=max_workers)
+
+
+def run_parallel(simulate, tasks, n_samples, seed=None, chunk_size=DEFAULT_CHUNK_SIZE, max_workers=None,
+                 bin_width=DEFAULT_BIN_WIDTH):
+    """对 tasks 中的每个配置各模拟 n_samples 次，返回与 tasks 对应的 SampleStats 列表。
+
+    simulate(*task, n=..., rng=...) 须为模块级函数(以便在子进程中调用)，返回 (n,) 或
+    (n, k) 的结果数组，例如 run_batch_simulation_wangyi 或 run_batch_simulation。
+    bin_width 是总伤害直方图的分箱宽度，决定分位数估计的精度。
+    """
+    seed = resolve_seed(seed)
+    plan = [(i, j, n) for i in range(len(tasks)) for j, n in enumerate(chunk_sizes(n_samples, chunk_size))]
+    executor = make_executor(max_workers)
+    try:
+        partials = run_chunks(simulate, tasks, plan, seed, executor, bin_width)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return [merge_in_order(partials, i) for i in range(len(tasks))]
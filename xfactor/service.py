@@ -0,0 +1,320 @@
+"""
+本地模拟服务(asyncio)
+
+几个人反复查询相同或相近的配置表时，不必各自在本地重跑整个脚本：xfactor serve 启动一个
+只依赖标准库与 numpy 的 HTTP 服务，把模拟分块排入进程池，并且：
+
+- 合并相同的请求：同一 (武将, 方差缩减, 配置, 种子, 分块大小) 只有一条分块序列，正在计算
+  的序列被后来的请求直接复用，进程池只做不重复的工作；
+- 复用结果：每条序列保存前 1、2、4、8 ... 块以及各请求所需块数的合并结果，有界的内存
+  缓存(按最近使用淘汰空闲序列)让重复查询立即返回，更大的样本数只补算后面的分块；
+- 渐进返回：样本数每翻一倍输出一行当前估计(NDJSON)，最后一行 done 为 true。同一行中各配置
+  的样本数可能不同(缓存中已算得更多分块的配置直接使用全部分块)，见每条记录的 samples 与 battles。
+
+样本数向上取整为分块大小的整数倍，同一种子下的最终结果与
+run_parallel(模拟函数, [配置], 样本数, seed, chunk_size) 逐位一致。
+
+    xfactor serve --port 8765 --workers 8
+    curl -N 'http://127.0.0.1:8765/simulate?hero=nver&build=Tieqi&support=ZhenJi&support=none&samples=1e6'
+    curl 'http://127.0.0.1:8765/status'
+
+接口(均为 GET)：
+    /simulate   hero、support(可重复)、build(可重复)、samples、seed、variance_reduction 与 stream(0 时只返回最终结果)
+    /heroes     各武将的默认辅助与 build
+    /status     缓存与进程池的计数
+"""
+
+import asyncio
+import collections
+import json
+import multiprocessing
+import os
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .models import HEROES, builds_of, load_model
+from .runner import DEFAULT_CHUNK_SIZE, _run_chunk
+from .stats import DEFAULT_BIN_WIDTH
+from .variance import MODES, with_variance_reduction
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_SEED = 20250615
+DEFAULT_CACHE_SIZE = 256
+DEFAULT_MAX_SAMPLES = 100_000_000
+
+
+def _is_checkpoint(chunks):
+    return chunks & (chunks - 1) == 0
+
+
+class Stream:
+    """某个配置的分块序列，前 k 块的合并结果随计算逐步增长。
+
+    序列只保留 2 的幂与已登记块数处的合并结果(saved)，内存与样本数无关。分块按序号顺序合并，
+    与 run_parallel 的浮点求和顺序相同。
+    """
+
+    def __init__(self, simulate, task, seed, chunk_size, bin_width):
+        self.simulate, self.task, self.seed = simulate, task, seed
+        self.chunk_size, self.bin_width = chunk_size, bin_width
+        self.done = 0
+        self.latest = None
+        self.saved = {}
+        self.wanted = set()
+        self.target = 0
+        self.subscribers = 0
+        self.error = None
+        self.driver = None
+        self.changed = asyncio.Condition()
+
+    @property
+    def running(self):
+        return self.driver is not None and not self.driver.done()
+
+    def request(self, chunks):
+        """登记需要前 chunks 块的结果，返回实际提供的块数。
+
+        序列已越过 chunks 且没有保存该处结果时(更大的请求先到)，改为提供当前已完成的块数。
+        """
+        if chunks <= self.done and chunks not in self.saved:
+            chunks = self.done
+            self.saved[chunks] = self.latest
+        self.wanted.add(chunks)
+        self.target = max(self.target, chunks)
+        return chunks
+
+    async def result(self, chunks):
+        """等待并返回前 chunks 块(须为 2 的幂或已登记的块数)的合并结果。"""
+        async with self.changed:
+            await self.changed.wait_for(lambda: chunks in self.saved or self.error is not None)
+        if chunks not in self.saved:
+            raise self.error
+        return self.saved[chunks]
+
+    async def drive(self, service):
+        """计算到 target 块为止；每轮按进程数提交一批后续分块，按序号顺序合并。"""
+        try:
+            while self.done < self.target:
+                batch = range(self.done, min(self.target, self.done + service.workers))
+                futures = [service.submit(self.simulate, self.task, self.chunk_size, self.seed, j, self.bin_width)
+                           for j in batch]
+                for future in futures:
+                    stats = await future
+                    self.latest = stats if self.latest is None else self.latest.merge(stats)
+                    self.done += 1
+                    service.counters['chunks'] += 1
+                    if _is_checkpoint(self.done) or self.done in self.wanted:
+                        self.saved[self.done] = self.latest
+                    async with self.changed:
+                        self.changed.notify_all()
+        except Exception as error:  # 交给等待结果的请求报告
+            self.error = error
+            async with self.changed:
+                self.changed.notify_all()
+
+
+class SimulationService:
+    """合并相同请求、缓存结果并渐进返回估计的模拟服务。
+
+    max_workers 为 1 时在一个后台线程中计算(不阻塞事件循环)；cache_size 为最多保留的
+    空闲分块序列数。
+    """
+
+    def __init__(self, max_workers=None, cache_size=DEFAULT_CACHE_SIZE, chunk_size=DEFAULT_CHUNK_SIZE,
+                 max_samples=DEFAULT_MAX_SAMPLES, bin_width=DEFAULT_BIN_WIDTH):
+        self.workers = max_workers or os.cpu_count() or 1
+        if self.workers == 1:
+            self.executor = ThreadPoolExecutor(1)
+        else:
+            # 用 spawn 启动工作进程：fork 出的进程会继承已打开的连接，客户端收不到连接关闭
+            self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        self.cache_size = cache_size
+        self.chunk_size = chunk_size
+        self.max_samples = max_samples
+        self.bin_width = bin_width
+        self.streams = collections.OrderedDict()
+        self.counters = collections.Counter()
+
+    def submit(self, simulate, task, n, seed, chunk_index, bin_width):
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self.executor, _run_chunk, simulate, task, n, seed, chunk_index, bin_width)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+    # ==========================================================================
+    # 分块序列的合并与缓存
+    # ==========================================================================
+    def stream(self, hero, variance_reduction, task, seed, chunks):
+        """取得(或新建)配置的分块序列并登记需要的块数，返回 (序列, 实际块数)。"""
+        key = json.dumps([hero, variance_reduction, task, seed, self.chunk_size], sort_keys=True, ensure_ascii=False)
+        stream = self.streams.get(key)
+        if stream is None:
+            simulate = with_variance_reduction(load_model(hero).simulate, variance_reduction)
+            stream = self.streams[key] = Stream(simulate, task, seed, self.chunk_size, self.bin_width)
+        elif stream.running:
+            self.counters['coalesced'] += 1
+        elif chunks <= stream.done:
+            self.counters['cache_hits'] += 1
+        self.streams.move_to_end(key)
+        chunks = stream.request(chunks)
+        if stream.done < stream.target and not stream.running:
+            stream.error = None
+            stream.driver = asyncio.ensure_future(stream.drive(self))
+        self._evict()
+        return stream, chunks
+
+    def _evict(self):
+        # 按最近使用顺序淘汰既不在计算、也没有请求等待的序列
+        for key in list(self.streams):
+            if len(self.streams) <= self.cache_size:
+                break
+            stream = self.streams[key]
+            if not stream.running and not stream.subscribers:
+                del self.streams[key]
+
+    async def estimates(self, hero, tasks, samples, seed=DEFAULT_SEED, variance_reduction=None):
+        """渐进估计：每个配置的样本数每翻一倍产生一次 (已完成块数, 总块数, [SampleStats, ...])。"""
+        if samples > self.max_samples:
+            raise ValueError(f"样本数超过服务上限 {self.max_samples}")
+        cost = getattr(with_variance_reduction(load_model(hero).simulate, variance_reduction), 'cost', 1)
+        chunks = -(-max(samples // cost, 1) // self.chunk_size)
+        self.counters['requests'] += 1
+        requests = [self.stream(hero, variance_reduction, task, seed, chunks) for task in tasks]
+        for stream, _ in requests:
+            stream.subscribers += 1
+        try:
+            total = max(count for _, count in requests)
+            steps = [k for k in (1 << i for i in range(total.bit_length())) if k < total] + [total]
+            for k in steps:
+                # k < total 时 k 是 2 的幂，各序列都保存了该处的结果
+                results = [await stream.result(min(k, count)) for stream, count in requests]
+                yield k, total, results
+        finally:
+            for stream, _ in requests:
+                stream.subscribers -= 1
+
+    def status(self):
+        return {**self.counters, 'workers': self.workers, 'chunk_size': self.chunk_size,
+                'streams': len(self.streams), 'running': sum(stream.running for stream in self.streams.values()),
+                'cache_size': self.cache_size}
+
+    # ==========================================================================
+    # HTTP
+    # ==========================================================================
+    async def handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass  # 忽略请求头
+            if len(request_line) != 3:
+                return
+            method, target, _ = request_line
+            url = urllib.parse.urlsplit(target)
+            params = urllib.parse.parse_qs(url.query)
+            if method != 'GET':
+                await _send_json(writer, 405, {'error': f'不支持的方法: {method}'})
+            elif url.path == '/simulate':
+                await self._simulate(writer, params)
+            elif url.path == '/heroes':
+                await _send_json(writer, 200, heroes())
+            elif url.path == '/status':
+                await _send_json(writer, 200, self.status())
+            else:
+                await _send_json(writer, 404, {'error': f'没有这个接口: {url.path}'})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass  # 客户端中途断开；已提交的分块仍会算完并留在缓存中
+        finally:
+            writer.close()
+
+    async def _simulate(self, writer, params):
+        from .cli import build_tasks, check_selection, make_records, parse_count, parse_support
+
+        try:
+            hero = _param(params, 'hero')
+            model = load_model(hero)
+            supports = [parse_support(text) for text in params['support']] if 'support' in params else None
+            builds = params.get('build')
+            check_selection(model, supports, builds)
+            tasks = build_tasks(model, supports, builds)
+            samples = parse_count(_param(params, 'samples', '50000'))
+            seed = int(_param(params, 'seed', DEFAULT_SEED))
+            variance_reduction = _param(params, 'variance_reduction', None)
+            if variance_reduction is not None and variance_reduction not in MODES:
+                raise ValueError(f"未知的方差缩减模式: {variance_reduction}，可选 {MODES}")
+            stream = _param(params, 'stream', '1') != '0'
+        except Exception as error:  # 参数错误(未知武将、样本数格式等)
+            message = error.args[0] if isinstance(error, KeyError) and error.args else str(error)
+            await _send_json(writer, 400, {'error': message})
+            return
+
+        cost = getattr(with_variance_reduction(model.simulate, variance_reduction), 'cost', 1)
+        metadata = {'hero': hero, 'seed': seed, 'variance_reduction': variance_reduction}
+        started = False
+        try:
+            async for k, total, results in self.estimates(hero, [task for _, task in tasks], samples, seed,
+                                                          variance_reduction):
+                if not stream and k < total:
+                    continue
+                line = {**metadata, 'done': k == total,
+                        'results': make_records(hero, tasks, results, cost)}
+                if not stream:
+                    await _send_json(writer, 200, line)
+                    return
+                if not started:
+                    writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson; charset=utf-8\r\n'
+                                 b'Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n')
+                    started = True
+                data = (json.dumps(line, ensure_ascii=False) + '\n').encode('utf-8')
+                writer.write(b'%x\r\n%s\r\n' % (len(data), data))
+                await writer.drain()
+        except Exception as error:
+            if started:
+                data = (json.dumps({'error': str(error)}, ensure_ascii=False) + '\n').encode('utf-8')
+                writer.write(b'%x\r\n%s\r\n' % (len(data), data))
+            else:
+                await _send_json(writer, 400 if isinstance(error, ValueError) else 500, {'error': str(error)})
+                return
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+
+def _param(params, name, default=KeyError):
+    if name in params:
+        return params[name][-1]
+    if default is KeyError:
+        raise KeyError(f"缺少参数 {name}")
+    return default
+
+
+async def _send_json(writer, status, payload):
+    reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    writer.write(f'HTTP/1.1 {status} {reasons[status]}\r\nContent-Type: application/json; charset=utf-8\r\n'
+                 f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode('latin-1') + body)
+    await writer.drain()
+
+
+def heroes():
+    """各武将的名字、默认辅助配置与 build，供客户端构造请求。"""
+    result = {}
+    for hero in sorted(HEROES):
+        model = load_model(hero)
+        result[hero] = {'name': model.HERO, 'supports': [label for label, _ in model.SUPPORTS],
+                        'builds': [build for build in builds_of(model) if build is not None]}
+    return result
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, max_workers=None, cache_size=DEFAULT_CACHE_SIZE,
+                chunk_size=DEFAULT_CHUNK_SIZE, ready=None):
+    """运行服务直到被取消；ready(server) 在开始监听后调用(例如打印地址)。"""
+    service = SimulationService(max_workers, cache_size, chunk_size)
+    server = await asyncio.start_server(service.handle, host, port)
+    try:
+        if ready is not None:
+            ready(server)
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
@@ -0,0 +1,190 @@
+"""
+分片运行：断点续跑与多机合并
+
+超大作业(每个配置上千万场)按 (配置, 分块区间) 切成分片，每个分片完成后立即写入一个
+小的部分累加器文件(各分块的样本数、均值、M2 与总伤害直方图)，中途崩溃或被抢占最多
+损失正在运行的分片。目录结构：
+
+    目录/
+        job.json                  武将、配置、种子、样本数、分块大小与模型指纹
+        shards/<流编号>-<序号>.npz  分片结果
+
+run_shards 跳过已完成的分片，因此续跑就是再运行一次；多台机器共享同一目录时用
+hosts/host_index 各取一部分分片。merge_shards 按分块序号依次合并全部分片，结果与
+在一台机器上 run_parallel 的结果逐位一致。
+
+    xfactor shard init big --hero nver --samples 1e7 --seed 1
+    xfactor shard run big --hosts 2 --host-index 0      # 第二台机器用 --host-index 1
+    xfactor shard resume big                            # 补跑缺失的分片
+    xfactor shard merge big --format csv -o big.csv
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from .cache import code_digest, model_constants
+from .models import load_model
+from .runner import DEFAULT_CHUNK_SIZE, _run_chunk, chunk_sizes, make_executor, task_stream_id
+from .stats import DEFAULT_BIN_WIDTH, Histogram, SampleStats
+from .variance import with_variance_reduction
+
+JOB = 'job.json'
+DEFAULT_SHARD_SAMPLES = 1_000_000
+
+
+def job_simulate(job):
+    """作业使用的批量模拟函数(按 job.json 中的武将与方差缩减模式构造)。"""
+    return with_variance_reduction(load_model(job['hero']).simulate, job['variance_reduction'])
+
+
+def fingerprint(hero, variance_reduction=None):
+    """模型全部数值常量与模拟代码(见 cache.code_digest)的哈希；各台机器的系数或代码不一致时拒绝运行。"""
+    model = load_model(hero)
+    simulate = with_variance_reduction(model.simulate, variance_reduction)
+    payload = {'constants': model_constants(vars(model)), 'source': code_digest(simulate),
+               'simulate': getattr(simulate, '__qualname__', repr(simulate))}
+    text = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=repr)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]
+
+
+def create_job(directory, hero, tasks, n_samples, seed, chunk_size=DEFAULT_CHUNK_SIZE,
+               shard_samples=DEFAULT_SHARD_SAMPLES, variance_reduction=None, bin_width=DEFAULT_BIN_WIDTH):
+    """在 directory 中写入 job.json。tasks 为 [(标签, 任务), ...]；每个分片约 shard_samples 场。
+
+    目录中已有不同的作业时报错，避免把两次作业的分片混在一起。
+    """
+    job = {
+        'hero': hero, 'labels': [label for label, _ in tasks],
+        'tasks': json.loads(json.dumps([task for _, task in tasks], ensure_ascii=False)),
+        'samples': int(n_samples), 'seed': int(seed), 'chunk_size': int(chunk_size),
+        'shard_chunks': max(int(shard_samples) // chunk_size, 1), 'variance_reduction': variance_reduction,
+        'bin_width': bin_width, 'fingerprint': fingerprint(hero, variance_reduction),
+    }
+    path = os.path.join(directory, JOB)
+    if os.path.exists(path):
+        existing = load_job(directory)
+        if existing != job:
+            raise ValueError(f"{path} 中已有不同的作业；请换一个目录或先删除它")
+        return job
+    os.makedirs(os.path.join(directory, 'shards'), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(job, f, ensure_ascii=False, indent=2)
+    return job
+
+
+def load_job(directory):
+    with open(os.path.join(directory, JOB), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def shard_plan(job):
+    """[(配置序号, 分片序号, 首个分块序号, 各分块样本数), ...]，顺序与合并顺序一致。"""
+    plan = []
+    sizes = chunk_sizes(job['samples'], job['chunk_size'])
+    step = job['shard_chunks']
+    for i in range(len(job['tasks'])):
+        for k, first in enumerate(range(0, len(sizes), step)):
+            plan.append((i, k, first, sizes[first:first + step]))
+    return plan
+
+
+def shard_path(directory, job, config_index, shard_index):
+    stream = task_stream_id(job['tasks'][config_index])
+    return os.path.join(directory, 'shards', f'{stream:016x}-{shard_index:05d}.npz')
+
+
+def _save_shard(path, partials):
+    # 逐分块保存，合并时按分块顺序逐个合并，与单机运行的浮点求和顺序相同
+    histograms = [stats.histogram for stats in partials]
+    arrays = {
+        'count': np.array([stats.count for stats in partials]),
+        'mean': np.array([stats.mean for stats in partials]),
+        'm2': np.array([stats.m2 for stats in partials]),
+        'total_mean': np.array([stats.total_mean for stats in partials]),
+        'total_m2': np.array([stats.total_m2 for stats in partials]),
+        'bin_width': histograms[0].bin_width,
+        'hist_offset': np.array([h.offset for h in histograms]),
+        'hist_length': np.array([len(h.counts) for h in histograms]),
+        'hist_counts': np.concatenate([h.counts for h in histograms]),
+    }
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)  # 原子替换：其他机器只会看到完整的分片
+
+
+def _load_shard(path):
+    with np.load(path) as data:
+        ends = np.cumsum(data['hist_length'])
+        counts = np.split(data['hist_counts'], ends[:-1])
+        return [SampleStats(int(data['count'][j]), data['mean'][j], data['m2'][j], float(data['total_mean'][j]),
+                            float(data['total_m2'][j]),
+                            Histogram(float(data['bin_width']), int(data['hist_offset'][j]), counts[j]))
+                for j in range(len(data['count']))]
+
+
+def _run_shard(simulate, task, seed, first_chunk, sizes, path, bin_width):
+    partials = [_run_chunk(simulate, task, n, seed, j, bin_width) for j, n in enumerate(sizes, first_chunk)]
+    _save_shard(path, partials)
+    return path
+
+
+def shard_status(directory):
+    """(已完成分片数, 分片总数)。"""
+    job = load_job(directory)
+    plan = shard_plan(job)
+    done = sum(os.path.exists(shard_path(directory, job, i, k)) for i, k, _, _ in plan)
+    return done, len(plan)
+
+
+def run_shards(directory, max_workers=None, hosts=1, host_index=0, progress=None):
+    """运行尚未完成的分片(第 host_index 台机器只运行序号 % hosts == host_index 的分片)，返回本次完成的分片数。
+
+    模型系数或模拟代码与创建作业时不同则报错。progress(已完成, 总数) 在每个分片完成后调用。
+    """
+    job = load_job(directory)
+    if fingerprint(job['hero'], job['variance_reduction']) != job['fingerprint']:
+        raise ValueError("模型系数或模拟代码与创建作业时不同，分片结果不能合并")
+    simulate = job_simulate(job)
+    plan = shard_plan(job)
+    pending = [(i, k, first, sizes) for n, (i, k, first, sizes) in enumerate(plan)
+               if n % hosts == host_index and not os.path.exists(shard_path(directory, job, i, k))]
+    executor = make_executor(max_workers)
+    try:
+        if executor is None:
+            for n, (i, k, first, sizes) in enumerate(pending, 1):
+                _run_shard(simulate, job['tasks'][i], job['seed'], first, sizes, shard_path(directory, job, i, k),
+                           job['bin_width'])
+                if progress is not None:
+                    progress(n, len(pending))
+        else:
+            futures = [executor.submit(_run_shard, simulate, job['tasks'][i], job['seed'], first, sizes,
+                                       shard_path(directory, job, i, k), job['bin_width'])
+                       for i, k, first, sizes in pending]
+            for n, future in enumerate(futures, 1):
+                future.result()
+                if progress is not None:
+                    progress(n, len(pending))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return len(pending)
+
+
+def merge_shards(directory):
+    """合并全部分片，返回与 job.json 中配置对应的 SampleStats 列表；有分片缺失时报错。"""
+    job = load_job(directory)
+    if fingerprint(job['hero'], job['variance_reduction']) != job['fingerprint']:
+        raise ValueError("模型系数或模拟代码与创建作业时不同，请用创建作业时的代码合并")
+    plan = shard_plan(job)
+    missing = [(i, k) for i, k, _, _ in plan if not os.path.exists(shard_path(directory, job, i, k))]
+    if missing:
+        raise FileNotFoundError(f"还有 {len(missing)}/{len(plan)} 个分片未完成，请先运行 xfactor shard resume")
+    results = [None] * len(job['tasks'])
+    for i, k, _, _ in plan:
+        for stats in _load_shard(shard_path(directory, job, i, k)):
+            results[i] = stats if results[i] is None else results[i].merge(stats)
+    return results
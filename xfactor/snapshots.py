@@ -0,0 +1,162 @@
+"""
+回合快照与增量续跑
+
+很多假设分析只改变后几回合的行为：谋而后动每回合的系数增量、铁骑的逐回合衰减、把战斗
+回合数从 4 改为 6 等。前 k 回合的结果与改动无关，没有必要每次都从第 1 回合重新模拟。
+
+批量引擎接受 snapshot_turns=[k, ...]，在第 k 回合结束时保存全部跨回合状态(运智层数、累计
+普攻次数、心计层数、整备状态池与已获得整备、已结算回合的伤害)以及随机数发生器的位置；
+resume=快照 时从第 k+1 回合继续。随机数的消耗顺序与不中断时完全相同，因此只要改动不影响
+前 k 回合，续跑结果与完整重跑逐位一致，而只需模拟后面的回合。
+
+本模块把 (配置, 分块) 的快照保存到目录中，并在进程池中续跑：
+
+    目录/
+        snapshots.json                      种子、样本数、分块大小、各配置与已保存的回合
+        <流编号>-<分块序号>-t<回合>.npz        状态数组与随机数发生器状态
+
+    record_snapshots(model.simulate, tasks, 1_000_000, 'snap', turns=[4], seed=1)
+    resume_snapshots(model.simulate, 'snap', 4, overrides={'战斗回合数': 6})   # 只模拟第 5、6 回合
+"""
+
+import inspect
+import json
+import os
+
+import numpy as np
+
+from .runner import DEFAULT_CHUNK_SIZE, chunk_rng, chunk_sizes, make_executor, resolve_seed, task_stream_id
+from .stats import DEFAULT_BIN_WIDTH, SampleStats
+from .sweep import patched_constants
+
+MANIFEST = 'snapshots.json'
+
+
+# ==============================================================================
+# 供批量引擎使用的快照格式
+# ==============================================================================
+def capture(turn, rng, **state):
+    """第 turn 回合结束时的快照：各状态数组的副本与随机数发生器(或 BlockRNG)的位置。"""
+    return {'turn': turn, 'rng': getattr(rng, 'generator', rng).bit_generator.state,
+            'state': {name: np.array(value, copy=True) for name, value in state.items()}}
+
+
+def restore(snapshot, n, turns):
+    """检查快照与本次运行相容，返回 (已完成回合数, 状态数组的副本, 续接的随机数发生器)。
+
+    状态数组是副本，同一个快照可以续跑多次(例如参数扫描的每个取值点)。
+    """
+    state = snapshot['state']
+    size = len(next(iter(state.values())))
+    if size != n:
+        raise ValueError(f"快照有 {size} 场战斗，本次运行 n={n}")
+    if snapshot['turn'] > turns:
+        raise ValueError(f"快照在第 {snapshot['turn']} 回合结束时保存，超过战斗回合数 {turns}")
+    bit_generator = getattr(np.random, snapshot['rng']['bit_generator'])()
+    bit_generator.state = snapshot['rng']
+    return snapshot['turn'], {name: value.copy() for name, value in state.items()}, np.random.Generator(bit_generator)
+
+
+def save_snapshot(path, snapshot):
+    arrays = {f'state_{name}': value for name, value in snapshot['state'].items()}
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, turn=snapshot['turn'], rng=json.dumps(snapshot['rng']), **arrays)
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path):
+    with np.load(path) as data:
+        # PCG64 等位生成器的状态含超过 64 位的整数，以 JSON 文本保存
+        return {'turn': int(data['turn']), 'rng': json.loads(str(data['rng'])),
+                'state': {name[6:]: data[name] for name in data.files if name.startswith('state_')}}
+
+
+# ==============================================================================
+# 按 (配置, 分块) 保存快照并续跑
+# ==============================================================================
+def snapshot_path(directory, task, chunk_index, turn):
+    return os.path.join(directory, f'{task_stream_id(task):016x}-{chunk_index:05d}-t{turn}.npz')
+
+
+def _record_chunk(simulate, task, n, seed, chunk_index, turns, directory, bin_width):
+    samples, snapshots = simulate(*task, n=n, rng=chunk_rng(seed, task_stream_id(task), chunk_index),
+                                  snapshot_turns=turns)
+    for turn, snapshot in snapshots.items():
+        save_snapshot(snapshot_path(directory, task, chunk_index, turn), snapshot)
+    return SampleStats.from_samples(samples, bin_width)
+
+
+def _resume_chunk(simulate, task, n, chunk_index, turn, directory, overrides, derive, bin_width):
+    snapshot = load_snapshot(snapshot_path(directory, task, chunk_index, turn))
+    with patched_constants(inspect.unwrap(simulate).__globals__, overrides or {}, derive):
+        samples = simulate(*task, n=n, rng=None, resume=snapshot)
+    return SampleStats.from_samples(samples, bin_width)
+
+
+def _run_plan(function, plan, max_workers):
+    executor = make_executor(max_workers)
+    try:
+        if executor is None:
+            partials = {(i, j): function(*args) for i, j, args in plan}
+        else:
+            futures = {(i, j): executor.submit(function, *args) for i, j, args in plan}
+            partials = {key: future.result() for key, future in futures.items()}
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    results = []
+    for i in sorted({i for i, _ in partials}):
+        keys = sorted(key for key in partials if key[0] == i)
+        merged = partials[keys[0]]
+        for key in keys[1:]:
+            merged = merged.merge(partials[key])
+        results.append(merged)
+    return results
+
+
+def read_manifest(directory):
+    with open(os.path.join(directory, MANIFEST), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def record_snapshots(simulate, tasks, n_samples, directory, turns, seed=None, labels=None,
+                     chunk_size=DEFAULT_CHUNK_SIZE, max_workers=None, bin_width=DEFAULT_BIN_WIDTH):
+    """完整模拟每个配置 n_samples 场，并在 turns 中各回合结束时把快照保存到 directory。
+
+    返回与 run_parallel(simulate, ...) 逐位一致的 SampleStats 列表(保存快照不改变结果)。
+    每个分块的快照约占 n × 回合数 × 8 字节，女儿模型另有 n × 8 字节的整备状态池。
+    """
+    seed = resolve_seed(seed)
+    turns = sorted({int(turn) for turn in turns})
+    labels = [repr(task) for task in tasks] if labels is None else list(labels)
+    os.makedirs(directory, exist_ok=True)
+    sizes = chunk_sizes(n_samples, chunk_size)
+    plan = [(i, j, (simulate, tasks[i], n, seed, j, turns, directory, bin_width))
+            for i in range(len(tasks)) for j, n in enumerate(sizes)]
+    results = _run_plan(_record_chunk, plan, max_workers)
+    manifest = {'seed': seed, 'samples': int(n_samples), 'chunk_size': chunk_size, 'turns': turns,
+                'simulate': getattr(simulate, '__qualname__', repr(simulate)),
+                'configs': [{'label': label, 'task': json.loads(json.dumps(task, ensure_ascii=False, default=repr))}
+                            for label, task in zip(labels, tasks)]}
+    with open(os.path.join(directory, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return results
+
+
+def resume_snapshots(simulate, directory, turn, overrides=None, derive=None, max_workers=None,
+                     bin_width=DEFAULT_BIN_WIDTH):
+    """从第 turn 回合结束时的快照续跑 directory 中的全部配置，返回 SampleStats 列表。
+
+    overrides({系数名: 取值}，由 derive 重新计算推导常量)在每个分块续跑期间生效，只应改变
+    第 turn 回合之后的行为，例如更大的战斗回合数或后几回合的系数。overrides 为空时结果与
+    record_snapshots 的返回值逐位一致。
+    """
+    manifest = read_manifest(directory)
+    if turn not in manifest['turns']:
+        raise ValueError(f"{directory} 中没有第 {turn} 回合的快照，已保存 {manifest['turns']}")
+    tasks = [tuple(config['task']) for config in manifest['configs']]
+    sizes = chunk_sizes(manifest['samples'], manifest['chunk_size'])
+    plan = [(i, j, (simulate, tasks[i], n, j, turn, directory, overrides, derive, bin_width))
+            for i in range(len(tasks)) for j, n in enumerate(sizes)]
+    return _run_plan(_resume_chunk, plan, max_workers)
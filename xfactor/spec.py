@@ -0,0 +1,155 @@
+"""
+声明式的辅助武将、技能与状态定义
+
+各期模型(xfactor.models)用 SupportSpec / SkillSpec / StateEffect 描述辅助武将、可选技能和整备一类的状态，
+compile_team 在每次批量模拟开始时把配置(一个或多个辅助)解析为一个扁平的 Team：
+所有效果都已按回合展开、合并为数值，模拟循环中只做数组运算，不再比较武将名字符串。
+新的一期只需为新武将写主循环，辅助武将的效果直接声明即可，多个辅助的效果自动叠加。
+
+定义按当前模块系数构造(见各模型的 define_supports / 辅助定义)，因此参数扫描修改系数后同样生效。
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class SupportSpec:
+    """一名辅助武将提供的效果。未声明的效果取中性值。"""
+
+    name: str
+    damage_multiplier: float = 1.0      # 最终伤害乘数，多个辅助相乘(如王异的庞统、荀彧)
+    damage_bonus: float = 0.0           # 加到主将总伤害乘数上的增伤，多个辅助相加(如女儿的庞统、荀彧)
+    strategy_boost: float = 0.0         # 谋略伤害增伤(如甄姬洛神)
+    pursuit_boost: float = 0.0          # 前 boost_turns 回合的追击伤害增伤(如马腾)
+    boost_turns: int = 0
+    extra_attack_prob: float = 0.0      # 前 extra_attack_turns 回合每回合额外普攻一次的概率(如马腾)
+    extra_attack_turns: int = 0
+    first_qimou_per_turn: bool = False  # 每回合首次谋略伤害必定奇谋(甄姬)
+    qimou_rate: float = 0.0             # 奇谋率提升
+    qimou_damage: float = 0.0           # 奇谋伤害提升
+    # 心计(张春华)：每次普攻按概率获得一层；每回合末追加一次普攻，心计不足 follow_up_threshold 时哑火
+    xinji_gain_prob: float = 0.0
+    xinji_max_stacks: int = 0
+    xinji_damage_boost: float = 0.0     # 每层心计对主将伤害的增伤
+    xinji_hit_coeff: float = 0.0        # 辅助自身每次普攻的伤害系数
+    xinji_hit_boost: float = 0.0        # 每层心计对辅助自身伤害的增伤
+    follow_up_threshold: int = 0
+    attacks_trigger_strategy: bool = False  # 每次普攻都视为造成了谋略伤害(用于触发主将的被动)
+
+
+@dataclass(frozen=True)
+class SkillSpec:
+    """一个可选的追击谋略技能：每次普攻后按 proc_rate 发动。
+
+    每段伤害系数为 (base_coeff + (回合 - 1) * coeff_per_turn) * targets，共 hits 段，发动后另有
+    extra_hit_prob 的概率追加一段；每段按 boost_prob 的概率获得 boost_amount 的增伤，奇谋判定时
+    奇谋率额外提高 extra_qimou_rate。
+    """
+
+    name: str
+    proc_rate: float
+    base_coeff: float
+    coeff_per_turn: float = 0.0
+    targets: int = 1
+    hits: int = 1
+    extra_hit_prob: float = 0.0
+    extra_qimou_rate: float = 0.0
+    boost_prob: float = 0.0
+    boost_amount: float = 0.0
+
+    def coeff(self, turn):
+        return (self.base_coeff + (turn - 1) * self.coeff_per_turn) * self.targets
+
+    @property
+    def max_hits(self):
+        return self.hits + (self.extra_hit_prob > 0)
+
+    @property
+    def n_draws(self):
+        """每次普攻需要的随机数行数：发动、追加段、每段奇谋、每段增伤。"""
+        return 1 + (self.extra_hit_prob > 0) + self.max_hits * (1 + (self.boost_prob > 0))
+
+
+@dataclass(frozen=True)
+class StateEffect:
+    """获得某个状态(如第 k 号整备)后提供的效果：effect 为效果名，amount 为数值。"""
+
+    effect: str
+    amount: float
+
+
+def effect_table(states, effect, n_states=8):
+    """按位掩码查表：第 mask 项为掩码 mask 中全部状态的 effect 效果之和(第 k 号状态对应第 k-1 位)。"""
+    amounts = np.zeros(n_states)
+    for number, state in states.items():
+        if state.effect == effect:
+            amounts[number - 1] += state.amount
+    bits = (np.arange(1 << n_states)[:, None] >> np.arange(n_states)) & 1
+    return bits @ amounts
+
+
+@dataclass(frozen=True)
+class Team:
+    """compile_team 的结果：一组辅助武将合并后的全部效果。"""
+
+    names: tuple
+    damage_multiplier: float
+    damage_bonus: float
+    strategy_boost: float
+    pursuit_boost: tuple                # 每回合(按 回合 - 1 索引)的追击增伤
+    extra_attacks: tuple                # 每名提供额外普攻的辅助一项：(概率, 持续回合数)
+    first_qimou_per_turn: bool
+    qimou_rate: float
+    qimou_damage: float
+    xinji: SupportSpec                  # 提供心计的辅助，没有时为 None
+    attacks_trigger_strategy: bool
+
+
+def support_names(support_config):
+    """配置中的辅助武将名：None、{'name': ...} 或由它们组成的列表。"""
+    if not support_config:
+        return ()
+    if isinstance(support_config, dict):
+        return (support_config['name'],)
+    return tuple(name for config in support_config for name in support_names(config))
+
+
+def compile_team(support_config, definitions, n_turns):
+    """把配置中的辅助武将按 definitions({名字: SupportSpec}) 解析并合并为 Team。
+
+    同一名辅助至多出现一次，重复时报 ValueError(否则其效果会被叠加两次)。
+    """
+    names = support_names(support_config)
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"同一名辅助武将不能重复上阵: {duplicates}")
+    specs = []
+    for name in names:
+        if name not in definitions:
+            raise KeyError(f"未定义的辅助武将: {name}")
+        specs.append(definitions[name])
+    xinji = [spec for spec in specs if spec.xinji_gain_prob > 0 or spec.follow_up_threshold > 0]
+    if len(xinji) > 1:
+        raise ValueError(f"至多一名辅助提供心计: {[spec.name for spec in xinji]}")
+
+    damage_multiplier = 1.0
+    for spec in specs:
+        damage_multiplier *= spec.damage_multiplier
+    pursuit_boost = tuple(
+        sum((spec.pursuit_boost for spec in specs if turn <= spec.boost_turns), 0.0) for turn in range(1, n_turns + 1)
+    )
+    return Team(
+        names=tuple(spec.name for spec in specs),
+        damage_multiplier=damage_multiplier,
+        damage_bonus=sum((spec.damage_bonus for spec in specs), 0.0),
+        strategy_boost=sum((spec.strategy_boost for spec in specs), 0.0),
+        pursuit_boost=pursuit_boost,
+        extra_attacks=tuple((spec.extra_attack_prob, spec.extra_attack_turns) for spec in specs if spec.extra_attack_prob > 0),
+        first_qimou_per_turn=any(spec.first_qimou_per_turn for spec in specs),
+        qimou_rate=sum((spec.qimou_rate for spec in specs), 0.0),
+        qimou_damage=sum((spec.qimou_damage for spec in specs), 0.0),
+        xinji=xinji[0] if xinji else None,
+        attacks_trigger_strategy=any(spec.attacks_trigger_strategy for spec in specs),
+    )
@@ -0,0 +1,156 @@
+"""
+流式统计量
+
+所有统计量都可以逐块累积、任意顺序合并，内存占用与样本总数无关：
+- SampleStats：逐列(每回合)与总伤害的 Welford 均值/方差，附带总伤害的直方图；
+- Histogram：固定宽度分箱的直方图，用于估计分位数；
+- batched / accumulate：把逐场或逐块产生结果的生成器接到上述累加器上。
+
+例如用标量参考实现跑一千万场而不保存任何单场结果：
+
+    accumulate(batched(run_single_simulation_wangyi(cfg) for _ in range(10_000_000)))
+"""
+
+import itertools
+
+import numpy as np
+
+DEFAULT_BIN_WIDTH = 0.1
+
+
+class Histogram:
+    """固定宽度 bin_width 的直方图，第 k 个分箱为 [k * bin_width, (k + 1) * bin_width)。
+
+    只保存出现过的分箱范围 [offset, offset + len(counts))，因此无需事先知道取值范围，
+    且相同分箱宽度的直方图可以直接合并。
+    """
+
+    def __init__(self, bin_width=DEFAULT_BIN_WIDTH, offset=0, counts=None):
+        self.bin_width = bin_width
+        self.offset = int(offset)
+        self.counts = np.zeros(0, dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+
+    @classmethod
+    def from_samples(cls, samples, bin_width=DEFAULT_BIN_WIDTH):
+        bins = np.floor(np.asarray(samples) / bin_width).astype(np.int64)
+        if len(bins) == 0:
+            return cls(bin_width)
+        offset = bins.min()
+        return cls(bin_width, offset, np.bincount(bins - offset))
+
+    @property
+    def count(self):
+        return int(self.counts.sum())
+
+    def merge(self, other):
+        if other.bin_width != self.bin_width:
+            raise ValueError(f"分箱宽度不同，无法合并: {self.bin_width} != {other.bin_width}")
+        if len(other.counts) == 0:
+            return Histogram(self.bin_width, self.offset, self.counts.copy())
+        if len(self.counts) == 0:
+            return Histogram(other.bin_width, other.offset, other.counts.copy())
+        offset = min(self.offset, other.offset)
+        end = max(self.offset + len(self.counts), other.offset + len(other.counts))
+        counts = np.zeros(end - offset, dtype=np.int64)
+        counts[self.offset - offset:self.offset - offset + len(self.counts)] += self.counts
+        counts[other.offset - offset:other.offset - offset + len(other.counts)] += other.counts
+        return Histogram(self.bin_width, offset, counts)
+
+    def quantile(self, q):
+        """分位数估计(分箱内线性插值)，q 可以是标量或数组，误差不超过一个分箱宽度。"""
+        cumulative = np.cumsum(self.counts)
+        target = np.asarray(q, dtype=np.float64) * cumulative[-1]
+        index = np.clip(np.searchsorted(cumulative, target, side='left'), 0, len(cumulative) - 1)
+        before = np.where(index > 0, cumulative[index - 1], 0)
+        fraction = np.where(self.counts[index] > 0, (target - before) / np.maximum(self.counts[index], 1), 0.0)
+        return (self.offset + index + np.clip(fraction, 0.0, 1.0)) * self.bin_width
+
+    def exceedance(self, threshold):
+        """P(X >= threshold) 的估计(分箱内按均匀分布插值)。"""
+        position = threshold / self.bin_width - self.offset
+        index = int(np.floor(position))
+        if index < 0:
+            return 1.0
+        if index >= len(self.counts):
+            return 0.0
+        above = self.counts[index + 1:].sum() + self.counts[index] * (1 - (position - index))
+        return float(above / self.counts.sum())
+
+
+class SampleStats:
+    """一组模拟结果的可合并统计量：样本数、逐列 Welford 均值与 M2，以及总伤害的同类统计和直方图。
+
+    二维结果 (n, k) 按列统计(例如每回合伤害)，另外单独统计每行之和(即总伤害)；
+    一维结果 (n,) 视为只有一列。合并采用 Chan 等人的并行公式，数值稳定。
+    """
+
+    def __init__(self, count, mean, m2, total_mean, total_m2, histogram=None):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.total_mean = total_mean
+        self.total_m2 = total_m2
+        self.histogram = histogram
+
+    @classmethod
+    def from_samples(cls, samples, bin_width=DEFAULT_BIN_WIDTH):
+        samples = np.asarray(samples, dtype=np.float64)
+        columns = samples.reshape(len(samples), -1)
+        totals = columns.sum(axis=1)
+        mean = columns.mean(axis=0)
+        total_mean = totals.mean()
+        return cls(len(samples), mean, np.square(columns - mean).sum(axis=0),
+                   total_mean, np.square(totals - total_mean).sum(),
+                   Histogram.from_samples(totals, bin_width))
+
+    @classmethod
+    def from_moments(cls, count, mean, var, total_mean, total_var, histogram=None):
+        """由样本数、均值与方差还原(用于从结果缓存读取)。"""
+        return cls(count, np.asarray(mean, dtype=np.float64), np.asarray(var, dtype=np.float64) * (count - 1),
+                   total_mean, total_var * (count - 1), histogram)
+
+    def merge(self, other):
+        count = self.count + other.count
+        weight = other.count / count
+        delta = other.mean - self.mean
+        total_delta = other.total_mean - self.total_mean
+        correction = self.count * other.count / count
+        if self.histogram is not None and other.histogram is not None:
+            histogram = self.histogram.merge(other.histogram)
+        else:
+            histogram = None
+        return SampleStats(count, self.mean + delta * weight, self.m2 + other.m2 + np.square(delta) * correction,
+                           self.total_mean + total_delta * weight, self.total_m2 + other.total_m2 + total_delta ** 2 * correction,
+                           histogram)
+
+    @property
+    def var(self):
+        return self.m2 / (self.count - 1)
+
+    @property
+    def total_var(self):
+        return self.total_m2 / (self.count - 1)
+
+    def total_ci_half_width(self, z=1.96):
+        """总伤害均值的置信区间半宽，默认 95%。"""
+        return z * np.sqrt(self.total_var / self.count)
+
+    def total_quantile(self, q):
+        """单场总伤害的分位数估计(来自直方图)。"""
+        return self.histogram.quantile(q)
+
+
+def batched(runs, batch_size=4096):
+    """把逐场产生的结果(如标量模拟函数的生成器)按批打包为数组，供 accumulate 使用。"""
+    runs = iter(runs)
+    while batch := list(itertools.islice(runs, batch_size)):
+        yield np.asarray(batch, dtype=np.float64)
+
+
+def accumulate(chunks, bin_width=DEFAULT_BIN_WIDTH):
+    """把逐块产生的样本折叠进一个 SampleStats，任何时刻只保留当前一块。"""
+    stats = None
+    for chunk in chunks:
+        chunk_stats = SampleStats.from_samples(chunk, bin_width)
+        stats = chunk_stats if stats is None else stats.merge(chunk_stats)
+    return stats
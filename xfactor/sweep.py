@@ -0,0 +1,240 @@
+"""
+参数扫描与灵敏度分析(公共随机数)
+
+在一组技能系数取值(网格或列表)上评估各配置的期望伤害。同一配置的所有取值点使用
+完全相同的随机数流(与 run_parallel 相同的 (配置内容, 分块序号) 派生方式)，即公共随机数：
+两点之差中由随机抽样带来的噪声大部分相互抵消，差值的方差通常比独立模拟小几个数量级。
+
+每个 (配置, 分块) 任务在一次调用中依次评估全部取值点，进程池的提交、序列化与
+随机数发生器初始化只做一次。系数通过临时修改模拟函数所在模块的全局变量生效，
+调用结束后恢复原值；由其他系数推导出的常量由 derive(namespace) 重新计算。
+
+只扫描影响后几回合的系数(每回合的系数增量、回合数等)时传入 resume_turn=k：每个分块先模拟
+一次并保存第 k 回合结束时的快照，各取值点从快照续跑，只重新模拟第 k 回合之后的部分，结果与
+逐点完整模拟逐位一致(见 xfactor.snapshots)。运行前先用一小批试算检查各取值点的前 k 回合
+确实相同(check_resume_turn)，k 取得太大时报错而不是给出错误的结果。
+
+    sweep(run_batch_simulation_wangyi, tasks, {'YZPM_DMG_BOOST_PER_STACK': [0.078, 0.09]},
+          n_samples=50000, seed=20250615, derive=update_derived_constants)
+"""
+
+import contextlib
+import inspect
+import itertools
+import numbers
+
+import numpy as np
+
+from .runner import DEFAULT_CHUNK_SIZE, chunk_rng, chunk_sizes, make_executor, resolve_seed, task_stream_id
+from .stats import DEFAULT_BIN_WIDTH, SampleStats
+
+
+def expand_grid(grid):
+    """{系数名: 取值列表} 展开为全部组合的列表 [{系数名: 取值}, ...]；已是列表时原样返回。"""
+    if isinstance(grid, dict):
+        names = list(grid)
+        return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+    return [dict(point) for point in grid]
+
+
+@contextlib.contextmanager
+def patched_constants(namespace, overrides, derive=None):
+    """临时把 namespace(模块全局变量)中的系数改为 overrides，退出时恢复。"""
+    for name in overrides:
+        if not isinstance(namespace.get(name), numbers.Number):
+            raise KeyError(f"未知的数值系数: {name}")
+    saved = {name: value for name, value in namespace.items() if isinstance(value, numbers.Number)}
+    try:
+        namespace.update(overrides)
+        if derive is not None:
+            derive(namespace)
+        yield namespace
+    finally:
+        namespace.update(saved)
+
+
+RESUME_PROBE_SAMPLES = 256
+
+
+def _prefix_snapshot(simulate, task, overrides, n, rng, resume_turn, derive):
+    """在取值点 overrides 下只模拟到第 resume_turn 回合，返回该回合结束时的快照。"""
+    namespace = inspect.unwrap(simulate).__globals__
+    prefix = {**overrides, '战斗回合数': resume_turn} if '战斗回合数' in namespace else overrides
+    with patched_constants(namespace, prefix, derive):
+        _, snapshots = simulate(*task, n=n, rng=rng, snapshot_turns=[resume_turn])
+    return snapshots[resume_turn]
+
+
+def _same_snapshot(a, b):
+    return a['rng'] == b['rng'] and a['state'].keys() == b['state'].keys() and all(
+        np.array_equal(a['state'][name], b['state'][name]) for name in a['state'])
+
+
+def check_resume_turn(simulate, tasks, points, resume_turn, seed=None, derive=None, n=RESUME_PROBE_SAMPLES):
+    """检查各取值点的前 resume_turn 回合与第一个取值点完全相同，否则报 ValueError。
+
+    每个配置用 n 场的试算批次在各取值点下模拟到第 resume_turn 回合，逐位比较快照中的全部状态
+    (已结算的伤害、层数等)与随机数发生器的位置。试算只能发现差异而不能证明相同，但前 k 回合
+    受影响的系数几乎总会改变这 n 场中的某个数值。
+    """
+    seed = resolve_seed(seed)
+    for task in tasks:
+        snapshots = [_prefix_snapshot(simulate, task, overrides, n, chunk_rng(seed, task_stream_id(task), 0),
+                                      resume_turn, derive) for overrides in points]
+        for overrides, snapshot in zip(points[1:], snapshots[1:]):
+            if not _same_snapshot(snapshots[0], snapshot):
+                raise ValueError(f"取值点 {overrides} 改变了前 {resume_turn} 回合的结果(配置 {task!r})，"
+                                 f"不能从第 {resume_turn} 回合续跑；请减小 resume_turn")
+
+
+def _run_points(simulate, task, points, contrasts, n, seed, chunk_index, derive, bin_width, resume_turn=None):
+    """在同一随机数流上依次评估全部取值点，返回各点与各对比差值的 SampleStats。"""
+    namespace = inspect.unwrap(simulate).__globals__
+    snapshot = None
+    if resume_turn is not None:
+        # 前 resume_turn 回合与取值点无关(已由 check_resume_turn 检查)，用第一个取值点模拟并保存快照
+        snapshot = _prefix_snapshot(simulate, task, points[0], n, chunk_rng(seed, task_stream_id(task), chunk_index),
+                                    resume_turn, derive)
+    samples = []
+    for overrides in points:
+        with patched_constants(namespace, overrides, derive):
+            if snapshot is None:
+                samples.append(simulate(*task, n=n, rng=chunk_rng(seed, task_stream_id(task), chunk_index)))
+            else:
+                samples.append(simulate(*task, n=n, rng=None, resume=snapshot))
+    point_stats = [SampleStats.from_samples(s, bin_width) for s in samples]
+    # 对比只看总伤害：改变回合数等系数时各点每场结果的列数可能不同
+    totals = [np.reshape(s, (n, -1)).sum(axis=1) for s in samples]
+    contrast_stats = [SampleStats.from_samples(totals[a] - totals[b], bin_width) for a, b in contrasts]
+    return point_stats, contrast_stats
+
+
+def run_points(simulate, tasks, points, n_samples, contrasts=(), seed=None, derive=None,
+               chunk_size=DEFAULT_CHUNK_SIZE, max_workers=None, bin_width=DEFAULT_BIN_WIDTH, resume_turn=None):
+    """对每个配置在每个取值点上各模拟 n_samples 次(公共随机数)。
+
+    contrasts 为 [(a, b), ...]，表示同时统计取值点 a 与 b 的逐场差值。返回
+    (points_stats, contrast_stats)，分别以 [配置][取值点] 和 [配置][对比] 索引。
+    resume_turn=k 时各取值点从第 k 回合结束时的快照续跑，要求各点的前 k 回合完全相同，
+    不满足时报 ValueError(见 check_resume_turn)。
+    """
+    seed = resolve_seed(seed)
+    points = [dict(point) for point in points]
+    contrasts = list(contrasts)
+    if resume_turn is not None:
+        check_resume_turn(simulate, tasks, points, resume_turn, seed, derive)
+    plan = [(i, j, n) for i in range(len(tasks)) for j, n in enumerate(chunk_sizes(n_samples, chunk_size))]
+    executor = make_executor(max_workers)
+    try:
+        if executor is None:
+            partials = {(i, j): _run_points(simulate, tasks[i], points, contrasts, n, seed, j, derive, bin_width,
+                                            resume_turn)
+                        for i, j, n in plan}
+        else:
+            futures = {(i, j): executor.submit(_run_points, simulate, tasks[i], points, contrasts, n, seed, j,
+                                               derive, bin_width, resume_turn)
+                       for i, j, n in plan}
+            partials = {key: future.result() for key, future in futures.items()}
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    point_stats, contrast_stats = [], []
+    for i in range(len(tasks)):
+        keys = sorted(key for key in partials if key[0] == i)
+        merged_points, merged_contrasts = partials[keys[0]]
+        for key in keys[1:]:
+            chunk_points, chunk_contrasts = partials[key]
+            merged_points = [a.merge(b) for a, b in zip(merged_points, chunk_points)]
+            merged_contrasts = [a.merge(b) for a, b in zip(merged_contrasts, chunk_contrasts)]
+        point_stats.append(merged_points)
+        contrast_stats.append(merged_contrasts)
+    return point_stats, contrast_stats
+
+
+def _variance_reduction(a, b, difference):
+    """独立抽样时差值的方差与公共随机数下差值方差之比；两点逐场结果完全相同时为 NaN。"""
+    if difference.total_var <= 0:
+        return np.nan
+    return (a.total_var + b.total_var) / difference.total_var
+
+
+def sweep(simulate, tasks, grid, n_samples, seed=None, labels=None, base=None, derive=None, z=1.96,
+          chunk_size=DEFAULT_CHUNK_SIZE, max_workers=None, resume_turn=None):
+    """在系数网格 grid 上评估每个配置的期望总伤害，返回整洁格式的 DataFrame。
+
+    grid 为 {系数名: 取值列表}(取全部组合)或 [{系数名: 取值}, ...]。base 为比较基准，
+    默认取模块中当前的系数值。每行对应一个 (配置, 取值点)，列为：
+    task、各扫描系数、mean、ci_half_width、delta(较基准的变化)、delta_ci_half_width、
+    variance_reduction(公共随机数使差值方差缩小的倍数) 以及 sensitivity
+    (只有一个系数不同于基准时的有限差分 delta / 系数变化量)。
+
+    扫描的系数只影响第 k 回合之后时，resume_turn=k 让各取值点从快照续跑，结果不变而耗时更少。
+    """
+    import pandas as pd
+
+    points = expand_grid(grid)
+    names = list(dict.fromkeys(name for point in points for name in point))
+    namespace = inspect.unwrap(simulate).__globals__
+    base = {name: namespace[name] for name in names} if base is None else {**{name: namespace[name] for name in names}, **base}
+    points = [{**base, **point} for point in points]
+    if base not in points:
+        points.insert(0, dict(base))
+    base_index = points.index(base)
+    labels = [repr(task) for task in tasks] if labels is None else list(labels)
+
+    point_stats, contrast_stats = run_points(simulate, tasks, points, n_samples,
+                                             contrasts=[(k, base_index) for k in range(len(points))],
+                                             seed=seed, derive=derive, chunk_size=chunk_size, max_workers=max_workers,
+                                             resume_turn=resume_turn)
+    rows = []
+    for label, stats, differences in zip(labels, point_stats, contrast_stats):
+        for k, point in enumerate(points):
+            changed = [name for name in names if point[name] != base[name]]
+            difference = differences[k]
+            row = {'task': label, **point,
+                   'mean': stats[k].total_mean, 'ci_half_width': stats[k].total_ci_half_width(z),
+                   'delta': difference.total_mean, 'delta_ci_half_width': difference.total_ci_half_width(z),
+                   'variance_reduction': _variance_reduction(stats[k], stats[base_index], difference) if changed else np.nan,
+                   'sensitivity': np.nan}
+            if len(changed) == 1:
+                row['sensitivity'] = difference.total_mean / (point[changed[0]] - base[changed[0]])
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def sensitivity(simulate, tasks, names, n_samples, seed=None, labels=None, rel_step=0.05, derive=None, z=1.96,
+                chunk_size=DEFAULT_CHUNK_SIZE, max_workers=None):
+    """各系数在当前取值处的中心差分灵敏度，返回整洁格式的 DataFrame。
+
+    浮点系数的步长为 rel_step × |取值|，整数系数(层数上限、阈值等)的步长为 1。每行对应
+    一个 (配置, 系数)，列为 task、constant、value、step、derivative(每单位系数的期望总伤害变化)、
+    derivative_ci_half_width、elasticity(系数变化 1% 时期望总伤害变化的百分比) 与 variance_reduction。
+    """
+    import pandas as pd
+
+    namespace = inspect.unwrap(simulate).__globals__
+    points, contrasts, steps = [{}], [], []
+    for name in names:
+        value = namespace[name]
+        step = 1 if isinstance(value, numbers.Integral) else rel_step * abs(value) or rel_step
+        points += [{name: value + step}, {name: value - step}]
+        contrasts.append((len(points) - 2, len(points) - 1))
+        steps.append(step)
+    labels = [repr(task) for task in tasks] if labels is None else list(labels)
+
+    point_stats, contrast_stats = run_points(simulate, tasks, points, n_samples, contrasts=contrasts, seed=seed,
+                                             derive=derive, chunk_size=chunk_size, max_workers=max_workers)
+    rows = []
+    for label, stats, differences in zip(labels, point_stats, contrast_stats):
+        for c, (name, step) in enumerate(zip(names, steps)):
+            difference = differences[c]
+            derivative = difference.total_mean / (2 * step)
+            rows.append({
+                'task': label, 'constant': name, 'value': namespace[name], 'step': step,
+                'derivative': derivative,
+                'derivative_ci_half_width': difference.total_ci_half_width(z) / (2 * step),
+                'elasticity': derivative * namespace[name] / stats[0].total_mean if stats[0].total_mean else np.nan,
+                'variance_reduction': _variance_reduction(stats[2 * c + 1], stats[2 * c + 2], difference),
+            })
+    return pd.DataFrame(rows)
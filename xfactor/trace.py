@@ -0,0 +1,158 @@
+"""
+事件计数与分阶段计时
+
+批量模拟函数接受 trace 参数(默认为 NULL_TRACE)，在已经算出的布尔掩码上调用
+trace.count(事件名, 掩码) 记录技能发动等事件的次数，用 with trace.phase(阶段名): 包住
+各攻击阶段。需要另行计算的计数(掩码的补集、位掩码的各位)交给 count_split 与 count_bits
+在 Trace 内部计算。NULL_TRACE 的方法什么都不做，模拟循环中没有任何 if 判断，关闭时不分配
+任何数组；Trace 则累计每个事件的发生次数(以及开启 timing 时各阶段的耗时)。
+
+run_traced 与 run_parallel 使用相同的分块与随机数流，在返回 SampleStats 的同时返回
+合并后的 Trace，因此计数与伤害结果来自同一批战斗：
+
+    results = run_traced(run_batch_simulation_wangyi, tasks, 100000, seed=20250615, timing=True)
+    print(trace_table([trace for _, trace in results], labels))
+"""
+
+import time
+
+import numpy as np
+
+from .runner import DEFAULT_CHUNK_SIZE, chunk_rng, chunk_sizes, make_executor, resolve_seed, task_stream_id
+from .stats import DEFAULT_BIN_WIDTH, SampleStats
+
+
+class _NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class NullTrace:
+    """关闭追踪时使用：count 与 phase 都不做任何事。"""
+
+    _phase = _NullPhase()
+
+    def count(self, event, mask):
+        pass
+
+    def count_split(self, event, complement, mask):
+        pass
+
+    def count_bits(self, events, bits):
+        pass
+
+    def phase(self, name):
+        return self._phase
+
+
+NULL_TRACE = NullTrace()
+
+
+class _Phase:
+    __slots__ = ('timings', 'name', 'start')
+
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timings[self.name] = self.timings.get(self.name, 0.0) + time.perf_counter() - self.start
+        return False
+
+
+class Trace:
+    """累计事件次数(counts)与各阶段耗时(timings，秒；阶段嵌套时各自计入全部耗时)。
+
+    runs 为计数所覆盖的战斗场数，per_battle 据此给出每场平均次数。
+    """
+
+    def __init__(self, timing=False, runs=0):
+        self.counts = {}
+        self.timings = {}
+        self.runs = runs
+        self.timing = timing
+
+    def count(self, event, mask):
+        """mask 为布尔掩码(或 0/1 数组)，累计其中为真的个数。"""
+        self.counts[event] = self.counts.get(event, 0) + int(np.count_nonzero(mask))
+
+    def count_split(self, event, complement, mask):
+        """mask 中为真的个数计入 event，为假的个数计入 complement。"""
+        hits = int(np.count_nonzero(mask))
+        self.counts[event] = self.counts.get(event, 0) + hits
+        self.counts[complement] = self.counts.get(complement, 0) + np.size(mask) - hits
+
+    def count_bits(self, events, bits):
+        """bits 为整数位掩码数组，第 k 位为 1 的个数计入 events[k]。"""
+        for k, event in enumerate(events):
+            self.count(event, (bits >> k) & 1)
+
+    def phase(self, name):
+        return _Phase(self.timings, name) if self.timing else NULL_TRACE.phase(name)
+
+    def merge(self, other):
+        merged = Trace(self.timing, runs=self.runs + other.runs)
+        for mine, theirs, target in ((self.counts, other.counts, merged.counts),
+                                     (self.timings, other.timings, merged.timings)):
+            target.update(mine)
+            for key, value in theirs.items():
+                target[key] = target.get(key, 0) + value
+        return merged
+
+    def per_battle(self):
+        """{事件名: 每场战斗的平均发生次数}。"""
+        return {event: count / self.runs for event, count in self.counts.items()} if self.runs else {}
+
+
+def _run_traced_chunk(simulate, task, n, seed, chunk_index, timing, bin_width):
+    trace = Trace(timing, runs=n * getattr(simulate, 'cost', 1))
+    samples = simulate(*task, n=n, rng=chunk_rng(seed, task_stream_id(task), chunk_index), trace=trace)
+    return SampleStats.from_samples(samples, bin_width), trace
+
+
+def run_traced(simulate, tasks, n_samples, seed=None, timing=False, chunk_size=DEFAULT_CHUNK_SIZE,
+               max_workers=None, bin_width=DEFAULT_BIN_WIDTH):
+    """与 run_parallel 相同，但另外收集事件计数，返回 [(SampleStats, Trace), ...]。
+
+    simulate 须接受 trace 关键字参数。同一种子下 SampleStats 与 run_parallel 的结果逐位一致。
+    timing 为 True 时另记录各阶段耗时(多进程时为各进程耗时之和)。
+    """
+    seed = resolve_seed(seed)
+    plan = [(i, j, n) for i in range(len(tasks)) for j, n in enumerate(chunk_sizes(n_samples, chunk_size))]
+    executor = make_executor(max_workers)
+    try:
+        if executor is None:
+            partials = {(i, j): _run_traced_chunk(simulate, tasks[i], n, seed, j, timing, bin_width)
+                        for i, j, n in plan}
+        else:
+            futures = {(i, j): executor.submit(_run_traced_chunk, simulate, tasks[i], n, seed, j, timing, bin_width)
+                       for i, j, n in plan}
+            partials = {key: future.result() for key, future in futures.items()}
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    results = []
+    for i in range(len(tasks)):
+        keys = sorted(key for key in partials if key[0] == i)
+        stats, trace = partials[keys[0]]
+        for key in keys[1:]:
+            stats, trace = stats.merge(partials[key][0]), trace.merge(partials[key][1])
+        results.append((stats, trace))
+    return results
+
+
+def trace_table(traces, labels=None, timings=False):
+    """每个配置一行、每个事件一列的每场平均次数 DataFrame；timings 为 True 时改为各阶段耗时(秒)。"""
+    import pandas as pd
+
+    labels = list(range(len(traces))) if labels is None else list(labels)
+    rows = [trace.timings if timings else trace.per_battle() for trace in traces]
+    return pd.DataFrame(rows, index=pd.Index(labels, name='task')).fillna(0.0)
@@ -1,139 +1,41 @@
-import random
 import pandas as pd
 import matplotlib.pyplot as plt
-import numpy as np
+
+from xfactor import compositions, race, run_adaptive, run_parallel, sweep, variance_reduction_report, with_variance_reduction
+from xfactor.cache import ResultCache, cached_run
+from xfactor.charts import render_charts
+from xfactor.cli import make_records, write_records
+from xfactor.distributions import DistributionStore, write_distributions
+from xfactor.models import wangyi
+from xfactor.models.wangyi import compute_expected_coeffs_wangyi, run_batch_simulation_wangyi, update_derived_constants
+from xfactor.trace import run_traced, trace_table
 
 # ==============================================================================
 # X-Factor Lab - 三国谋定天下王异技能分析工具
 # 使用蒙特卡洛方法模拟战斗，找出最优技能搭配
 # 版本: 2.0.0 (功能整合版)
+#
+# 本脚本负责输出表格与图表；技能系数、战斗回合数与模拟引擎在 xfactor/models/wangyi.py 中。
+# 只需要数值结果时可用命令行: xfactor simulate --hero wangyi --samples 1e6 --format json
 # ==============================================================================
 
 # ==============================================================================
 # 核心参数配置
 # ==============================================================================
 模拟次数 = 50000
-战斗回合数 = 4
-ENEMIES = 3
-
-# ==============================================================================
-# 技能与武将系数定义
-# ==============================================================================
-# 王异技能
-QCFY_PROB = 0.55; QCFY_DMG_COEFF_PER_TARGET = 1.00; QCFY_TARGETS = 2
-YZPM_DMG_BOOST_PER_STACK = 0.078; YZPM_MAX_STACKS = 5; YZPM_NA_PROC_PROB = 0.56
-MEHD_BASE_PROB = 0.75; MEHD_EXTRA_HIT_PROB = 0.50; MEHD_DMG_COEFF_T1 = 0.412; MEHD_DMG_COEFF_INCREASE_PER_TURN = 0.123
-PASSIVE1_NA_THRESHOLD1 = 2; PASSIVE1_NA_THRESHOLD2 = 4; PASSIVE1_PURSUIT_BOOST = 0.05
-PASSIVE2_PURSUIT_BOOST_DURATION = 4; PASSIVE2_PURSUIT_BOOST = 0.05
-# 辅助武将
-MATENG_DURATION = 3; MATENG_PURSUIT_DMG_BOOST = 0.30; MATENG_EXTRA_NA_PROB = 0.65
-ZHANGCH_XINJI_GAIN_PROB = 0.25; ZHANGCH_XINJI_DMG_BOOST_PER_STACK = 0.03; ZHANGCH_XINJI_MAX_STACKS = 10; ZHANGCH_XINJI_PURSUIT_LOCK_THRESHOLD = 6
-ZHENJI_LUOSHEN_DMG_BOOST = 0.25; ZHENJI_QIMOU_MULTIPLIER = 1.5
-PANGTONG_EFFECTIVE_DMG_MULTIPLIER = 1.42
-XUNYU_KANPO_MULTIPLIER = 1.15; XUNYU_QIMOU_CHANCE = 0.56; XUNYU_QIMOU_EFFECT_MULTIPLIER = 1.5
-XUNYU_AVG_QIMOU_MULTIPLIER = (1 - XUNYU_QIMOU_CHANCE) * 1.0 + XUNYU_QIMOU_CHANCE * XUNYU_QIMOU_EFFECT_MULTIPLIER
-XUNYU_EFFECTIVE_DMG_MULTIPLIER = XUNYU_KANPO_MULTIPLIER * XUNYU_AVG_QIMOU_MULTIPLIER
-
-# --- 辅助函数 ---
-def get_mehd_current_coeff(turn_idx):
-    return MEHD_DMG_COEFF_T1 + turn_idx * MEHD_DMG_COEFF_INCREASE_PER_TURN
-
-def get_wangyi_mehd_activation_rate_dynamic(cumulative_na_completed_before_this_na, current_turn_idx):
-    p1_bonus = 0.0
-    if cumulative_na_completed_before_this_na >= PASSIVE1_NA_THRESHOLD1: p1_bonus += PASSIVE1_PURSUIT_BOOST
-    if cumulative_na_completed_before_this_na >= PASSIVE1_NA_THRESHOLD2: p1_bonus += PASSIVE1_PURSUIT_BOOST
-    p2_bonus = PASSIVE2_PURSUIT_BOOST if current_turn_idx < PASSIVE2_PURSUIT_BOOST_DURATION else 0.0
-    return MEHD_BASE_PROB + p1_bonus + p2_bonus
-
-# ==============================================================================
-# 模拟核心函数 (战术执行层)
-# ==============================================================================
-def run_single_simulation_wangyi(support_config=None):
-    damage_coeffs_per_turn = [0.0] * 战斗回合数
-    wangyi_status = {'yzpm_stacks': 0, 'cumulative_na': 0, 'xinji_stacks': 0}
-
-    for current_turn_num in range(1, 战斗回合数 + 1):
-        turn_idx = current_turn_num - 1
-        yzpm_na_has_fired_this_turn = False
-        is_zhenji_active_this_turn = (support_config and support_config['name'] == 'ZhenJi')
-        zhenji_qimou_available_this_turn = is_zhenji_active_this_turn
-
-        def process_attack(attack_type):
-            nonlocal yzpm_na_has_fired_this_turn, zhenji_qimou_available_this_turn
-
-            wangyi_status['yzpm_stacks'] = min(YZPM_MAX_STACKS, wangyi_status['yzpm_stacks'] + 1)
-            wangyi_status['cumulative_na'] += 1
-            if support_config and support_config['name'] == 'ZhangChunhua':
-                if random.random() < ZHANGCH_XINJI_GAIN_PROB:
-                    wangyi_status['xinji_stacks'] = min(ZHANGCH_XINJI_MAX_STACKS, wangyi_status['xinji_stacks'] + 1)
-            
-            current_yzpm_boost = (1 + wangyi_status['yzpm_stacks'] * YZPM_DMG_BOOST_PER_STACK)
-            current_xinji_boost = (1 + wangyi_status['xinji_stacks'] * ZHANGCH_XINJI_DMG_BOOST_PER_STACK) if support_config and support_config['name'] == 'ZhangChunhua' else 1.0
-
-            strategic_damage_dealt = False
-            
-            if random.random() < QCFY_PROB:
-                strategic_damage_dealt = True
-                damage_coeff = (QCFY_DMG_COEFF_PER_TARGET * QCFY_TARGETS) * current_yzpm_boost * current_xinji_boost
-                if is_zhenji_active_this_turn:
-                    damage_coeff *= (1 + ZHENJI_LUOSHEN_DMG_BOOST)
-                    if zhenji_qimou_available_this_turn:
-                        damage_coeff *= ZHENJI_QIMOU_MULTIPLIER; zhenji_qimou_available_this_turn = False
-                damage_coeffs_per_turn[turn_idx] += damage_coeff
-
-            if attack_type != 'zch_dud_na':
-                mehd_rate = get_wangyi_mehd_activation_rate_dynamic(wangyi_status['cumulative_na'] - 1, turn_idx)
-                if random.random() < mehd_rate:
-                    strategic_damage_dealt = True
-                    num_mehd_hits = 1 + (1 if random.random() < MEHD_EXTRA_HIT_PROB else 0)
-                    for _ in range(num_mehd_hits):
-                        mehd_coeff = get_mehd_current_coeff(turn_idx)
-                        base_skill_coeff = (mehd_coeff * ENEMIES) * current_yzpm_boost * current_xinji_boost
-                        if support_config and support_config['name'] == 'MaTeng' and current_turn_num <= MATENG_DURATION:
-                            base_skill_coeff *= (1 + MATENG_PURSUIT_DMG_BOOST)
-                        if is_zhenji_active_this_turn:
-                            base_skill_coeff *= (1 + ZHENJI_LUOSHEN_DMG_BOOST)
-                            if zhenji_qimou_available_this_turn:
-                                base_skill_coeff *= ZHENJI_QIMOU_MULTIPLIER; zhenji_qimou_available_this_turn = False
-                        damage_coeffs_per_turn[turn_idx] += base_skill_coeff
-                        
-                        if random.random() < QCFY_PROB:
-                            qcfy_from_mehd_coeff = (QCFY_DMG_COEFF_PER_TARGET * QCFY_TARGETS) * current_yzpm_boost * current_xinji_boost
-                            if is_zhenji_active_this_turn:
-                                qcfy_from_mehd_coeff *= (1 + ZHENJI_LUOSHEN_DMG_BOOST)
-                                if zhenji_qimou_available_this_turn:
-                                    qcfy_from_mehd_coeff *= ZHENJI_QIMOU_MULTIPLIER; zhenji_qimou_available_this_turn = False
-                            damage_coeffs_per_turn[turn_idx] += qcfy_from_mehd_coeff
-            
-            yzpm_trigger_opportunity = (strategic_damage_dealt or (support_config and support_config['name'] == 'ZhangChunhua'))
-            if yzpm_trigger_opportunity and not yzpm_na_has_fired_this_turn:
-                if random.random() < YZPM_NA_PROC_PROB:
-                    yzpm_na_has_fired_this_turn = True
-                    main_attack_list.append("yzpm_na")
-
-        main_attack_list = ["base_na_1", "base_na_2_combo"]
-        i = 0
-        while i < len(main_attack_list):
-            process_attack(main_attack_list[i])
-            i += 1
-        
-        additional_attack_list = []
-        if support_config:
-            if support_config['name'] == 'MaTeng' and current_turn_num <= MATENG_DURATION and random.random() < MATENG_EXTRA_NA_PROB:
-                additional_attack_list.append("mateng_na")
-            if support_config['name'] == 'ZhangChunhua':
-                additional_attack_list.append("zch_dud_na" if wangyi_status['xinji_stacks'] < ZHANGCH_XINJI_PURSUIT_LOCK_THRESHOLD else "zch_na")
-        
-        for attack in additional_attack_list:
-            process_attack(attack)
-
-    if support_config:
-        if support_config['name'] == 'PangTong':
-            damage_coeffs_per_turn = [d * PANGTONG_EFFECTIVE_DMG_MULTIPLIER for d in damage_coeffs_per_turn]
-        if support_config['name'] == 'XunYu':
-            damage_coeffs_per_turn = [d * XUNYU_EFFECTIVE_DMG_MULTIPLIER for d in damage_coeffs_per_turn]
-            
-    return damage_coeffs_per_turn
+随机种子 = 20250615      # 主种子：相同种子在任意进程数下结果逐位一致
+并行进程数 = None        # None 表示使用全部 CPU 核心
+目标相对误差 = None      # 设为如 0.002 时启用自适应模式：95%置信区间半宽 <= 0.2% 即停止
+最大模拟次数 = 2000000   # 自适应模式下每个配置的样本数上限
+使用结果缓存 = True      # 系数、配置、样本数与种子都未改变时直接读取上次结果 (python -m xfactor.cache invalidate 清除)
+方差缩减 = None          # 'antithetic'(对偶变量)、'control'(控制变量) 或 'antithetic+control'：相同精度所需模拟次数大幅减少
+参数扫描 = None          # 例如 {'YZPM_DMG_BOOST_PER_STACK': [0.078, 0.09]}：以公共随机数评估各配置在这些系数取值下的期望伤害
+事件追踪 = False         # True 时另行统计每场平均的技能发动、额外普攻、哑火等事件次数与各攻击阶段耗时
+阵容搜索 = None          # 例如 3：在至多 3 名辅助的全部组合中逐轮淘汰明显较差的阵容，输出期望伤害前 5 名
+伤害分布目录 = None      # 例如 'wangyi_dist'：另把每场每回合伤害写入该目录，输出前3回合累计伤害的分位数与分布函数图
+结果文件 = 'wangyi_results.json'  # 图表由该结果文件渲染
+图表格式 = 'png'         # 'png' 或 'svg'
+图表分辨率 = 120         # dpi
 
 # ==============================================================================
 # 主程序入口 (战略规划层)
@@ -151,22 +53,27 @@ if __name__ == '__main__':
             pass # 修正：移除打印语句，保持静默
 
     # --- 2. 运行模拟 ---
-    support_list = [
-        {'name': '王异 (单独)', 'config': None},
-        {'name': '王异 + 马腾', 'config': {'name': 'MaTeng'}},
-        {'name': '王异 + 张春华', 'config': {'name': 'ZhangChunhua'}},
-        {'name': '王异 + 甄姬', 'config': {'name': 'ZhenJi'}},
-        {'name': '王异 + 庞统', 'config': {'name': 'PangTong'}},
-        {'name': '王异 + 荀彧', 'config': {'name': 'XunYu'}}
-    ]
+    support_list = [{'name': name, 'config': config} for name, config in wangyi.SUPPORTS]
     support_name_map = {item['name']: item['name'] for item in support_list}
     
     results_data = {}
-    print(f"分析开始，将对每个配置运行 {模拟次数} 次模拟...")
-    for support in support_list:
-        all_sim_runs = [run_single_simulation_wangyi(support['config']) for _ in range(模拟次数)]
-        avg_per_turn_coeffs = np.mean(all_sim_runs, axis=0)
-        results_data[support['name']] = avg_per_turn_coeffs
+    sim_tasks = [(support['config'],) for support in support_list]
+    result_cache = ResultCache() if 使用结果缓存 else None
+    batch_simulate = with_variance_reduction(run_batch_simulation_wangyi, 方差缩减)
+    if 方差缩减:
+        print(f"方差缩减模式: {方差缩减} (每个样本耗费 {batch_simulate.cost} 场模拟)")
+    if 目标相对误差 is None:
+        print(f"分析开始，将对每个配置运行 {模拟次数} 次模拟...")
+        all_sim_stats = cached_run(result_cache, vars(wangyi), run_parallel, batch_simulate, sim_tasks,
+                                   n_samples=模拟次数, seed=随机种子, max_workers=并行进程数)
+    else:
+        print(f"分析开始(自适应模式)，每个配置模拟至95%置信区间半宽 <= {目标相对误差:.2%} 或 {最大模拟次数} 次...")
+        all_sim_stats = cached_run(result_cache, vars(wangyi), run_adaptive, batch_simulate, sim_tasks,
+                                   rel_tol=目标相对误差, seed=随机种子, max_samples=最大模拟次数, max_workers=并行进程数)
+    sim_stats_by_name = {}
+    for support, sim_stats in zip(support_list, all_sim_stats):
+        results_data[support['name']] = sim_stats.mean
+        sim_stats_by_name[support['name']] = sim_stats
     print("\n模拟完成。")
 
     # --- 3. 数据处理与日志打印 ---
@@ -175,7 +82,11 @@ if __name__ == '__main__':
         total_coeff = sum(per_turn_coeffs)
         df_results_list.append({
             '配置': support_name,
-            '4回合期望总伤害系数': total_coeff * 100 # 修正: 乘以100转换为数值
+            '4回合期望总伤害系数': total_coeff * 100, # 修正: 乘以100转换为数值
+            '95%置信区间半宽': sim_stats_by_name[support_name].total_ci_half_width() * 100,
+            '模拟次数': sim_stats_by_name[support_name].count,
+            '单场P5': sim_stats_by_name[support_name].total_quantile(0.05) * 100,
+            '单场P95': sim_stats_by_name[support_name].total_quantile(0.95) * 100,
         })
     df_results = pd.DataFrame(df_results_list)
     
@@ -189,90 +100,83 @@ if __name__ == '__main__':
     df_display = df_results.copy()
     df_display['4回合期望总伤害系数'] = df_display['4回合期望总伤害系数'].apply(lambda x: f"{x:,.2f}%")
     df_display['较单独提升百分比'] = df_display['较单独提升百分比'].apply(lambda x: f"{x:,.2f}%")
+    df_display['95%置信区间半宽'] = df_display['95%置信区间半宽'].apply(lambda x: f"±{x:,.2f}%")
+    df_display['单场5%~95%分位'] = [f"{p5:,.0f}%~{p95:,.0f}%" for p5, p95 in zip(df_display['单场P5'], df_display['单场P95'])]
+    df_display = df_display[['配置', '4回合期望总伤害系数', '95%置信区间半宽', '较单独提升百分比', '单场5%~95%分位', '模拟次数']]
     
     print("\n--- 王异不同辅助下4回合期望总伤害系数对比 ---")
     print(df_display.to_string(index=False)) # 保留精髓：在CMD里显示日志结果
 
-    # --- 4. 数据准备 (用于绘图) ---
-    df_plot_source = pd.DataFrame(results_data).rename(columns=support_name_map)
-    df_cumulative = pd.DataFrame({
-        support_name_map.get(key): {
-            "前3回合累计": sum(val[:3]) * 100,
-            "前4回合累计": sum(val) * 100
-        } for key, val in results_data.items()
-    }).T
-    df_plot_sorted = df_cumulative.sort_values(by="前4回合累计", ascending=False)
-    df_boost_plot = df_plot_sorted[df_plot_sorted.index != '王异 (单独)'].copy()
-    df_boost_plot['提升百分比 (%)'] = ((df_boost_plot['前4回合累计'] / baseline_coeff) - 1) * 100
-
-    # --- 5. 绘制并保存所有图表 ---
-    # 图表A: 前3回合累计期望伤害条形图
-    print("\n正在生成【前3回合】累计伤害图...")
-    plt.figure(figsize=(16, 10))
-    ax1 = df_plot_sorted["前3回合累计"].plot(kind='bar', color='skyblue', edgecolor='black', zorder=2)
-    ax1.set_title('不同辅助下王异【前3回合】累计期望伤害系数', fontsize=24, fontweight='bold', pad=20)
-    ax1.set_ylabel('期望伤害系数 (%)', fontsize=18, fontweight='bold')
-    ax1.set_xlabel('')
-    ax1.tick_params(axis='y', labelsize=14)
-    ax1.set_xticklabels(ax1.get_xticklabels(), rotation=0, ha="center", fontsize=30, fontweight='bold')
-    ax1.grid(True, linestyle='--', alpha=0.7, axis='y')
-    for p in ax1.patches:
-        ax1.annotate(f"{p.get_height():.0f}%", (p.get_x() + p.get_width() / 2., p.get_height()), ha='center', va='center', xytext=(0, 10), textcoords='offset points', fontsize=14, fontweight='bold')
-    plt.tight_layout()
-    plt.savefig("damage_cumulative_3_turns_separate.png", dpi=120)
-    plt.close()
-    print("图表已保存为 damage_cumulative_3_turns_separate.png")
-
-    # 图表B: 前4回合累计期望伤害条形图
-    print("\n正在生成【前4回合】累计伤害图...")
-    plt.figure(figsize=(16, 10))
-    ax2 = df_plot_sorted["前4回合累计"].plot(kind='bar', color='lightcoral', edgecolor='black', zorder=2)
-    ax2.set_title('不同辅助下王异【前4回合】累计期望伤害系数', fontsize=24, fontweight='bold', pad=20)
-    ax2.set_ylabel('期望伤害系数 (%)', fontsize=18, fontweight='bold')
-    ax2.set_xlabel('')
-    ax2.tick_params(axis='y', labelsize=14)
-    ax2.set_xticklabels(ax2.get_xticklabels(), rotation=0, ha="center", fontsize=30, fontweight='bold')
-    ax2.grid(True, linestyle='--', alpha=0.7, axis='y')
-    for p in ax2.patches:
-        ax2.annotate(f"{p.get_height():.0f}%", (p.get_x() + p.get_width() / 2., p.get_height()), ha='center', va='center', xytext=(0, 10), textcoords='offset points', fontsize=14, fontweight='bold')
-    plt.tight_layout()
-    plt.savefig("damage_cumulative_4_turns_separate.png", dpi=120)
-    plt.close()
-    print("图表已保存为 damage_cumulative_4_turns_separate.png")
-
-    # 图表C: 各辅助对王异4回合总伤害提升百分比
-    print("\n正在生成【伤害提升百分比】对比图...")
-    plt.figure(figsize=(16, 10))
-    ax3 = df_boost_plot['提升百分比 (%)'].plot(kind='bar', color='mediumseagreen', edgecolor='black', zorder=2)
-    ax3.set_title('各辅助对王异4回合总伤害提升对比', fontsize=24, fontweight='bold', pad=20)
-    ax3.set_ylabel('伤害提升百分比 (%)', fontsize=18, fontweight='bold')
-    ax3.set_xlabel('')
-    ax3.tick_params(axis='y', labelsize=14)
-    ax3.set_xticklabels(ax3.get_xticklabels(), rotation=0, ha="center", fontsize=30, fontweight='bold')
-    ax3.grid(True, linestyle='--', alpha=0.7, axis='y')
-    for p in ax3.patches:
-        ax3.annotate(f"{p.get_height():.2f}%", (p.get_x() + p.get_width() / 2., p.get_height()), ha='center', va='center', xytext=(0, 10), textcoords='offset points', fontsize=14, fontweight='bold')
-    plt.tight_layout()
-    plt.savefig("support_boost_percentage.png", dpi=120)
-    plt.close()
-    print("图表已保存为 support_boost_percentage.png")
-
-    # 图表D: 每回合伤害趋势折线图
-    print("\n正在生成【每回合伤害趋势】折线图...")
-    df_per_turn_cn = df_plot_source.rename(columns=support_name_map)
-    df_per_turn_cn.index = [f'第{i+1}回合' for i in range(df_per_turn_cn.shape[0])]
-    plt.figure(figsize=(14, 8))
-    for support_key_cn in df_per_turn_cn.columns:
-        # 修正: 将系数乘以100以显示为百分比
-        plt.plot(df_per_turn_cn.index, df_per_turn_cn[support_key_cn] * 100, marker='o', linestyle='-', linewidth=2, label=support_key_cn)
-    plt.title('不同辅助下王异「每回合」期望伤害系数趋势', fontsize=16, fontweight='bold')
-    plt.xlabel('回合数', fontsize=12)
-    plt.ylabel('期望伤害系数 (%)', fontsize=12)
-    plt.legend(title='配置')
-    plt.grid(True, linestyle='--', alpha=0.7)
-    plt.tight_layout()
-    plt.savefig("damage_trend_per_turn_lineplot.png", dpi=120)
-    plt.close()
-    print("每回合伤害趋势折线图已保存为 damage_trend_per_turn_lineplot.png。")
+    # 精确期望(马尔可夫链)作为蒙特卡洛结果的校验基准
+    df_exact_list = []
+    for support in support_list:
+        exact_total = compute_expected_coeffs_wangyi(support['config']).sum()
+        sim_stats = sim_stats_by_name[support['name']]
+        df_exact_list.append({
+            '配置': support['name'],
+            '精确期望总伤害系数': exact_total * 100,
+            '模拟结果': sim_stats.total_mean * 100,
+            '偏差/95%置信区间半宽': (sim_stats.total_mean - exact_total) / sim_stats.total_ci_half_width(),
+        })
+    df_exact = pd.DataFrame(df_exact_list)
+    print("\n--- 蒙特卡洛结果与精确期望对比 (偏差绝对值应基本小于1) ---")
+    print(df_exact.round(2).to_string(index=False))
+
+    if 方差缩减:
+        pilot_samples = min(模拟次数, 20000)
+        df_gain = variance_reduction_report(run_batch_simulation_wangyi, sim_tasks, pilot_samples, seed=随机种子,
+                                            labels=[support['name'] for support in support_list], max_workers=并行进程数)
+        print(f"\n--- 各方差缩减模式的有效样本量提升倍数 (试算 {pilot_samples} 场) ---")
+        print(df_gain.rename(columns={'task': '配置'})[['配置'] + [c for c in df_gain.columns if c.endswith('_gain')]]
+              .round(2).to_string(index=False))
+
+    if 事件追踪:
+        trace_samples = min(模拟次数, 20000)
+        traces = [trace for _, trace in run_traced(run_batch_simulation_wangyi, sim_tasks, trace_samples, seed=随机种子,
+                                                   timing=True, max_workers=并行进程数)]
+        trace_labels = [support['name'] for support in support_list]
+        print(f"\n--- 每场平均事件次数 (追踪 {trace_samples} 场) ---")
+        print(trace_table(traces, trace_labels).rename_axis('配置').round(3).to_string())
+        print("\n--- 各攻击阶段耗时 (秒) ---")
+        print(trace_table(traces, trace_labels, timings=True).rename_axis('配置').round(3).to_string())
+
+    if 阵容搜索:
+        candidates = compositions(wangyi, max_supports=阵容搜索)
+        print(f"\n正在搜索 {len(candidates)} 个阵容 (至多 {阵容搜索} 名辅助) ...")
+        df_race = pd.DataFrame(race(batch_simulate, candidates, top_k=5, seed=随机种子, max_workers=并行进程数))
+        df_race[['mean', 'ci_low', 'ci_high']] *= 100
+        print(f"\n--- 阵容搜索前 5 名 (共模拟 {df_race['battles'].sum():,} 场；期望总伤害系数 %，95%置信区间) ---")
+        print(df_race[df_race['top_k']].rename(columns={'task': '阵容'})[['阵容', 'mean', 'ci_low', 'ci_high', 'samples']]
+              .round(2).to_string(index=False))
+
+    if 伤害分布目录:
+        dist_labels = [support['name'] for support in support_list]
+        write_distributions(run_batch_simulation_wangyi, sim_tasks, 模拟次数, 伤害分布目录, seed=随机种子,
+                            labels=dist_labels, max_workers=并行进程数)
+        store = DistributionStore(伤害分布目录)
+        df_dist = pd.DataFrame(store.summary(dist_labels, turn=3)).rename(columns={'task': '配置'})
+        df_dist[['mean', 'p5', 'p50', 'p95']] *= 100
+        print(f"\n--- 前3回合累计伤害系数分布 (%；每场每回合结果已写入 {伤害分布目录}) ---")
+        print(df_dist.round(2).to_string(index=False))
+        ax = store.plot_cdf(dist_labels, turn=3)
+        ax.figure.savefig("damage_cdf_3_turns.png", dpi=120)
+        plt.close(ax.figure)
+
+    if 参数扫描:
+        print(f"\n正在进行参数扫描 {参数扫描} ...")
+        df_sweep = sweep(batch_simulate, sim_tasks, 参数扫描, n_samples=模拟次数, seed=随机种子,
+                         labels=[support['name'] for support in support_list], derive=update_derived_constants,
+                         max_workers=并行进程数)
+        print("\n--- 参数扫描 (公共随机数；delta 为较当前系数的变化，sensitivity 为有限差分灵敏度) ---")
+        print(df_sweep.rename(columns={'task': '配置'}).round(4).to_string(index=False))
+
+    # --- 4. 保存结果并渲染图表 ---
+    # 图表在进程池中并行渲染；结果与样式都未变的图表直接跳过(也可单独运行 xfactor render wangyi_results.json)
+    records = make_records('wangyi', [(support['name'], task) for support, task in zip(support_list, sim_tasks)],
+                           all_sim_stats, getattr(batch_simulate, 'cost', 1))
+    write_records(records, {'hero': 'wangyi', 'seed': 随机种子, 'samples': 模拟次数}, 'json', 结果文件)
+    print(f"\n结果已保存为 {结果文件}，正在生成图表...")
+    for chart in render_charts([结果文件], fmt=图表格式, dpi=图表分辨率, max_workers=并行进程数):
+        print(f"图表已保存为 {chart['chart']}" if chart['rendered'] else f"{chart['chart']} 未变化，跳过")
 
     print("\n所有分析和绘图任务已成功完成。")
\ No newline at end of file
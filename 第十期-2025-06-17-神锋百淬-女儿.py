@@ -1,13 +1,22 @@
-import random
 import pandas as pd
 import matplotlib.pyplot as plt
-import numpy as np
 
+from xfactor import compositions, race, run_adaptive, run_parallel, sweep, variance_reduction_report, with_variance_reduction
+from xfactor.cache import ResultCache, cached_run
+from xfactor.charts import render_charts
+from xfactor.cli import make_records, write_records
+from xfactor.distributions import DistributionStore, write_distributions
+from xfactor.models import nver
+from xfactor.models.nver import run_batch_simulation, run_batch_simulation_per_turn
+from xfactor.trace import run_traced, trace_table
 
 # ==============================================================================
 # X-Factor Lab - 三国谋定天下女儿技能分析工具
 # 使用蒙特卡洛方法模拟战斗，找出最优技能搭配
 # GitHub: https://github.com/DanielZenFlow/X-Factor-Lab-SGMDTX
+#
+# 本脚本负责输出表格与图表；技能系数、战斗回合数与模拟引擎在 xfactor/models/nver.py 中。
+# 只需要数值结果时可用命令行: xfactor simulate --hero nver --samples 1e6 --format json
 # ==============================================================================
 
 """
@@ -29,152 +38,19 @@ Licensed under MIT License - see LICENSE file for details
 # 核心参数配置 (用户可修改)
 # ==============================================================================
 模拟次数 = 50000
-战斗回合数 = 5
-
-# ==============================================================================
-# 技能系数定义
-# ==============================================================================
-武女传_增伤 = 0.05
-突战_追击增伤 = 0.07
-疾战_追击增伤 = 0.09
-神锋_基础发动率, 神锋_自带发动率加成, 神锋_伤害系数 = 0.70, 0.06, 0.80
-运智_每层谋略增伤, 运智_额外普攻发动率 = 0.078, 0.56
-谋而后动_基础发动率, 谋而后动_基础伤害系数, 谋而后动_额外发动率, 谋而后动_每回合伤害提升 = 0.75, 0.412, 0.50, 0.123
-铁骑_基础发动率, 铁骑_基础伤害系数, 铁骑_发动后奇谋提升, 铁骑_每回合伤害衰减 = 0.40, 4.00, 0.20, 1.00
-智破千军_发动率, 智破千军_伤害系数, 智破千军_增伤概率, 智破千军_增伤幅度 = 0.50, 1.80, 0.40, 0.20
-张春华_单次伤害系数, 张春华_心计获得概率, 张春华_每层心计增伤 = 0.721, 0.25, 0.0309
-马腾_追击增伤, 马腾_额外普攻发动率 = 0.30, 0.65
-甄姬_增伤 = 0.25
-庞统_传递增伤 = 0.42
-荀彧_奇谋率提升, 荀彧_看破增伤 = 0.56, 0.15
-荀彧_新增被动奇谋率, 荀彧_新增被动奇谋伤害 = 0.06, 0.10
-
-# ==============================================================================
-# 模拟核心函数
-# ==============================================================================
-def run_single_simulation(build_配置, support_配置=None):
-    总伤害 = 0.0
-    女儿状态 = {
-        '连击率': 1.0, '追击伤害加成': 突战_追击增伤 + 疾战_追击增伤,
-        '总伤害乘数': 1.0 + 武女传_增伤, '奇谋率': 0.0,
-        '奇谋伤害加成': 0.5, '运智铺谋层数': 0,
-    }
-    整备状态池 = list(range(1, 9)); random.shuffle(整备状态池)
-    已获得整备 = set()
-    张春华心计层数 = 0
-
-    if support_配置:
-        if support_配置['name'] == 'PangTong': 女儿状态['总伤害乘数'] += 庞统_传递增伤
-        if support_配置['name'] == 'XunYu':
-            女儿状态['奇谋率'] += 荀彧_奇谋率提升 + 荀彧_新增被动奇谋率
-            女儿状态['总伤害乘数'] += 荀彧_看破增伤
-            女儿状态['奇谋伤害加成'] += 荀彧_新增被动奇谋伤害
-
-    for r in range(1, 战斗回合数 + 1):
-        本回合运智额外普攻已触发 = False
-        本回合甄姬增伤 = 0
-        本回合甄姬必定奇谋可用 = False
-        if support_配置 and support_配置['name'] == 'ZhenJi':
-            本回合甄姬增伤 = 甄姬_增伤; 本回合甄姬必定奇谋可用 = True
-
-        普攻列表 = ["普攻1", "普攻2"]
-        def process_attack(attack_type):
-            nonlocal 总伤害, 本回合运智额外普攻已触发, 本回合甄姬必定奇谋可用, 已获得整备, 张春华心计层数
-            女儿状态['运智铺谋层数'] += 1
-            if support_配置 and support_配置['name'] == 'ZhangChunhua':
-                当前张春华伤害 = 张春华_单次伤害系数 * (1 + 张春华心计层数 * 张春华_每层心计增伤)
-                总伤害 += 当前张春华伤害
-                if random.random() < 张春华_心计获得概率 and 张春华心计层数 < 10:
-                    张春华心计层数 += 1
-
-            if attack_type != '张春华哑火普攻':
-                本次攻击造成了谋略伤害 = False
-                神锋当前发动率 = 神锋_基础发动率 + 神锋_自带发动率加成
-                if 5 in 已获得整备: 神锋当前发动率 += 0.10
-                if random.random() < 神锋当前发动率:
-                    本次攻击造成了谋略伤害 = True
-                    追击增伤 = 女儿状态['追击伤害加成']
-                    if support_配置 and support_配置['name'] == 'MaTeng' and r <= 3: 追击增伤 += 马腾_追击增伤
-                    if 4 in 已获得整备: 追击增伤 += 0.20
-                    伤害 = (神锋_伤害系数 * 2) * (1 + 追击增伤) * (1 + 本回合甄姬增伤)
-                    奇谋伤害加成 = 女儿状态['奇谋伤害加成']
-                    if 7 in 已获得整备: 奇谋伤害加成 += 0.20
-                    if 本回合甄姬必定奇谋可用:
-                        伤害 *= (1 + 奇谋伤害加成); 本回合甄姬必定奇谋可用 = False
-                    elif random.random() < 女儿状态['奇谋率']:
-                        伤害 *= (1 + 奇谋伤害加成)
-                    总伤害 += 伤害
-                    if 整备状态池:
-                        新整备 = 整备状态池.pop(0); 已获得整备.add(新整备)
-                        if 新整备 == 2: 女儿状态['奇谋率'] += 0.20
-                if build_配置['skill2'] == 'MouErHouDong' and random.random() < 谋而后动_基础发动率:
-                    本次攻击造成了谋略伤害 = True
-                    for _ in range(1 + (1 if random.random() < 谋而后动_额外发动率 else 0)):
-                        谋系数 = 谋而后动_基础伤害系数 + (r - 1) * 谋而后动_每回合伤害提升
-                        追击增伤 = 女儿状态['追击伤害加成']
-                        if support_配置 and support_配置['name'] == 'MaTeng' and r <= 3: 追击增伤 += 马腾_追击增伤
-                        if 4 in 已获得整备: 追击增伤 += 0.20
-                        伤害 = (谋系数 * 3) * (1 + 追击增伤) * (1 + 本回合甄姬增伤)
-                        奇谋伤害加成 = 女儿状态['奇谋伤害加成']
-                        if 7 in 已获得整备: 奇谋伤害加成 += 0.20
-                        if 本回合甄姬必定奇谋可用:
-                            伤害 *= (1 + 奇谋伤害加成); 本回合甄姬必定奇谋可用 = False
-                        elif random.random() < 女儿状态['奇谋率']:
-                            伤害 *= (1 + 奇谋伤害加成)
-                        总伤害 += 伤害
-                if build_配置['skill2'] == 'Tieqi' and random.random() < 铁骑_基础发动率:
-                    本次攻击造成了谋略伤害 = True
-                    铁骑系数 = 铁骑_基础伤害系数 - (r - 1) * 铁骑_每回合伤害衰减
-                    追击增伤 = 女儿状态['追击伤害加成']
-                    if support_配置 and support_配置['name'] == 'MaTeng' and r <= 3: 追击增伤 += 马腾_追击增伤
-                    if 4 in 已获得整备: 追击增伤 += 0.20
-                    伤害 = 铁骑系数 * (1 + 追击增伤) * (1 + 本回合甄姬增伤)
-                    奇谋伤害加成 = 女儿状态['奇谋伤害加成']
-                    if 7 in 已获得整备: 奇谋伤害加成 += 0.20
-                    当前奇谋率 = 女儿状态['奇谋率'] + 铁骑_发动后奇谋提升
-                    if 本回合甄姬必定奇谋可用:
-                        伤害 *= (1 + 奇谋伤害加成); 本回合甄姬必定奇谋可用 = False
-                    elif random.random() < 当前奇谋率:
-                        伤害 *= (1 + 奇谋伤害加成)
-                    总伤害 += 伤害
-                if build_配置['skill2'] == 'ZhiPoQianJun' and random.random() < 智破千军_发动率:
-                    本次攻击造成了谋略伤害 = True
-                    for _ in range(2):
-                        单次伤害 = 智破千军_伤害系数
-                        if random.random() < 智破千军_增伤概率:
-                            单次伤害 *= (1 + 智破千军_增伤幅度)
-                        追击增伤 = 女儿状态['追击伤害加成']
-                        if support_配置 and support_配置['name'] == 'MaTeng' and r <= 3: 追击增伤 += 马腾_追击增伤
-                        if 4 in 已获得整备: 追击增伤 += 0.20
-                        伤害 = 单次伤害 * (1 + 追击增伤) * (1 + 本回合甄姬增伤)
-                        奇谋伤害加成 = 女儿状态['奇谋伤害加成']
-                        if 7 in 已获得整备: 奇谋伤害加成 += 0.20
-                        if 本回合甄姬必定奇谋可用:
-                            伤害 *= (1 + 奇谋伤害加成); 本回合甄姬必定奇谋可用 = False
-                        elif random.random() < 女儿状态['奇谋率']:
-                            伤害 *= (1 + 奇谋伤害加成)
-                        总伤害 += 伤害
-                if 本次攻击造成了谋略伤害 and not 本回合运智额外普攻已触发:
-                    if random.random() < 运智_额外普攻发动率:
-                        本回合运智额外普攻已触发 = True
-                        普攻列表.append("运智普攻")
-        i = 0
-        while i < len(普攻列表):
-            process_attack(普攻列表[i]); i += 1
-        普攻列表_追加阶段 = []
-        if support_配置:
-            if support_配置['name'] == 'MaTeng' and r <= 3 and random.random() < 马腾_额外普攻发动率:
-                普攻列表_追加阶段.append("马腾普攻")
-            if support_配置['name'] == 'ZhangChunhua':
-                if 张春华心计层数 < 6:
-                    普攻列表_追加阶段.append("张春华哑火普攻")
-                else:
-                    普攻列表_追加阶段.append("张春华正常普攻")
-        for attack_type in 普攻列表_追加阶段:
-            process_attack(attack_type)
-    最终伤害 = 总伤害 * (1 + 女儿状态['运智铺谋层数'] * 运智_每层谋略增伤)
-    最终伤害 *= 女儿状态['总伤害乘数']
-    return 最终伤害
+随机种子 = 20250617      # 主种子：相同种子在任意进程数下结果逐位一致
+并行进程数 = None        # None 表示使用全部 CPU 核心
+目标相对误差 = None      # 设为如 0.002 时启用自适应模式：95%置信区间半宽 <= 0.2% 即停止
+最大模拟次数 = 2000000   # 自适应模式下每个配置的样本数上限
+使用结果缓存 = True      # 系数、配置、样本数与种子都未改变时直接读取上次结果 (python -m xfactor.cache invalidate 清除)
+方差缩减 = None          # 'antithetic'(对偶变量)、'control'(控制变量) 或 'antithetic+control'：相同精度所需模拟次数大幅减少
+参数扫描 = None          # 例如 {'神锋_基础发动率': [0.70, 0.75]}：以公共随机数评估各配置在这些系数取值下的期望伤害
+事件追踪 = False         # True 时另行统计每场平均的技能发动、整备获得、哑火等事件次数与各攻击阶段耗时
+阵容搜索 = None          # 例如 2：在全部第二技能 × 至多 2 名辅助的组合中逐轮淘汰明显较差的阵容，输出期望伤害前 5 名
+伤害分布目录 = None      # 例如 'nver_dist'：另把每场每回合伤害写入该目录，输出前3回合累计伤害的分位数与分布函数图
+结果文件 = 'nver_results.json'  # 图表由该结果文件渲染
+图表格式 = 'png'         # 'png' 或 'svg'
+图表分辨率 = 120         # dpi
 
 # ==============================================================================
 # 主程序入口
@@ -183,68 +59,106 @@ if __name__ == '__main__':
     plt.rcParams['font.family'] = 'Microsoft YaHei'
     plt.rcParams['axes.unicode_minus'] = False
 
-    # 1.【修改】修改图例说明文字
-    build1_配置 = {'name': '运智铺谋 + 谋而后动', 'skill2': 'MouErHouDong'}
-    build2_配置 = {'name': '运智铺谋 + 铁骑横冲', 'skill2': 'Tieqi'}
-    build3_配置 = {'name': '运智铺谋 + 智破千军', 'skill2': 'ZhiPoQianJun'}
-
-    辅助列表 = [
-        {'name': '女儿单人', 'config': None},
-        {'name': '辅助-马腾', 'config': {'name': 'MaTeng'}},
-        {'name': '辅助-张春华', 'config': {'name': 'ZhangChunhua'}},
-        {'name': '辅助-甄姬', 'config': {'name': 'ZhenJi'}},
-        {'name': '辅助-庞统', 'config': {'name': 'PangTong'}},
-        {'name': '辅助-荀彧', 'config': {'name': 'XunYu'}}
-    ]
-
+    # 1.【修改】图例说明文字见 xfactor/models/nver.py 的 BUILDS
+    Build列表 = nver.BUILDS
+    build1_配置 = Build列表[0]
+    辅助列表 = [{'name': 名称, 'config': 配置} for 名称, 配置 in nver.SUPPORTS]
     结果列表 = []
-    print(f"正在运行 {模拟次数} 次模拟...")
-
+    精度列表 = []
+    任务列表 = [(build, 辅助['config']) for 辅助 in 辅助列表 for build in Build列表]
+    结果缓存 = ResultCache() if 使用结果缓存 else None
+    批量模拟 = with_variance_reduction(run_batch_simulation, 方差缩减)
+    if 方差缩减:
+        print(f"方差缩减模式: {方差缩减} (每个样本耗费 {批量模拟.cost} 场模拟)")
+    if 目标相对误差 is None:
+        print(f"正在运行 {模拟次数} 次模拟...")
+        统计列表 = cached_run(结果缓存, vars(nver), run_parallel, 批量模拟, 任务列表,
+                              n_samples=模拟次数, seed=随机种子, max_workers=并行进程数)
+    else:
+        print(f"正在运行自适应模拟，每个配置模拟至95%置信区间半宽 <= {目标相对误差:.2%} 或 {最大模拟次数} 次...")
+        统计列表 = cached_run(结果缓存, vars(nver), run_adaptive, 批量模拟, 任务列表,
+                              rel_tol=目标相对误差, seed=随机种子, max_samples=最大模拟次数, max_workers=并行进程数)
+    统计迭代 = iter(统计列表)
     for 辅助 in 辅助列表:
-        b1_伤害 = sum([run_single_simulation(build1_配置, 辅助['config']) for _ in range(模拟次数)]) / 模拟次数
-        b2_伤害 = sum([run_single_simulation(build2_配置, 辅助['config']) for _ in range(模拟次数)]) / 模拟次数
-        b3_伤害 = sum([run_single_simulation(build3_配置, 辅助['config']) for _ in range(模拟次数)]) / 模拟次数
-        结果列表.append({
-            '组合': 辅助['name'],
-            build1_配置['name']: b1_伤害,
-            build2_配置['name']: b2_伤害,
-            build3_配置['name']: b3_伤害,
-        })
+        结果 = {'组合': 辅助['name']}
+        精度 = {'组合': 辅助['name']}
+        for build in Build列表:
+            统计 = next(统计迭代)
+            结果[build['name']] = 统计.total_mean
+            精度[build['name']] = (f"±{统计.total_ci_half_width():.2f} (n={统计.count}, "
+                                   f"P5~P95: {统计.total_quantile(0.05):.0f}~{统计.total_quantile(0.95):.0f})")
+        结果列表.append(结果)
+        精度列表.append(精度)
     print("\n模拟完成。")
 
     结果DF = pd.DataFrame(结果列表)
     # 3.【修改】按Build 1的伤害对结果进行降序排列
     结果DF = 结果DF.sort_values(by=build1_配置['name'], ascending=False).reset_index(drop=True)
+    精度DF = pd.DataFrame(精度列表).set_index('组合').loc[结果DF['组合']].reset_index()
     
     print("\n--- 3回合期望总伤害系数对比 ---")
     print(结果DF.round(2).to_string(index=False))
+    print("\n--- 95%置信区间半宽、模拟次数与单场伤害5%~95%分位 ---")
+    print(精度DF.to_string(index=False))
+
+    # 精确期望(枚举 1680 类整备顺序，其余随机性解析地取期望)作为蒙特卡洛结果的校验基准
+    组合名称 = [f"{辅助['name']} / {build['name']}" for 辅助 in 辅助列表 for build in Build列表]
+    精确列表 = []
+    for 名称, 任务, 统计 in zip(组合名称, 任务列表, 统计列表):
+        精确期望 = nver.compute_expected_damage(*任务)
+        精确列表.append({
+            '组合': 名称,
+            '精确期望总伤害系数': 精确期望,
+            '模拟结果': 统计.total_mean,
+            '偏差/95%置信区间半宽': (统计.total_mean - 精确期望) / 统计.total_ci_half_width(),
+        })
+    print("\n--- 蒙特卡洛结果与精确期望对比 (偏差绝对值应基本小于1) ---")
+    print(pd.DataFrame(精确列表).round(2).to_string(index=False))
+
+    if 方差缩减:
+        试算次数 = min(模拟次数, 20000)
+        提升DF = variance_reduction_report(run_batch_simulation, 任务列表, 试算次数, seed=随机种子,
+                                           labels=组合名称, max_workers=并行进程数)
+        print(f"\n--- 各方差缩减模式的有效样本量提升倍数 (试算 {试算次数} 场) ---")
+        print(提升DF.rename(columns={'task': '组合'})[['组合'] + [c for c in 提升DF.columns if c.endswith('_gain')]]
+              .round(2).to_string(index=False))
+
+    if 事件追踪:
+        追踪次数 = min(模拟次数, 20000)
+        追踪列表 = [追踪 for _, 追踪 in run_traced(run_batch_simulation, 任务列表, 追踪次数, seed=随机种子,
+                                                   timing=True, max_workers=并行进程数)]
+        print(f"\n--- 每场平均事件次数 (追踪 {追踪次数} 场) ---")
+        print(trace_table(追踪列表, 组合名称).rename_axis('组合').round(3).to_string())
+        print("\n--- 各攻击阶段耗时 (秒) ---")
+        print(trace_table(追踪列表, 组合名称, timings=True).rename_axis('组合').round(3).to_string())
+
+    if 阵容搜索:
+        候选阵容 = compositions(nver, max_supports=阵容搜索)
+        print(f"\n正在搜索 {len(候选阵容)} 个阵容 (至多 {阵容搜索} 名辅助) ...")
+        搜索DF = pd.DataFrame(race(批量模拟, 候选阵容, top_k=5, seed=随机种子, max_workers=并行进程数))
+        print(f"\n--- 阵容搜索前 5 名 (共模拟 {搜索DF['battles'].sum():,} 场；期望总伤害系数，95%置信区间) ---")
+        print(搜索DF[搜索DF['top_k']].rename(columns={'task': '阵容'})[['阵容', 'mean', 'ci_low', 'ci_high', 'samples']]
+              .round(2).to_string(index=False))
+
+    if 伤害分布目录:
+        write_distributions(run_batch_simulation_per_turn, 任务列表, 模拟次数, 伤害分布目录, seed=随机种子,
+                            labels=组合名称, max_workers=并行进程数)
+        分布 = DistributionStore(伤害分布目录)
+        print(f"\n--- 前3回合累计伤害系数分布 (每场每回合结果已写入 {伤害分布目录}) ---")
+        print(pd.DataFrame(分布.summary(组合名称, turn=3)).rename(columns={'task': '组合'}).round(2).to_string(index=False))
+        ax = 分布.plot_cdf(组合名称, turn=3)
+        ax.figure.savefig("nver_damage_cdf_3_turns.png", dpi=120)
+        plt.close(ax.figure)
+
+    if 参数扫描:
+        print(f"\n正在进行参数扫描 {参数扫描} ...")
+        扫描DF = sweep(批量模拟, 任务列表, 参数扫描, n_samples=模拟次数, seed=随机种子, labels=组合名称,
+                       max_workers=并行进程数)
+        print("\n--- 参数扫描 (公共随机数；delta 为较当前系数的变化，sensitivity 为有限差分灵敏度) ---")
+        print(扫描DF.rename(columns={'task': '组合'}).round(4).to_string(index=False))
     
-    绘图DF = 结果DF.set_index('组合')
-    
-    fig, ax = plt.subplots(figsize=(10, 8))
-    
-    bar_width, num_builds = 0.25, len(绘图DF.columns)
-    index = np.arange(len(绘图DF.index))
-    
-    colors = ['cornflowerblue', 'salmon', 'lightgreen']
-    bars = []
-    for i, col in enumerate(绘图DF.columns):
-        offset = bar_width * (i - (num_builds - 1) / 2)
-        bar = ax.bar(index + offset, 绘图DF[col], bar_width, label=col, color=colors[i], edgecolor='black')
-        bars.append(bar)
-
-    # 2.【修改】调整字体大小和加粗
-    ax.set_xlabel('辅助武将组合', fontsize=26, fontweight='bold')
-    ax.set_ylabel('3回合期望总伤害系数', fontsize=26, fontweight='bold')
-    ax.set_title('女儿不同Build及辅助下的期望伤害对比', fontsize=30, fontweight='bold')
-    ax.set_xticks(index)
-    ax.set_xticklabels(绘图DF.index, rotation=0, fontsize=24, fontweight='bold')
-    ax.tick_params(axis='y', labelsize=22)
-    ax.legend(prop={'weight': 'bold', 'size': 20}) # 调整图例字体
-    ax.grid(axis='y', linestyle='--', alpha=0.7)
-    
-    for bar_group in bars:
-        ax.bar_label(bar_group, fmt='%.1f', padding=3, fontsize=12, fontweight='bold')
-        
-    fig.tight_layout()
-    plt.show()
\ No newline at end of file
+    # 图表在进程池中渲染；结果与样式都未变时直接跳过(也可单独运行 xfactor render nver_results.json)
+    记录 = make_records('nver', list(zip(组合名称, 任务列表)), 统计列表, getattr(批量模拟, 'cost', 1))
+    write_records(记录, {'hero': 'nver', 'seed': 随机种子, 'samples': 模拟次数}, 'json', 结果文件)
+    for 图表 in render_charts([结果文件], fmt=图表格式, dpi=图表分辨率, max_workers=并行进程数):
+        print(f"图表已保存为 {图表['chart']}" if 图表['rendered'] else f"{图表['chart']} 未变化，跳过")